@@ -7,6 +7,8 @@ from app.database import get_db
 from app.models import User, DataSource, UserRole
 from app.schemas import UserCreate, UserResponse, DataSourceCreate, DataSourceResponse
 from app.auth import get_current_user, require_role, get_password_hash
+from app.services.principal_cache import get_principal_cache
+from app.services.password_hashing import get_password_hasher
 
 router = APIRouter()
 
@@ -41,7 +43,7 @@ async def create_user(
     db_user = User(
         username=user_data.username,
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await get_password_hash(user_data.password),
         role=user_data.role
     )
     
@@ -68,9 +70,37 @@ async def update_user_role(
     
     user.role = role
     await db.commit()
+    await get_principal_cache().invalidate(user.username)
     
     return {"message": "User role updated successfully"}
 
+@router.patch("/users/{user_id}/active")
+async def update_user_active(
+    user_id: int,
+    is_active: bool,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_role(UserRole.ADMIN))
+):
+    """Ativar ou desativar usuário"""
+    
+    if user_id == current_user.id and not is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot disable your own account"
+        )
+    
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalar_one_or_none()
+    
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    user.is_active = is_active
+    await db.commit()
+    await get_principal_cache().invalidate(user.username)
+    
+    return {"message": "User status updated successfully"}
+
 @router.delete("/users/{user_id}")
 async def delete_user(
     user_id: int,
@@ -93,9 +123,17 @@ async def delete_user(
     
     await db.delete(user)
     await db.commit()
+    await get_principal_cache().invalidate(user.username)
     
     return {"message": "User deleted successfully"}
 
+@router.get("/metrics/password-hashing")
+async def get_password_hashing_metrics(
+    current_user: User = Depends(require_role(UserRole.ADMIN))
+):
+    """Ocupação e fila do pool de bcrypt deste worker"""
+    return get_password_hasher().metrics()
+
 @router.get("/sources", response_model=List[DataSourceResponse])
 async def list_data_sources(
     db: AsyncSession = Depends(get_db),
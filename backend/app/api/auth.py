@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -11,16 +11,22 @@ from app.auth import (
     verify_password,
     get_password_hash,
     create_access_token,
-    get_current_user
+    get_current_user,
+    enforce_login_throttle,
+    client_ip
 )
+from app.services.login_throttle import get_login_throttle
 from app.config import settings
 
 router = APIRouter()
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
+async def register(user_data: UserCreate, request: Request, db: AsyncSession = Depends(get_db)):
     """Registrar novo usuário"""
     
+    # Registro também calcula bcrypt: conta no limite de tentativas do IP
+    await enforce_login_throttle(request)
+    
     # Verificar se usuário já existe
     result = await db.execute(
         select(User).where(User.username == user_data.username)
@@ -35,7 +41,7 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     db_user = User(
         username=user_data.username,
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await get_password_hash(user_data.password),
         role=user_data.role
     )
     
@@ -47,17 +53,21 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
 
 @router.post("/login", response_model=Token)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db)
 ):
     """Autenticar usuário"""
     
+    await enforce_login_throttle(request, form_data.username)
+    
     result = await db.execute(
         select(User).where(User.username == form_data.username)
     )
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password(form_data.password, user.hashed_password):
+        await get_login_throttle().record_failure(form_data.username, client_ip(request))
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -70,6 +80,8 @@ async def login(
             detail="User account is disabled"
         )
     
+    await get_login_throttle().reset(form_data.username, client_ip(request))
+    
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username, "role": user.role.value},
@@ -1,14 +1,19 @@
-from fastapi import APIRouter, Depends, Query
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.database import get_db
 from app.auth import get_current_user
 from app.models import User
-from app.schemas import CriticalAlert, CorrelationResult
-from app.integrations.elastic import ElasticIntegration
-from app.integrations.tenable import TenableIntegration
-from app.integrations.defender import DefenderIntegration
-from app.integrations.opencti import OpenCTIIntegration
-from app.services.correlation import CorrelationEngine
+from app.schemas import CriticalAlert, CorrelationResult, AlertDetail, AssetAlertsPage
+from app.services.parallel_correlation import correlate_window_json, correlate_asset_window
+from app.services.correlation import CorrelationEngine, decode_cursor
+from app.services.source_fetcher import SOURCES, SourceFetcher, SourceStatus, FetchResult
+from app.services.alert_rollups import window_counts, count_events
+from app.services.alert_store import AlertStore
+from app.services.timeline import TIMELINE_SOURCES, build_timeline, decode_timeline_cursor
+from app.integrations.registry import IntegrationRegistry, get_integrations
 import logging
+import time
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -16,77 +21,117 @@ logger = logging.getLogger(__name__)
 @router.get("/critical-alerts", response_model=List[CorrelationResult])
 async def get_critical_alerts(
     hours: int = Query(24, ge=1, le=168),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    alerts_per_asset: Optional[int] = Query(None, ge=1, le=1000),
+    integrations: IntegrationRegistry = Depends(get_integrations),
     current_user: User = Depends(get_current_user)
 ):
-    """Obter alertas críticos correlacionados de todas as fontes"""
+    """Obter alertas críticos correlacionados de todas as fontes.
+    
+    Com limit, retorna os ativos de maior risco; o cursor da próxima página vem
+    no header X-Next-Cursor e o total de ativos em X-Total-Count.
+    """
+    
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
     
     try:
-        # Inicializar integrações
-        elastic = ElasticIntegration()
-        tenable = TenableIntegration()
-        defender = DefenderIntegration()
-        opencti = OpenCTIIntegration()
-        
         # Buscar dados de todas as fontes em paralelo
-        elastic_alerts = await elastic.get_critical_alerts(hours=hours)
-        tenable_vulns = tenable.get_critical_vulnerabilities(days=hours//24 or 1)
-        defender_alerts = await defender.get_critical_alerts(hours=hours)
-        opencti_indicators = opencti.get_critical_indicators(days=hours//24 or 1)
+        fetched = await SourceFetcher(integrations).fetch(hours=hours)
         
-        # Fechar conexão Elastic
-        await elastic.close()
+        # Correlacionar eventos; o JSON sai pronto, sem revalidar pelo response_model
+        content, next_cursor, total = await correlate_window_json(hours, fetched, limit, cursor, alerts_per_asset)
         
-        # Correlacionar eventos
-        correlation_engine = CorrelationEngine()
-        correlations = correlation_engine.correlate_events(
-            elastic_alerts=elastic_alerts,
-            tenable_vulns=tenable_vulns,
-            defender_alerts=defender_alerts,
-            opencti_indicators=opencti_indicators
-        )
+        headers = {"X-Total-Count": str(total)}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
         
-        logger.info(f"Returned {len(correlations)} correlated critical alerts")
-        return correlations
+        logger.info(f"Returned {len(content)} bytes of correlated critical alerts")
+        return Response(content=content, media_type="application/json", headers=headers)
         
     except Exception as e:
         logger.error(f"Error getting critical alerts: {str(e)}")
         raise
 
+@router.get("/critical-alerts/{asset}/alerts", response_model=AssetAlertsPage)
+async def get_asset_alerts(
+    asset: str,
+    hours: int = Query(24, ge=1, le=168),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=1000),
+    integrations: IntegrationRegistry = Depends(get_integrations),
+    current_user: User = Depends(get_current_user)
+):
+    """Paginar os alertas de um ativo, do maior para o menor score"""
+    
+    fetched = await SourceFetcher(integrations).fetch(hours=hours)
+    correlation = await correlate_asset_window(hours, fetched, asset)
+    if correlation is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    
+    alerts = CorrelationEngine.sorted_alerts(correlation)
+    return AssetAlertsPage.model_construct(
+        asset=correlation.asset,
+        total=len(alerts),
+        offset=offset,
+        limit=limit,
+        alerts=alerts[offset:offset + limit]
+    )
+
 @router.get("/statistics")
 async def get_dashboard_statistics(
     hours: int = Query(24, ge=1, le=168),
+    integrations: IntegrationRegistry = Depends(get_integrations),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Obter estatísticas do dashboard"""
+    """Obter estatísticas do dashboard.
+    
+    Fontes mantidas pela ingestão são somadas das contagens por hora
+    (alert_rollups), em horas inteiras: a hora corrente e as hours - 1
+    anteriores. As demais são buscadas ao vivo.
+    """
     
     try:
-        elastic = ElasticIntegration()
-        tenable = TenableIntegration()
-        defender = DefenderIntegration()
-        opencti = OpenCTIIntegration()
-        
-        # Buscar dados
-        elastic_alerts = await elastic.get_critical_alerts(hours=hours)
-        tenable_vulns = tenable.get_critical_vulnerabilities(days=hours//24 or 1)
-        defender_alerts = await defender.get_critical_alerts(hours=hours)
-        opencti_indicators = opencti.get_critical_indicators(days=hours//24 or 1)
-        
-        await elastic.close()
+        stored = [source for source in SOURCES if SourceFetcher.is_stored(source)]
+        live = [source for source in SOURCES if source not in stored]
+        
+        counts, status = {}, {}
+        if stored:
+            start = time.perf_counter()
+            try:
+                counts = await window_counts(db, {source: SourceFetcher.window_hours(source, hours) for source in stored})
+                state = SourceStatus("active", 0, 0, cache="rollup")
+            except Exception as e:
+                logger.error(f"Error reading alert rollups: {str(e)}")
+                counts = {source: {} for source in stored}
+                state = SourceStatus("error", 0, 0, str(e))
+            elapsed_ms = int((time.perf_counter() - start) * 1000)
+            for source in stored:
+                count = sum(total for total, _ in counts[source].values())
+                status[source] = SourceStatus(state.status, elapsed_ms, count, state.error, state.cache)
+        
+        if live:
+            fetched = await SourceFetcher(integrations).fetch(hours=hours, sources=live)
+            for source in live:
+                counts[source] = count_events(fetched.get(source))
+            status.update(fetched.status)
         
         # Calcular estatísticas
+        totals = {source: sum(total for total, _ in counts[source].values()) for source in SOURCES}
+        elastic = counts["elastic"]
         stats = {
-            "total_critical_alerts": len(elastic_alerts) + len(defender_alerts),
-            "total_vulnerabilities": len(tenable_vulns),
-            "total_threat_indicators": len(opencti_indicators),
-            "critical_count": sum(1 for a in elastic_alerts if a.get("severity") == "critical"),
-            "high_count": sum(1 for a in elastic_alerts if a.get("severity") == "high"),
-            "exploitable_vulns": sum(1 for v in tenable_vulns if v.get("exploit_available")),
-            "sources_status": {
-                "elasticsearch": "active" if elastic_alerts is not None else "error",
-                "tenable": "active" if tenable_vulns is not None else "error",
-                "defender": "active" if defender_alerts is not None else "error",
-                "opencti": "active" if opencti_indicators is not None else "error"
-            }
+            "total_critical_alerts": totals["elastic"] + totals["defender"],
+            "total_vulnerabilities": totals["tenable"],
+            "total_threat_indicators": totals["opencti"],
+            "critical_count": elastic.get("critical", (0, 0))[0],
+            "high_count": elastic.get("high", (0, 0))[0],
+            "exploitable_vulns": sum(value[1] for value in counts["tenable"].values()),
+            "sources_status": FetchResult(status={source: status[source] for source in SOURCES}).sources_status()
         }
         
         return stats
@@ -97,46 +142,54 @@ async def get_dashboard_statistics(
 
 @router.get("/timeline")
 async def get_threat_timeline(
+    response: Response,
     hours: int = Query(24, ge=1, le=168),
+    limit: int = Query(100, ge=1, le=1000),
+    before: Optional[str] = None,
+    integrations: IntegrationRegistry = Depends(get_integrations),
     current_user: User = Depends(get_current_user)
 ):
-    """Obter timeline de ameaças"""
+    """Obter timeline de ameaças, do evento mais recente para o mais antigo.
+    
+    Timestamps em UTC (ISO 8601). O cursor para eventos anteriores vem no
+    header X-Next-Cursor e é enviado de volta em before.
+    """
+    
+    if before:
+        try:
+            decode_timeline_cursor(before)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
     
     try:
-        elastic = ElasticIntegration()
-        defender = DefenderIntegration()
-        
-        elastic_alerts = await elastic.get_critical_alerts(hours=hours)
-        defender_alerts = await defender.get_critical_alerts(hours=hours)
-        
-        await elastic.close()
-        
-        # Combinar e ordenar eventos por timestamp
-        all_events = []
-        
-        for alert in elastic_alerts:
-            all_events.append({
-                "timestamp": alert.get("timestamp"),
-                "source": "elastic",
-                "severity": alert.get("severity"),
-                "title": alert.get("title"),
-                "asset": alert.get("asset")
-            })
+        fetched = await SourceFetcher(integrations).fetch(hours=hours, sources=TIMELINE_SOURCES)
         
-        for alert in defender_alerts:
-            all_events.append({
-                "timestamp": alert.get("timestamp"),
-                "source": "defender",
-                "severity": alert.get("severity"),
-                "title": alert.get("title"),
-                "asset": alert.get("asset")
-            })
+        # Merge das fontes já ordenadas (buckets por hora), sem copiar a janela
+        sources = {
+            source: fetched.windows[source] if source in fetched.windows else fetched.get(source)
+            for source in TIMELINE_SOURCES
+        }
+        events, next_cursor = build_timeline(sources, limit, before)
         
-        # Ordenar por timestamp
-        all_events.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         
-        return all_events[:100]  # Limitar a 100 eventos
+        return events
         
     except Exception as e:
         logger.error(f"Error getting timeline: {str(e)}")
         raise
+
+@router.get("/alerts/{alert_id}", response_model=AlertDetail)
+async def get_alert_detail(
+    alert_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Obter um alerta com o documento original da fonte"""
+    
+    alert = await AlertStore.get(db, alert_id)
+    if not alert:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    
+    return alert
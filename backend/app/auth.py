@@ -1,24 +1,56 @@
 from datetime import datetime, timedelta
-from typing import Optional
-from fastapi import Depends, HTTPException, status
+from typing import Optional, Dict, Any, Awaitable, TypeVar
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.config import settings
 from app.database import get_db
 from app.models import User, UserRole
+from app.services.principal_cache import get_principal_cache
+from app.services.password_hashing import HashingBusyError, get_password_hasher
+from app.services.login_throttle import get_login_throttle
+
+T = TypeVar("T")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _hashing(get_password_hasher().verify(plain_password, hashed_password))
+
+async def get_password_hash(password: str) -> str:
+    return await _hashing(get_password_hasher().hash(password))
+
+async def _hashing(call: Awaitable[T]) -> T:
+    # bcrypt roda no pool limitado; com a fila cheia a requisição é recusada na hora
+    try:
+        return await call
+    except HashingBusyError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service busy, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+
+def client_ip(request: Request) -> str:
+    """IP do cliente; atrás do nginx vem no header LOGIN_CLIENT_IP_HEADER"""
+    if settings.LOGIN_CLIENT_IP_HEADER:
+        forwarded = request.headers.get(settings.LOGIN_CLIENT_IP_HEADER)
+        if forwarded:
+            return forwarded.strip()
+    return request.client.host if request.client else "unknown"
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def enforce_login_throttle(request: Request, username: Optional[str] = None):
+    """Recusa (429) antes do bcrypt se o IP ou o username neste IP excedeu as tentativas da janela"""
+    retry_after = await get_login_throttle().check(client_ip(request), username)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -49,15 +81,48 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    result = await db.execute(select(User).where(User.username == username))
-    user = result.scalar_one_or_none()
+    async def load_principal() -> Optional[Dict[str, Any]]:
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalar_one_or_none()
+        return principal_of(user) if user is not None else None
     
-    if user is None:
+    # Usuário em cache (invalidado pelas alterações em app/api/admin.py); o banco só é consultado no miss
+    principal = await get_principal_cache().resolve(username, load_principal)
+    
+    if principal is None:
         raise credentials_exception
     
-    return user
+    if not principal["is_active"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User account is disabled"
+        )
+    
+    return user_of(principal)
+
+def principal_of(user: User) -> Dict[str, Any]:
+    """Campos do usuário guardados no cache (sem o hash da senha)"""
+    return {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "role": user.role.value,
+        "is_active": user.is_active,
+        "created_at": user.created_at.isoformat() if user.created_at else None
+    }
+
+def user_of(principal: Dict[str, Any]) -> User:
+    """User transiente (fora de sessão), um por requisição"""
+    return User(
+        id=principal["id"],
+        username=principal["username"],
+        email=principal["email"],
+        role=UserRole(principal["role"]),
+        is_active=principal["is_active"],
+        created_at=datetime.fromisoformat(principal["created_at"]) if principal["created_at"] else None
+    )
 
-async def require_role(required_role: UserRole):
+def require_role(required_role: UserRole):
     async def role_checker(current_user: User = Depends(get_current_user)):
         role_hierarchy = {
             UserRole.VIEWER: 1,
@@ -0,0 +1,18 @@
+from typing import Optional
+from redis.asyncio import Redis
+from app.config import settings
+
+_redis: Optional[Redis] = None
+
+def get_redis() -> Redis:
+    """Cliente Redis compartilhado pelo processo (criado sob demanda)"""
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(settings.REDIS_URL)
+    return _redis
+
+async def close_redis():
+    global _redis
+    if _redis is not None:
+        await _redis.close()
+        _redis = None
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Dict
 
 class Settings(BaseSettings):
     # Database
@@ -10,6 +10,19 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    AUTH_PRINCIPAL_CACHE_SIZE: int = 1000
+    AUTH_PRINCIPAL_CACHE_TTL_SECONDS: int = 300
+    AUTH_PRINCIPAL_CACHE_SHARED: bool = True  # Redis + canal de invalidação entre workers
+    
+    # Password hashing (bcrypt fora do event loop)
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 32
+    
+    # Login throttling (janelas no Redis, compartilhadas entre workers)
+    LOGIN_THROTTLE_WINDOW_SECONDS: int = 300
+    LOGIN_MAX_ATTEMPTS_PER_IP: int = 30
+    LOGIN_MAX_FAILURES_PER_USERNAME: int = 5  # Por par (username, IP): outro IP não bloqueia a conta
+    LOGIN_CLIENT_IP_HEADER: str = "X-Real-IP"  # Definido pelo nginx; vazio = endereço da conexão
     
     # CORS
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost"]
@@ -18,6 +31,8 @@ class Settings(BaseSettings):
     ELASTICSEARCH_URL: str
     ELASTICSEARCH_USERNAME: str = ""
     ELASTICSEARCH_PASSWORD: str = ""
+    ELASTIC_PAGE_SIZE: int = 1000
+    ELASTIC_PIT_KEEP_ALIVE: str = "1m"
     
     # Tenable
     TENABLE_ACCESS_KEY: str
@@ -28,10 +43,13 @@ class Settings(BaseSettings):
     DEFENDER_TENANT_ID: str
     DEFENDER_CLIENT_ID: str
     DEFENDER_CLIENT_SECRET: str
+    DEFENDER_PAGE_SIZE: int = 500
+    DEFENDER_MAX_RETRIES: int = 5
     
     # OpenCTI
     OPENCTI_URL: str
     OPENCTI_TOKEN: str
+    OPENCTI_PAGE_SIZE: int = 500
     
     # Criticality Thresholds
     CVSS_HIGH_THRESHOLD: float = 7.0
@@ -40,6 +58,60 @@ class Settings(BaseSettings):
     RISK_SCORE_CRITICAL_THRESHOLD: int = 90
     CONFIDENCE_THRESHOLD: int = 75
     
+    # Correlation
+    CORRELATION_COLUMNAR_MIN_EVENTS: int = 20000
+    CORRELATION_PARALLEL_MIN_EVENTS: int = 100000
+    CORRELATION_WORKERS: int = 0  # 0 = um processo por CPU
+    CORRELATION_STRATEGY: str = "auto"  # auto, bucketed, parallel ou incremental
+    ASSET_INVENTORY_INTERVAL_SECONDS: int = 3600
+    ASSET_RESOLVER_CACHE_SIZE: int = 100000
+    
+    # Source fetching
+    SOURCE_FETCH_TIMEOUT_SECONDS: float = 30.0
+    SOURCE_FETCH_MAX_WORKERS: int = 4
+    
+    # Time buckets
+    WINDOW_BUCKETS_ENABLED: bool = True
+    WINDOW_BUCKETS_MAX_HOURS: int = 168
+    WINDOW_BUCKETS_REFRESH_SECONDS: int = 60
+    WINDOW_BUCKETS_FULL_REFRESH_SECONDS: int = 900
+    
+    # Integration connection pools
+    ELASTIC_CONNECTIONS_PER_NODE: int = 10
+    GRAPH_HTTP2_ENABLED: bool = True
+    GRAPH_MAX_CONNECTIONS: int = 20
+    GRAPH_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    GRAPH_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    SYNC_CLIENT_POOL_SIZE: int = 10
+    
+    # Microsoft Graph token cache
+    GRAPH_TOKEN_EXPIRY_MARGIN_SECONDS: int = 60
+    GRAPH_TOKEN_REFRESH_AHEAD_SECONDS: int = 300
+    
+    # Snapshot cache (Redis)
+    SNAPSHOT_CACHE_ENABLED: bool = True
+    SNAPSHOT_TTL_SECONDS: int = 60
+    SNAPSHOT_STALE_SECONDS: int = 300
+    SNAPSHOT_LOCK_TIMEOUT_SECONDS: int = 60
+    
+    # Ingestion
+    INGESTION_ENABLED: bool = True
+    INGESTION_INTERVAL_SECONDS: int = 60
+    INGESTION_TENABLE_INTERVAL_SECONDS: int = 900
+    INGESTION_BACKFILL_HOURS: int = 168
+    INGESTION_OVERLAP_MINUTES: int = 5
+    INGESTION_BATCH_SIZE: int = 1000
+    ALERT_PARTITIONS_AHEAD_DAYS: int = 7
+    
+    # Retention (dias por fonte; fonte ausente = sem limite)
+    # Após o período quente o raw_data vai para o arquivo comprimido; após o frio o alerta é removido
+    RETENTION_ENABLED: bool = True
+    RETENTION_HOT_DAYS: Dict[str, int] = {"elastic": 7, "defender": 7, "tenable": 30, "opencti": 30}
+    # OpenCTI sem limite: um indicador ativo pode ser antigo; ele sai quando revogado na origem (ingestão incremental)
+    RETENTION_COLD_DAYS: Dict[str, int] = {"elastic": 90, "defender": 90, "tenable": 365}
+    RETENTION_INTERVAL_SECONDS: int = 3600
+    RETENTION_BATCH_SIZE: int = 1000
+    
     class Config:
         env_file = ".env"
 
@@ -1,4 +1,5 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker, AsyncConnection
 from sqlalchemy.orm import declarative_base
 from app.config import settings
 
@@ -16,6 +17,19 @@ AsyncSessionLocal = async_sessionmaker(
 
 Base = declarative_base()
 
+# Colunas adicionadas a tabelas já existentes: create_all só cria as tabelas que faltam
+COLUMN_UPGRADES = (
+    ("alerts", "details", "JSON"),
+    ("alerts", "event_time", "TIMESTAMP WITH TIME ZONE"),
+    ("alerts", "updated_at", "TIMESTAMP WITH TIME ZONE"),
+    ("data_sources", "sync_state", "JSON"),
+)
+
+async def upgrade_columns(conn: AsyncConnection):
+    """Adiciona as colunas novas dos modelos a bancos criados por versões anteriores (idempotente)"""
+    for table, column, column_type in COLUMN_UPGRADES:
+        await conn.execute(text(f"ALTER TABLE IF EXISTS {table} ADD COLUMN IF NOT EXISTS {column} {column_type}"))
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
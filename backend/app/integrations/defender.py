@@ -1,93 +1,100 @@
 from azure.identity import ClientSecretCredential
-from msgraph.core import GraphClient
-from typing import List, Dict, Any
-from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, AsyncIterator
+from datetime import datetime, timedelta, timezone
+from app.integrations.token_provider import GraphTokenProvider
 from app.config import settings
+import asyncio
 import logging
 import httpx
 
 logger = logging.getLogger(__name__)
 
+def create_credential() -> ClientSecretCredential:
+    return ClientSecretCredential(
+        tenant_id=settings.DEFENDER_TENANT_ID,
+        client_id=settings.DEFENDER_CLIENT_ID,
+        client_secret=settings.DEFENDER_CLIENT_SECRET
+    )
+
 class DefenderIntegration:
-    def __init__(self):
-        self.credential = ClientSecretCredential(
-            tenant_id=settings.DEFENDER_TENANT_ID,
-            client_id=settings.DEFENDER_CLIENT_ID,
-            client_secret=settings.DEFENDER_CLIENT_SECRET
-        )
-        self.graph_client = GraphClient(credential=self.credential)
+    def __init__(
+        self,
+        credential: Optional[ClientSecretCredential] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        token_provider: Optional[GraphTokenProvider] = None
+    ):
+        self.credential = credential or create_credential()
+        self.http_client = http_client
+        self.token_provider = token_provider or GraphTokenProvider(self.credential)
         self.security_endpoint = "https://graph.microsoft.com/v1.0/security"
     
-    async def get_critical_alerts(self, hours: int = 24) -> List[Dict[str, Any]]:
+    async def get_critical_alerts(self, hours: int = 24, raise_errors: bool = False) -> List[Dict[str, Any]]:
         """Busca alertas críticos e de alta severidade do Microsoft Defender"""
         try:
-            # Buscar token de acesso
-            token = self.credential.get_token("https://graph.microsoft.com/.default")
-            headers = {"Authorization": f"Bearer {token.token}"}
-            
             # Calcular timestamp
-            start_time = (datetime.utcnow() - timedelta(hours=hours)).isoformat() + "Z"
-            
-            # Query para alertas de alta severidade
-            params = {
-                "$filter": f"createdDateTime ge {start_time} and (severity eq 'high' or severity eq 'critical')",
-                "$top": 1000,
-                "$orderby": "createdDateTime desc"
-            }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.security_endpoint}/alerts_v2",
-                    headers=headers,
-                    params=params
-                )
-                response.raise_for_status()
-                data = response.json()
+            start_time = self._format_datetime(datetime.utcnow() - timedelta(hours=hours))
             
             alerts = []
-            for alert in data.get('value', []):
-                alerts.append({
-                    "id": f"defender_{alert.get('id')}",
-                    "source": "defender",
-                    "severity": alert.get('severity', 'unknown'),
-                    "title": alert.get('title', 'Unknown Alert'),
-                    "description": alert.get('description', ''),
-                    "asset": self._extract_asset(alert),
-                    "category": alert.get('category', ''),
-                    "mitre_techniques": alert.get('mitreTechniques', []),
-                    "threat_family": alert.get('threatFamilyName', ''),
-                    "timestamp": alert.get('createdDateTime'),
-                    "raw_data": alert
-                })
+            async for page in self.iter_alert_pages(f"createdDateTime ge {start_time}", orderby="createdDateTime desc"):
+                alerts.extend(page)
             
             logger.info(f"Retrieved {len(alerts)} critical alerts from Defender")
             return alerts
             
         except Exception as e:
             logger.error(f"Error fetching Defender alerts: {str(e)}")
+            if raise_errors:
+                raise
             return []
     
+    async def iter_alerts_created_since(self, since: datetime) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Alertas criados desde a data informada, página a página"""
+        async for page in self.iter_alert_pages(f"createdDateTime ge {self._format_datetime(since)}"):
+            yield page
+    
+    async def iter_alerts_updated_since(self, watermark: datetime) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Alertas criados ou atualizados desde o watermark (lastUpdateDateTime), página a página"""
+        async for page in self.iter_alert_pages(f"lastUpdateDateTime ge {self._format_datetime(watermark)}"):
+            yield page
+    
+    async def iter_alert_pages(
+        self,
+        time_filter: str,
+        orderby: Optional[str] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Percorre as páginas de alerts_v2 seguindo @odata.nextLink.
+        
+        O estado da paginação é local a cada iteração, então várias coroutines
+        podem paginar ao mesmo tempo com a mesma instância.
+        """
+        # Query para alertas de alta severidade
+        params = {
+            "$filter": f"{time_filter} and (severity eq 'high' or severity eq 'critical')",
+            "$top": settings.DEFENDER_PAGE_SIZE
+        }
+        if orderby:
+            params["$orderby"] = orderby
+        
+        url = f"{self.security_endpoint}/alerts_v2"
+        while url:
+            data = await self._get(url, params=params)
+            yield [self._normalize_alert(alert) for alert in data.get('value', [])]
+            
+            # O nextLink já carrega todos os parâmetros da consulta
+            url = data.get('@odata.nextLink')
+            params = None
+    
     async def get_incidents(self, hours: int = 24) -> List[Dict[str, Any]]:
         """Busca incidentes de alta prioridade"""
         try:
-            token = self.credential.get_token("https://graph.microsoft.com/.default")
-            headers = {"Authorization": f"Bearer {token.token}"}
-            
-            start_time = (datetime.utcnow() - timedelta(hours=hours)).isoformat() + "Z"
+            start_time = self._format_datetime(datetime.utcnow() - timedelta(hours=hours))
             
             params = {
                 "$filter": f"createdDateTime ge {start_time} and (severity eq 'high' or severity eq 'critical')",
                 "$top": 500
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.security_endpoint}/incidents",
-                    headers=headers,
-                    params=params
-                )
-                response.raise_for_status()
-                data = response.json()
+            data = await self._get(f"{self.security_endpoint}/incidents", params=params)
             
             return data.get('value', [])
             
@@ -95,6 +102,67 @@ class DefenderIntegration:
             logger.error(f"Error fetching Defender incidents: {str(e)}")
             return []
     
+    def _normalize_alert(self, alert: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": f"defender_{alert.get('id')}",
+            "source": "defender",
+            "severity": alert.get('severity', 'unknown'),
+            "title": alert.get('title', 'Unknown Alert'),
+            "description": alert.get('description', ''),
+            "asset": self._extract_asset(alert),
+            "category": alert.get('category', ''),
+            "mitre_techniques": alert.get('mitreTechniques', []),
+            "threat_family": alert.get('threatFamilyName', ''),
+            "timestamp": alert.get('createdDateTime'),
+            "last_updated": alert.get('lastUpdateDateTime'),
+            "observables": self._extract_observables(alert),
+            "raw_data": alert
+        }
+    
+    def _extract_observables(self, alert: Dict[str, Any]) -> List[str]:
+        """IPs, domínios, URLs e hashes das evidências, para matching com indicadores"""
+        observables = []
+        for evidence in alert.get('evidence', []):
+            observables.append(evidence.get('ipAddress'))
+            observables.append(evidence.get('url'))
+            observables.append(evidence.get('domainName'))
+            observables.append(evidence.get('deviceDnsName'))
+            file_details = evidence.get('fileDetails') or {}
+            observables.extend([file_details.get('sha256'), file_details.get('sha1'), file_details.get('md5')])
+        return [str(value) for value in observables if value]
+    
+    async def _get(self, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """GET no Graph com token em cache, respeitando Retry-After em 429/503"""
+        for attempt in range(settings.DEFENDER_MAX_RETRIES + 1):
+            # Token obtido a cada página: paginações longas podem cruzar a renovação
+            token = await self.token_provider.get_token()
+            headers = {"Authorization": f"Bearer {token}"}
+            
+            response = await self._send(url, headers=headers, params=params)
+            if response.status_code not in (429, 503) or attempt == settings.DEFENDER_MAX_RETRIES:
+                response.raise_for_status()
+                return response.json()
+            
+            retry_after = response.headers.get("Retry-After")
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt
+            logger.warning(f"Graph throttled request ({response.status_code}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+    
+    async def _send(self, url: str, headers: Dict[str, str], params: Optional[Dict[str, Any]]) -> httpx.Response:
+        """Usa o pool compartilhado quando disponível"""
+        if self.http_client is not None:
+            return await self.http_client.get(url, headers=headers, params=params)
+        
+        async with httpx.AsyncClient() as client:
+            return await client.get(url, headers=headers, params=params)
+    
+    @staticmethod
+    def _format_datetime(value: datetime) -> str:
+        """Literal de data/hora em UTC para filtros OData"""
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat() + "Z"
+    
     def _extract_asset(self, alert: Dict) -> str:
         """Extrai identificador do ativo do alerta"""
         devices = alert.get('devices', [])
@@ -1,77 +1,160 @@
 from elasticsearch import AsyncElasticsearch
-from typing import List, Dict, Any
-from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, AsyncIterator
 from app.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+ALERT_INDICES = "logs-*,alerts-*"
+
+# Únicos campos lidos por _normalize_alert; o restante do documento não é transferido
+ALERT_SOURCE_FIELDS = [
+    "@timestamp",
+    "event.severity",
+    "event.risk_score",
+    "rule.name",
+    "message",
+    "host.name",
+    "host.ip",
+    "source.ip",
+    "destination.ip",
+    "destination.domain",
+    "dns.question.name",
+    "url.full",
+    "file.hash.md5",
+    "file.hash.sha1",
+    "file.hash.sha256"
+]
+
+def create_client(**kwargs) -> AsyncElasticsearch:
+    return AsyncElasticsearch(
+        [settings.ELASTICSEARCH_URL],
+        basic_auth=(settings.ELASTICSEARCH_USERNAME, settings.ELASTICSEARCH_PASSWORD) if settings.ELASTICSEARCH_USERNAME else None,
+        **kwargs
+    )
+
 class ElasticIntegration:
-    def __init__(self):
-        self.client = AsyncElasticsearch(
-            [settings.ELASTICSEARCH_URL],
-            basic_auth=(settings.ELASTICSEARCH_USERNAME, settings.ELASTICSEARCH_PASSWORD) if settings.ELASTICSEARCH_USERNAME else None
-        )
+    def __init__(self, client: Optional[AsyncElasticsearch] = None):
+        # Um cliente recebido (pool compartilhado) não é fechado por esta instância
+        self._owns_client = client is None
+        self.client = client or create_client()
     
-    async def get_critical_alerts(self, hours: int = 24) -> List[Dict[str, Any]]:
+    async def get_critical_alerts(self, hours: int = 24, raise_errors: bool = False) -> List[Dict[str, Any]]:
         """Busca alertas críticos e de alta severidade do Elastic SIEM"""
         try:
-            query = {
-                "query": {
-                    "bool": {
-                        "must": [
-                            {
-                                "range": {
-                                    "@timestamp": {
-                                        "gte": f"now-{hours}h",
-                                        "lte": "now"
-                                    }
-                                }
-                            }
-                        ],
-                        "should": [
-                            {"match": {"event.severity": "critical"}},
-                            {"match": {"event.severity": "high"}},
-                            {"range": {"event.risk_score": {"gte": settings.RISK_SCORE_HIGH_THRESHOLD}}},
-                            {"match": {"host.risk.calculated_level": "Critical"}},
-                            {"match": {"host.risk.calculated_level": "High"}},
-                            {"match": {"user.risk.calculated_level": "Critical"}},
-                            {"match": {"user.risk.calculated_level": "High"}}
-                        ],
-                        "minimum_should_match": 1
-                    }
-                },
-                "size": 1000,
-                "sort": [{"event.risk_score": {"order": "desc"}}]
-            }
-            
-            response = await self.client.search(
-                index="logs-*,alerts-*",
-                body=query
-            )
-            
             alerts = []
-            for hit in response['hits']['hits']:
-                source = hit['_source']
-                alerts.append({
-                    "id": hit['_id'],
-                    "source": "elastic",
-                    "severity": source.get('event', {}).get('severity', 'unknown'),
-                    "title": source.get('rule', {}).get('name', 'Unknown Alert'),
-                    "description": source.get('message', ''),
-                    "asset": source.get('host', {}).get('name', source.get('source', {}).get('ip')),
-                    "risk_score": source.get('event', {}).get('risk_score', 0),
-                    "timestamp": source.get('@timestamp'),
-                    "raw_data": source
-                })
+            async for batch in self.iter_critical_alerts(hours=hours):
+                alerts.extend(batch)
             
             logger.info(f"Retrieved {len(alerts)} critical alerts from Elastic")
             return alerts
             
         except Exception as e:
             logger.error(f"Error fetching Elastic alerts: {str(e)}")
+            if raise_errors:
+                raise
             return []
     
+    async def iter_critical_alerts(
+        self,
+        hours: int = 24,
+        batch_size: Optional[int] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Percorre todos os alertas da janela com point-in-time e search_after, lote a lote"""
+        batch_size = batch_size or settings.ELASTIC_PAGE_SIZE
+        pit = await self.client.open_point_in_time(index=ALERT_INDICES, keep_alive=settings.ELASTIC_PIT_KEEP_ALIVE)
+        pit_id = pit["id"]
+        search_after = None
+        
+        try:
+            while True:
+                params = {
+                    "query": self._critical_alerts_query(hours),
+                    "size": batch_size,
+                    # _shard_doc desempata documentos com o mesmo risk_score
+                    "sort": [
+                        {"event.risk_score": {"order": "desc", "unmapped_type": "float"}},
+                        {"_shard_doc": "asc"}
+                    ],
+                    "pit": {"id": pit_id, "keep_alive": settings.ELASTIC_PIT_KEEP_ALIVE},
+                    "source": ALERT_SOURCE_FIELDS,
+                    "track_total_hits": False
+                }
+                if search_after is not None:
+                    params["search_after"] = search_after
+                
+                response = await self.client.search(**params)
+                pit_id = response.get("pit_id", pit_id)
+                hits = response['hits']['hits']
+                if not hits:
+                    break
+                
+                yield [self._normalize_alert(hit) for hit in hits]
+                
+                if len(hits) < batch_size:
+                    break
+                search_after = hits[-1]['sort']
+        finally:
+            try:
+                await self.client.close_point_in_time(id=pit_id)
+            except Exception as e:
+                # O PIT expira sozinho após o keep_alive
+                logger.warning(f"Could not close Elastic point-in-time: {str(e)}")
+    
+    def _critical_alerts_query(self, hours: int) -> Dict[str, Any]:
+        return {
+            "bool": {
+                "must": [
+                    {
+                        "range": {
+                            "@timestamp": {
+                                "gte": f"now-{hours}h",
+                                "lte": "now"
+                            }
+                        }
+                    }
+                ],
+                "should": [
+                    {"match": {"event.severity": "critical"}},
+                    {"match": {"event.severity": "high"}},
+                    {"range": {"event.risk_score": {"gte": settings.RISK_SCORE_HIGH_THRESHOLD}}},
+                    {"match": {"host.risk.calculated_level": "Critical"}},
+                    {"match": {"host.risk.calculated_level": "High"}},
+                    {"match": {"user.risk.calculated_level": "Critical"}},
+                    {"match": {"user.risk.calculated_level": "High"}}
+                ],
+                "minimum_should_match": 1
+            }
+        }
+    
+    def _normalize_alert(self, hit: Dict[str, Any]) -> Dict[str, Any]:
+        source = hit['_source']
+        return {
+            "id": hit['_id'],
+            "source": "elastic",
+            "severity": source.get('event', {}).get('severity', 'unknown'),
+            "title": source.get('rule', {}).get('name', 'Unknown Alert'),
+            "description": source.get('message', ''),
+            "asset": source.get('host', {}).get('name', source.get('source', {}).get('ip')),
+            "risk_score": source.get('event', {}).get('risk_score', 0),
+            "timestamp": source.get('@timestamp'),
+            "observables": self._extract_observables(source),
+            "raw_data": source
+        }
+    
+    def _extract_observables(self, source: Dict[str, Any]) -> List[str]:
+        """IPs, domínios, URLs e hashes do evento, para matching com indicadores"""
+        observables = []
+        host_ips = source.get('host', {}).get('ip', [])
+        observables.extend(host_ips if isinstance(host_ips, list) else [host_ips])
+        observables.append(source.get('source', {}).get('ip'))
+        observables.append(source.get('destination', {}).get('ip'))
+        observables.append(source.get('destination', {}).get('domain'))
+        observables.append(source.get('dns', {}).get('question', {}).get('name'))
+        observables.append(source.get('url', {}).get('full'))
+        observables.extend(source.get('file', {}).get('hash', {}).values())
+        return [str(value) for value in observables if value]
+    
     async def get_host_risk_scores(self) -> Dict[str, int]:
         """Obtém risk scores de hosts"""
         try:
@@ -107,4 +190,5 @@ class ElasticIntegration:
             return {}
     
     async def close(self):
-        await self.client.close()
+        if self._owns_client:
+            await self.client.close()
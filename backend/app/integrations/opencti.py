@@ -1,72 +1,156 @@
 from pycti import OpenCTIApiClient
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 from datetime import datetime, timedelta
 from app.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Apenas os atributos lidos por _normalize_indicator
+INDICATOR_ATTRIBUTES = """
+    id
+    name
+    description
+    pattern_type
+    pattern
+    confidence
+    x_opencti_score
+    revoked
+    created
+    updated_at
+    objectLabel {
+        value
+    }
+    killChainPhases {
+        kill_chain_name
+        phase_name
+    }
+"""
+
+def create_client() -> OpenCTIApiClient:
+    # O construtor executa um health-check bloqueante na API
+    return OpenCTIApiClient(
+        url=settings.OPENCTI_URL,
+        token=settings.OPENCTI_TOKEN
+    )
+
 class OpenCTIIntegration:
-    def __init__(self):
-        self.client = OpenCTIApiClient(
-            url=settings.OPENCTI_URL,
-            token=settings.OPENCTI_TOKEN
-        )
+    def __init__(self, client: Optional[OpenCTIApiClient] = None):
+        self.client = client or create_client()
     
-    def get_critical_indicators(self, days: int = 7) -> List[Dict[str, Any]]:
+    def get_critical_indicators(self, days: int = 7, raise_errors: bool = False) -> List[Dict[str, Any]]:
         """Busca indicadores de ameaça críticos e de alta confiança"""
         try:
             # Buscar indicators com alta confidence e severity
-            filters = {
-                "mode": "and",
-                "filters": [
-                    {
-                        "key": "confidence",
-                        "values": [str(settings.CONFIDENCE_THRESHOLD)],
-                        "operator": "gte"
-                    },
-                    {
-                        "key": "created_at",
-                        "values": [(datetime.now() - timedelta(days=days)).isoformat()],
-                        "operator": "gte"
-                    }
-                ],
-                "filterGroups": []
-            }
-            
-            indicators = self.client.indicator.list(
-                filters=filters,
-                first=1000
+            filters = self._filters(
+                {
+                    "key": "confidence",
+                    "values": [str(settings.CONFIDENCE_THRESHOLD)],
+                    "operator": "gte"
+                },
+                {
+                    "key": "created_at",
+                    "values": [(datetime.now() - timedelta(days=days)).isoformat()],
+                    "operator": "gte"
+                }
             )
             
             critical_indicators = []
-            for indicator in indicators:
-                # Filtrar por severity crítico ou alto
-                severity = indicator.get('x_opencti_score', 0)
-                confidence = indicator.get('confidence', 0)
-                
-                if confidence >= settings.CONFIDENCE_THRESHOLD:
-                    critical_indicators.append({
-                        "id": f"opencti_{indicator.get('id')}",
-                        "source": "opencti",
-                        "type": indicator.get('pattern_type', 'unknown'),
-                        "value": indicator.get('name', ''),
-                        "description": indicator.get('description', ''),
-                        "confidence": confidence,
-                        "score": severity,
-                        "labels": indicator.get('labels', []),
-                        "kill_chain_phases": indicator.get('killChainPhases', []),
-                        "timestamp": indicator.get('created'),
-                        "raw_data": indicator
-                    })
+            for page in self._iter_pages(filters):
+                for indicator in page:
+                    normalized = self._normalize_indicator(indicator)
+                    if normalized:
+                        critical_indicators.append(normalized)
             
             logger.info(f"Retrieved {len(critical_indicators)} critical indicators from OpenCTI")
             return critical_indicators
             
         except Exception as e:
             logger.error(f"Error fetching OpenCTI indicators: {str(e)}")
+            if raise_errors:
+                raise
             return []
     
+    def iter_indicator_changes(self, updated_since: str) -> Iterator[Tuple[List[Dict[str, Any]], List[str], Optional[str]]]:
+        """Indicadores alterados desde o watermark (updated_at), página a página.
+        
+        Gera (indicadores ativos, ids removidos, maior updated_at da página).
+        Sem filtro de confidence no servidor: um indicador que caiu abaixo do
+        limiar ou foi revogado precisa sair do conjunto local.
+        """
+        filters = self._filters({
+            "key": "updated_at",
+            "values": [updated_since],
+            "operator": "gte"
+        })
+        
+        for page in self._iter_pages(filters):
+            active, removed = [], []
+            newest = None
+            for indicator in page:
+                normalized = None if indicator.get('revoked') else self._normalize_indicator(indicator)
+                if normalized:
+                    active.append(normalized)
+                else:
+                    removed.append(f"opencti_{indicator.get('id')}")
+                updated_at = indicator.get('updated_at')
+                if updated_at and (newest is None or updated_at > newest):
+                    newest = updated_at
+            yield active, removed, newest
+    
+    def _iter_pages(self, filters: Dict[str, Any]) -> Iterator[List[Dict[str, Any]]]:
+        """Percorre o cursor GraphQL (after/pageInfo) pedindo só os atributos mapeados"""
+        after = None
+        while True:
+            result = self.client.indicator.list(
+                filters=filters,
+                first=settings.OPENCTI_PAGE_SIZE,
+                after=after,
+                orderBy="updated_at",
+                orderMode="asc",
+                customAttributes=INDICATOR_ATTRIBUTES,
+                withPagination=True
+            )
+            yield result.get('entities', [])
+            
+            pagination = result.get('pagination', {})
+            if not pagination.get('hasNextPage'):
+                break
+            after = pagination.get('endCursor')
+    
+    @staticmethod
+    def _filters(*filters: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "mode": "and",
+            "filters": list(filters),
+            "filterGroups": []
+        }
+    
+    def _normalize_indicator(self, indicator: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Normaliza um indicador; None se abaixo do limiar de confidence"""
+        # Filtrar por severity crítico ou alto
+        severity = indicator.get('x_opencti_score', 0)
+        confidence = indicator.get('confidence', 0)
+        
+        if confidence < settings.CONFIDENCE_THRESHOLD:
+            return None
+        
+        return {
+            "id": f"opencti_{indicator.get('id')}",
+            "source": "opencti",
+            "type": indicator.get('pattern_type', 'unknown'),
+            "value": indicator.get('name', ''),
+            "pattern": indicator.get('pattern', ''),
+            "description": indicator.get('description', ''),
+            "confidence": confidence,
+            "score": severity,
+            "labels": [label.get('value') for label in indicator.get('objectLabel') or []],
+            "kill_chain_phases": indicator.get('killChainPhases', []),
+            "timestamp": indicator.get('created'),
+            "updated_at": indicator.get('updated_at'),
+            "raw_data": indicator
+        }
+    
     def get_threats(self, days: int = 7) -> List[Dict[str, Any]]:
         """Busca threat actors e campanhas recentes"""
         try:
@@ -0,0 +1,114 @@
+from typing import Optional
+from fastapi import Request
+from requests.adapters import HTTPAdapter
+from app.integrations import elastic, tenable, defender, opencti
+from app.integrations.elastic import ElasticIntegration
+from app.integrations.tenable import TenableIntegration
+from app.integrations.defender import DefenderIntegration
+from app.integrations.opencti import OpenCTIIntegration
+from app.integrations.token_provider import GraphTokenProvider
+from app.config import settings
+import asyncio
+import logging
+import threading
+import httpx
+
+logger = logging.getLogger(__name__)
+
+class IntegrationRegistry:
+    """Clientes de integração de longa duração, criados uma vez no lifespan.
+
+    Mantém pools de conexão keep-alive para Elastic, Graph (HTTP/2), Tenable e
+    OpenCTI. Os clientes síncronos são criados sob demanda, na primeira busca,
+    porque o OpenCTIApiClient faz um health-check no construtor e uma fonte
+    fora do ar não deve impedir a aplicação de subir.
+    """
+
+    def __init__(self):
+        self.elastic_client = None
+        self.graph_http: Optional[httpx.AsyncClient] = None
+        self.defender_credential = None
+        self.graph_tokens: Optional[GraphTokenProvider] = None
+        self._tenable_client = None
+        self._opencti_client = None
+        self._sync_lock = threading.Lock()
+
+    async def start(self):
+        self.elastic_client = elastic.create_client(
+            connections_per_node=settings.ELASTIC_CONNECTIONS_PER_NODE
+        )
+        self.graph_http = httpx.AsyncClient(
+            http2=settings.GRAPH_HTTP2_ENABLED,
+            limits=httpx.Limits(
+                max_connections=settings.GRAPH_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GRAPH_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.GRAPH_KEEPALIVE_EXPIRY_SECONDS
+            ),
+            timeout=settings.SOURCE_FETCH_TIMEOUT_SECONDS
+        )
+        self.defender_credential = defender.create_credential()
+        self.graph_tokens = GraphTokenProvider(self.defender_credential)
+        logger.info("Integration clients initialized")
+
+    async def close(self):
+        if self.elastic_client is not None:
+            await self.elastic_client.close()
+        if self.graph_http is not None:
+            await self.graph_http.aclose()
+        if self.graph_tokens is not None:
+            await self.graph_tokens.close()
+        if self.defender_credential is not None:
+            self.defender_credential.close()
+
+        # Sessões requests dos SDKs síncronos
+        for session in (
+            getattr(self._tenable_client, "_session", None),
+            getattr(self._opencti_client, "session", None)
+        ):
+            if session is not None:
+                await asyncio.to_thread(session.close)
+
+        logger.info("Integration clients closed")
+
+    def elastic(self) -> ElasticIntegration:
+        return ElasticIntegration(client=self.elastic_client)
+
+    def defender(self) -> DefenderIntegration:
+        return DefenderIntegration(
+            credential=self.defender_credential,
+            http_client=self.graph_http,
+            token_provider=self.graph_tokens
+        )
+
+    def tenable(self) -> TenableIntegration:
+        """Integração Tenable com cliente compartilhado (bloqueante: chamar fora do event loop)"""
+        with self._sync_lock:
+            if self._tenable_client is None:
+                client = tenable.create_client()
+                self._mount_pool(getattr(client, "_session", None))
+                self._tenable_client = client
+        return TenableIntegration(client=self._tenable_client)
+
+    def opencti(self) -> OpenCTIIntegration:
+        """Integração OpenCTI com cliente compartilhado (bloqueante: chamar fora do event loop)"""
+        with self._sync_lock:
+            if self._opencti_client is None:
+                client = opencti.create_client()
+                self._mount_pool(getattr(client, "session", None))
+                self._opencti_client = client
+        return OpenCTIIntegration(client=self._opencti_client)
+
+    @staticmethod
+    def _mount_pool(session):
+        if session is None:
+            return
+        adapter = HTTPAdapter(
+            pool_connections=settings.SYNC_CLIENT_POOL_SIZE,
+            pool_maxsize=settings.SYNC_CLIENT_POOL_SIZE
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+def get_integrations(request: Request) -> IntegrationRegistry:
+    """Dependência FastAPI com o registro criado no lifespan"""
+    return request.app.state.integrations
@@ -1,55 +1,147 @@
 from tenable.io import TenableIO
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 from app.config import settings
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+def create_client() -> TenableIO:
+    return TenableIO(
+        access_key=settings.TENABLE_ACCESS_KEY,
+        secret_key=settings.TENABLE_SECRET_KEY
+    )
+
 class TenableIntegration:
-    def __init__(self):
-        self.client = TenableIO(
-            access_key=settings.TENABLE_ACCESS_KEY,
-            secret_key=settings.TENABLE_SECRET_KEY
-        )
+    def __init__(self, client: Optional[TenableIO] = None):
+        self.client = client or create_client()
     
-    def get_critical_vulnerabilities(self, days: int = 7) -> List[Dict[str, Any]]:
-        """Busca vulnerabilidades críticas e de alta severidade"""
+    def get_critical_vulnerabilities(self, days: int = 7, raise_errors: bool = False) -> List[Dict[str, Any]]:
+        """Busca vulnerabilidades críticas e de alta severidade vistas nos últimos dias"""
         try:
             # Filtro para severidade Critical (4) e High (3)
             vulnerabilities = self.client.exports.vulns(
                 severity=['critical', 'high'],
+                last_found=int(time.time()) - days * 86400,
                 num_assets=1000
             )
             
             critical_vulns = []
             for vuln in vulnerabilities:
-                # Filtrar por CVSS >= 7.0 ou VPR >= 7.0
-                cvss_score = vuln.get('cvss3_base_score', vuln.get('cvss_base_score', 0))
-                vpr_score = vuln.get('vpr_score', 0)
-                
-                if cvss_score >= settings.CVSS_HIGH_THRESHOLD or vpr_score >= 7.0:
-                    critical_vulns.append({
-                        "id": f"tenable_{vuln.get('plugin_id')}_{vuln.get('asset', {}).get('uuid', '')}",
-                        "source": "tenable",
-                        "severity": vuln.get('severity', 'unknown'),
-                        "title": vuln.get('plugin_name', 'Unknown Vulnerability'),
-                        "description": vuln.get('plugin_description', ''),
-                        "asset": vuln.get('asset', {}).get('fqdn') or vuln.get('asset', {}).get('ipv4'),
-                        "cvss_score": cvss_score,
-                        "vpr_score": vpr_score,
-                        "exploit_available": vuln.get('exploit_available', False),
-                        "cve": vuln.get('cve', []),
-                        "timestamp": vuln.get('last_found'),
-                        "raw_data": vuln
-                    })
+                normalized = self._normalize_vuln(vuln)
+                if normalized:
+                    critical_vulns.append(normalized)
             
             logger.info(f"Retrieved {len(critical_vulns)} critical vulnerabilities from Tenable")
             return critical_vulns
             
         except Exception as e:
             logger.error(f"Error fetching Tenable vulnerabilities: {str(e)}")
+            if raise_errors:
+                raise
+            return []
+    
+    def iter_vulnerability_changes(
+        self,
+        since: Optional[int] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Tuple[List[Dict[str, Any]], List[str]]]:
+        """Exporta apenas as vulnerabilidades alteradas desde o checkpoint (epoch).
+        
+        Gera lotes (vulnerabilidades abertas, ids corrigidos). Sem checkpoint,
+        exporta o estado completo das vulnerabilidades abertas.
+        """
+        export_filters = {
+            "severity": ['critical', 'high'],
+            "num_assets": 1000
+        }
+        if since:
+            export_filters["since"] = since
+            export_filters["state"] = ['open', 'reopened', 'fixed']
+        else:
+            export_filters["state"] = ['open', 'reopened']
+        
+        open_vulns, fixed_ids = [], []
+        for vuln in self.client.exports.vulns(**export_filters):
+            if str(vuln.get('state', '')).lower() == 'fixed':
+                fixed_ids.append(self._vuln_id(vuln))
+            else:
+                normalized = self._normalize_vuln(vuln)
+                if normalized:
+                    open_vulns.append(normalized)
+                else:
+                    # Caiu abaixo do limiar desde a última exportação
+                    fixed_ids.append(self._vuln_id(vuln))
+            
+            if len(open_vulns) + len(fixed_ids) >= batch_size:
+                yield open_vulns, fixed_ids
+                open_vulns, fixed_ids = [], []
+        
+        if open_vulns or fixed_ids:
+            yield open_vulns, fixed_ids
+    
+    def _vuln_id(self, vuln: Dict[str, Any]) -> str:
+        return f"tenable_{vuln.get('plugin_id')}_{vuln.get('asset', {}).get('uuid', '')}"
+    
+    def _normalize_vuln(self, vuln: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Normaliza uma vulnerabilidade exportada; None se abaixo dos limiares"""
+        # Filtrar por CVSS >= 7.0 ou VPR >= 7.0
+        cvss_score = vuln.get('cvss3_base_score', vuln.get('cvss_base_score', 0))
+        vpr_score = vuln.get('vpr_score', 0)
+        
+        if cvss_score < settings.CVSS_HIGH_THRESHOLD and vpr_score < 7.0:
+            return None
+        
+        return {
+            "id": self._vuln_id(vuln),
+            "source": "tenable",
+            "severity": vuln.get('severity', 'unknown'),
+            "title": vuln.get('plugin_name', 'Unknown Vulnerability'),
+            "description": vuln.get('plugin_description', ''),
+            "asset": vuln.get('asset', {}).get('fqdn') or vuln.get('asset', {}).get('ipv4'),
+            "cvss_score": cvss_score,
+            "vpr_score": vpr_score,
+            "exploit_available": vuln.get('exploit_available', False),
+            "cve": vuln.get('cve', []),
+            "state": vuln.get('state', 'open'),
+            "timestamp": vuln.get('last_found'),
+            "raw_data": vuln
+        }
+    
+    def get_asset_inventory(self, raise_errors: bool = False) -> List[Dict[str, Any]]:
+        """Identidades dos ativos (nomes, IPs, MACs e UUID) da exportação de ativos"""
+        try:
+            inventory = []
+            for asset in self.client.exports.assets():
+                inventory.append({
+                    "uuid": asset.get('id') or asset.get('uuid'),
+                    "fqdns": self._asset_values(asset, 'fqdns', 'fqdn'),
+                    "hostnames": self._asset_values(asset, 'hostnames', 'hostname'),
+                    "netbios_names": self._asset_values(asset, 'netbios_names', 'netbios_name'),
+                    "ipv4s": self._asset_values(asset, 'ipv4s', 'ipv4'),
+                    "ipv6s": self._asset_values(asset, 'ipv6s', 'ipv6'),
+                    "mac_addresses": self._asset_values(asset, 'mac_addresses', 'mac_address'),
+                    "exposure_score": asset.get('exposure_score', 0)
+                })
+            
+            logger.info(f"Retrieved {len(inventory)} assets from Tenable")
+            return inventory
+            
+        except Exception as e:
+            logger.error(f"Error fetching Tenable asset inventory: {str(e)}")
+            if raise_errors:
+                raise
             return []
     
+    @staticmethod
+    def _asset_values(asset: Dict[str, Any], *keys: str) -> List[str]:
+        """Valores de um campo da exportação de ativos (lista ou valor único, conforme a versão)"""
+        for key in keys:
+            value = asset.get(key)
+            if value:
+                return [str(v) for v in value] if isinstance(value, list) else [str(value)]
+        return []
+    
     def get_asset_exposure_scores(self) -> Dict[str, float]:
         """Obtém scores de exposição de ativos"""
         try:
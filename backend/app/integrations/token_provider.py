@@ -0,0 +1,70 @@
+from typing import Optional
+from azure.core.credentials import AccessToken
+from app.config import settings
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+
+class GraphTokenProvider:
+    """Cache de tokens de acesso do Graph compartilhado pelas coroutines do processo.
+
+    O token é reutilizado até GRAPH_TOKEN_EXPIRY_MARGIN_SECONDS antes de expirar.
+    Dentro de GRAPH_TOKEN_REFRESH_AHEAD_SECONDS do vencimento ele continua sendo
+    servido enquanto uma renovação roda em background. A chamada síncrona da
+    credencial Azure sempre roda em uma thread, fora do event loop.
+    """
+
+    def __init__(self, credential, scope: str = GRAPH_SCOPE):
+        self.credential = credential
+        self.scope = scope
+        self.expiry_margin = settings.GRAPH_TOKEN_EXPIRY_MARGIN_SECONDS
+        self.refresh_ahead = settings.GRAPH_TOKEN_REFRESH_AHEAD_SECONDS
+        self._token: Optional[AccessToken] = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def get_token(self) -> str:
+        token = self._token
+        if self._is_usable(token):
+            if token.expires_on - time.time() < self.refresh_ahead:
+                self._schedule_refresh()
+            return token.token
+
+        # Sem token válido: apenas uma coroutine renova, as demais aguardam o lock
+        async with self._lock:
+            token = self._token
+            if self._is_usable(token):
+                return token.token
+            return (await self._refresh()).token
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+
+    def _is_usable(self, token: Optional[AccessToken]) -> bool:
+        return token is not None and token.expires_on - time.time() > self.expiry_margin
+
+    async def _refresh(self) -> AccessToken:
+        token = await asyncio.to_thread(self.credential.get_token, self.scope)
+        self._token = token
+        return token
+
+    def _schedule_refresh(self):
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_ahead())
+
+    async def _refresh_ahead(self):
+        async with self._lock:
+            token = self._token
+            if token is not None and token.expires_on - time.time() >= self.refresh_ahead:
+                return
+            try:
+                await self._refresh()
+            except Exception as e:
+                # O token atual ainda é válido; a próxima chamada tenta de novo
+                logger.warning(f"Background Graph token refresh failed: {str(e)}")
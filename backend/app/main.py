@@ -4,7 +4,14 @@ from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import logging
 
-from app.database import engine, Base
+from app.cache import close_redis
+from app.services.principal_cache import get_principal_cache
+from app.services.password_hashing import shutdown_password_hasher
+from app.integrations.registry import IntegrationRegistry
+from app.services.ingestion import IngestionService
+from app.services.alert_partitions import prepare_alert_tables, ensure_upcoming_partitions
+from app.services.parallel_correlation import shutdown_correlation_pool
+from app.services.source_fetcher import SOURCES, STORE_ONLY_SOURCES
 from app.api import dashboard, admin, export, auth as auth_router
 from app.config import settings
 
@@ -15,12 +22,31 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Creating database tables...")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await prepare_alert_tables()
+    await ensure_upcoming_partitions()
+    
+    integrations = IntegrationRegistry()
+    await integrations.start()
+    app.state.integrations = integrations
+    
+    # Mesmo sem ingestão completa, o estado do Tenable é mantido localmente
+    ingestion = IngestionService(
+        integrations,
+        sources=SOURCES if settings.INGESTION_ENABLED else STORE_ONLY_SOURCES
+    )
+    ingestion.start()
+    get_principal_cache().start()
+    
     logger.info("Application started successfully")
     yield
     # Shutdown
     logger.info("Application shutting down...")
+    await ingestion.stop()
+    await get_principal_cache().stop()
+    await integrations.close()
+    await close_redis()
+    shutdown_correlation_pool()
+    shutdown_password_hasher()
 
 app = FastAPI(
     title="SOC Dashboard API",
@@ -34,6 +60,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
 # Routers
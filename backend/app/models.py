@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, JSON, Enum as SQLEnum
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, JSON, LargeBinary, Index, UniqueConstraint, Enum as SQLEnum, text
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -29,20 +29,59 @@ class DataSource(Base):
     config = Column(JSON, nullable=False)
     is_enabled = Column(Boolean, default=True)
     last_sync = Column(DateTime(timezone=True))
+    sync_state = Column(JSON)  # Checkpoints da ingestão incremental
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 class Alert(Base):
     __tablename__ = "alerts"
+    # Particionada por dia de event_time (partições criadas por app.services.alert_partitions);
+    # chaves únicas precisam incluir a coluna de partição
+    __table_args__ = (
+        UniqueConstraint("alert_id", "event_time", name="uq_alerts_alert_id_event_time"),
+        Index("ix_alerts_alert_id", "alert_id"),
+        Index("ix_alerts_source_event_time", "source", "event_time"),
+        Index("ix_alerts_asset_event_time", "asset", "event_time"),
+        Index("ix_alerts_source_severity_event_time", "source", "severity", "event_time"),
+        # Alertas ainda com o documento original, candidatos ao arquivamento
+        Index("ix_alerts_source_event_time_raw", "source", "event_time", postgresql_where=text("raw_data IS NOT NULL")),
+        {"postgresql_partition_by": "RANGE (event_time)"}
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
     source = Column(String, nullable=False)
-    alert_id = Column(String, unique=True, nullable=False)
+    alert_id = Column(String, nullable=False)
     severity = Column(String, nullable=False)
     title = Column(String, nullable=False)
     description = Column(String)
     asset = Column(String)
-    raw_data = Column(JSON)
+    raw_data = Column(JSON)  # Nulo depois do período quente: o documento fica em alert_archive
+    details = Column(JSON)  # Alerta normalizado pela integração, sem raw_data
+    event_time = Column(DateTime(timezone=True), primary_key=True)  # Hora do evento na origem (ou da coleta)
     correlation_score = Column(Integer, default=0)
     is_correlated = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+class AlertRollup(Base):
+    __tablename__ = "alert_rollups"
+    # Contagens da tabela alerts por hora (UTC) × fonte × severidade, mantidas na ingestão
+    
+    hour = Column(DateTime(timezone=True), primary_key=True)
+    source = Column(String, primary_key=True)
+    severity = Column(String, primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    exploitable = Column(Integer, nullable=False, default=0)  # Vulnerabilidades com exploit disponível
+
+class AlertArchive(Base):
+    __tablename__ = "alert_archive"
+    # raw_data (JSON comprimido com zlib) dos alertas fora do período quente de retenção
+    __table_args__ = (
+        Index("ix_alert_archive_source_event_time", "source", "event_time"),
+    )
+    
+    alert_id = Column(String, primary_key=True)
+    event_time = Column(DateTime(timezone=True), primary_key=True)
+    source = Column(String, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
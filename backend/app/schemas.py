@@ -49,7 +49,7 @@ class CriticalAlert(BaseModel):
     description: Optional[str]
     asset: Optional[str]
     score: float
-    timestamp: datetime
+    timestamp: Optional[datetime]  # None quando a origem não traz um timestamp válido
     correlation_count: int = 0
     related_indicators: List[str] = []
 
@@ -60,3 +60,25 @@ class CorrelationResult(BaseModel):
     vulnerability_count: int
     threat_indicators: List[str]
     mitre_techniques: List[str]
+    remaining_alerts: int = 0
+
+class AssetAlertsPage(BaseModel):
+    asset: str
+    total: int
+    offset: int
+    limit: int
+    alerts: List[CriticalAlert]
+
+class AlertDetail(BaseModel):
+    alert_id: str
+    source: str
+    severity: str
+    title: str
+    description: Optional[str]
+    asset: Optional[str]
+    event_time: Optional[datetime]
+    details: Optional[Dict[str, Any]]
+    raw_data: Optional[Dict[str, Any]]
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,215 @@
+from typing import Iterable, List, Optional, Set
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from app.database import engine, Base, upgrade_columns
+from app.models import Alert
+from app.services.alert_rollups import rebuild_rollups
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Chave do advisory lock que serializa DDL da tabela alerts entre workers
+DDL_LOCK_KEY = 7_301_001
+
+_known: Set[date] = set()
+
+# Colunas copiadas da tabela alerts antiga e o valor usado quando ela não as tem
+# (a tabela original não tinha details, event_time nem updated_at)
+LEGACY_COLUMNS = {
+    "source": None,
+    "alert_id": None,
+    "severity": None,
+    "title": None,
+    "description": "NULL",
+    "asset": "NULL",
+    "raw_data": "NULL",
+    "details": "NULL",
+    "event_time": None,
+    "correlation_score": "0",
+    "is_correlated": "false",
+    "created_at": "now()",
+    "updated_at": "NULL",
+}
+
+def partition_name(day: date) -> str:
+    return f"alerts_{day:%Y%m%d}"
+
+def day_of(value: datetime) -> date:
+    return value.astimezone(timezone.utc).date()
+
+async def _create_partitions(conn: AsyncConnection, days: Iterable[date]):
+    for day in sorted(set(days)):
+        start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF alerts "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{(start + timedelta(days=1)).isoformat()}')"
+        ))
+
+async def _existing_days(conn: AsyncConnection) -> Set[date]:
+    names = (await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'alerts'::regclass"
+    ))).scalars().all()
+
+    days = set()
+    for name in names:
+        try:
+            days.add(datetime.strptime(name, "alerts_%Y%m%d").date())
+        except ValueError:
+            continue
+    return days
+
+async def partition_days() -> List[date]:
+    """Dias com partição criada, do mais antigo para o mais novo"""
+    async with engine.connect() as conn:
+        return sorted(await _existing_days(conn))
+
+async def ensure_partitions(days: Iterable[date], db: Optional[AsyncSession] = None):
+    """Garante as partições diárias dos dias informados.
+
+    Roda em uma transação curta própria: criar uma partição bloqueia a tabela
+    pai, e a transação da ingestão pode durar minutos. Se a sessão informada
+    já tem uma transação aberta (que pode ter gravado em alerts), a criação
+    em outra conexão esperaria por ela: as partições que faltam são criadas
+    dentro dela e só entram em _known em um ensure posterior.
+    """
+    missing = set(days) - _known
+    if not missing:
+        return
+
+    if db is not None and db.in_transaction():
+        conn = await db.connection()
+        existing = await _existing_days(conn)
+        _known.update(existing & missing)
+        missing -= existing
+        if missing:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": DDL_LOCK_KEY})
+            await _create_partitions(conn, missing)
+            logger.info(f"Created alert partitions for {len(missing)} days inside an open transaction")
+        return
+
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": DDL_LOCK_KEY})
+        await _create_partitions(conn, missing)
+    _known.update(missing)
+    logger.info(f"Ensured alert partitions for {len(missing)} days")
+
+async def ensure_upcoming_partitions():
+    """Partições da janela de backfill até ALERT_PARTITIONS_AHEAD_DAYS à frente"""
+    today = datetime.now(timezone.utc).date()
+    start = today - timedelta(days=settings.INGESTION_BACKFILL_HOURS // 24 + 1)
+    await ensure_partitions(
+        start + timedelta(days=offset)
+        for offset in range((today - start).days + settings.ALERT_PARTITIONS_AHEAD_DAYS + 1)
+    )
+
+def _legacy_time(columns: Set[str]) -> str:
+    """Hora do evento de um registro antigo: event_time, created_at ou o momento da conversão"""
+    candidates = [column for column in ("event_time", "created_at") if column in columns]
+    return f"COALESCE({', '.join(candidates + ['now()'])})"
+
+async def _copy_legacy_alerts(conn: AsyncConnection) -> int:
+    """Copia alerts_legacy para as partições, montando o SELECT com as colunas que ela realmente tem"""
+    columns = set((await conn.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'alerts_legacy'"
+    ))).scalars().all())
+    event_time = _legacy_time(columns)
+
+    expressions = []
+    for column, default in LEGACY_COLUMNS.items():
+        if column == "event_time":
+            expressions.append(event_time)
+        elif column in columns or default is None:
+            expressions.append(column)
+        else:
+            expressions.append(default)
+
+    days = (await conn.execute(text(
+        f"SELECT DISTINCT ({event_time} AT TIME ZONE 'UTC')::date FROM alerts_legacy"
+    ))).scalars().all()
+    await _create_partitions(conn, days)
+    result = await conn.execute(text(
+        f"INSERT INTO alerts ({', '.join(LEGACY_COLUMNS)}) "
+        f"SELECT {', '.join(expressions)} FROM alerts_legacy ON CONFLICT DO NOTHING"
+    ))
+    return result.rowcount
+
+async def prepare_alert_tables():
+    """Cria as tabelas e converte uma tabela alerts antiga (sem partições) para o formato particionado.
+
+    A conversão roda uma única vez, com os demais workers aguardando o lock:
+    a tabela antiga é renomeada, os registros são copiados para as partições
+    diárias (event_time nulo vira created_at) e ela é removida.
+    """
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": DDL_LOCK_KEY})
+
+        relkind = (await conn.execute(text(
+            "SELECT c.relkind::text FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.relname = 'alerts' AND n.nspname = current_schema()"
+        ))).scalar()
+
+        legacy = relkind == "r"
+        if legacy:
+            logger.info("Converting alerts table to daily partitions...")
+            for statement in (
+                "ALTER TABLE alerts RENAME TO alerts_legacy",
+                "ALTER INDEX IF EXISTS alerts_pkey RENAME TO alerts_legacy_pkey",
+                "ALTER INDEX IF EXISTS alerts_alert_id_key RENAME TO alerts_legacy_alert_id_key",
+                "ALTER INDEX IF EXISTS ix_alerts_id RENAME TO ix_alerts_legacy_id",
+                "ALTER SEQUENCE IF EXISTS alerts_id_seq RENAME TO alerts_legacy_id_seq"
+            ):
+                await conn.execute(text(statement))
+
+        await conn.run_sync(Base.metadata.create_all)
+        await upgrade_columns(conn)
+
+        # create_all não altera tabelas existentes: índices novos do modelo são criados aqui
+        for index in Alert.__table__.indexes:
+            await conn.execute(CreateIndex(index, if_not_exists=True))
+
+        if legacy:
+            moved = await _copy_legacy_alerts(conn)
+            await conn.execute(text("DROP TABLE alerts_legacy"))
+            logger.info(f"Moved {moved} alerts into daily partitions")
+
+        # Contagens por hora criadas a partir dos alertas já gravados (primeira execução)
+        rollups_missing = (await conn.execute(text(
+            "SELECT NOT EXISTS (SELECT 1 FROM alert_rollups) AND EXISTS (SELECT 1 FROM alerts)"
+        ))).scalar()
+        if rollups_missing:
+            await rebuild_rollups(conn)
+
+async def drop_partitions_before(cutoff: date, keep_sources: Iterable[str] = ()) -> List[date]:
+    """Remove as partições diárias anteriores a cutoff, com as contagens e o arquivo desses dias.
+
+    Dias com registros de keep_sources (fontes sem limite de retenção) são mantidos.
+    """
+    keep_sources = list(keep_sources)
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": DDL_LOCK_KEY})
+
+        expired = []
+        for day in sorted(day for day in await _existing_days(conn) if day < cutoff):
+            if keep_sources and (await conn.execute(
+                text(f"SELECT EXISTS (SELECT 1 FROM {partition_name(day)} WHERE source = ANY(:sources))"),
+                {"sources": keep_sources}
+            )).scalar():
+                continue
+            expired.append(day)
+
+        for day in expired:
+            start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+            bounds = {"start": start, "end": start + timedelta(days=1)}
+            await conn.execute(text("DELETE FROM alert_rollups WHERE hour >= :start AND hour < :end"), bounds)
+            await conn.execute(text("DELETE FROM alert_archive WHERE event_time >= :start AND event_time < :end"), bounds)
+            await conn.execute(text(f"DROP TABLE {partition_name(day)}"))
+
+    _known.difference_update(expired)
+    if expired:
+        logger.info(f"Dropped {len(expired)} expired alert partitions (before {cutoff})")
+    return expired
@@ -0,0 +1,104 @@
+from typing import List, Dict, Tuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func, and_, or_, text
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+from app.database import engine
+from app.models import AlertRollup
+from app.services.events import Event
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _delta(alias: str, sign: int) -> str:
+    """Contribuição de cada linha de alerts (ou da staging) para a sua hora"""
+    return (
+        f"SELECT date_trunc('hour', {alias}.event_time, 'UTC') AS hour, {alias}.source, {alias}.severity, "
+        f"{sign} AS total, "
+        f"CASE WHEN {alias}.details->>'exploit_available' = 'true' THEN {sign} ELSE 0 END AS exploitable"
+    )
+
+def _apply(rows: str) -> str:
+    """Soma um conjunto de deltas nas linhas de alert_rollups"""
+    return f"""
+INSERT INTO alert_rollups (hour, source, severity, total, exploitable)
+SELECT hour, source, severity, SUM(total), SUM(exploitable) FROM ({rows}) AS delta
+GROUP BY hour, source, severity
+HAVING SUM(total) <> 0 OR SUM(exploitable) <> 0
+ON CONFLICT (hour, source, severity) DO UPDATE SET
+    total = alert_rollups.total + EXCLUDED.total,
+    exploitable = alert_rollups.exploitable + EXCLUDED.exploitable
+"""
+
+# Antes do merge da staging: retira a versão gravada de cada alerta e soma a nova
+STAGED_SQL = _apply(
+    f"{_delta('a', -1)} FROM alerts a JOIN alerts_staging s ON s.alert_id = a.alert_id "
+    f"UNION ALL {_delta('s', 1)} FROM alerts_staging s"
+)
+
+def _delete(condition: str, table: str = "alerts") -> str:
+    """Remove alertas e as suas contagens na mesma instrução; retorna o número removido"""
+    return f"""
+WITH removed AS (
+    DELETE FROM {table} WHERE {condition}
+    RETURNING event_time, source, severity, details
+), applied AS ({_apply(f"{_delta('r', -1)} FROM removed r")})
+SELECT count(*) FROM removed
+"""
+
+DELETE_SQL = _delete("alert_id = ANY(:alert_ids)")
+
+def expire_sql(partition: str) -> str:
+    """Alertas de uma fonte anteriores ao fim do período frio, direto em uma partição diária"""
+    return _delete("source = :source AND event_time < :cutoff", partition)
+
+async def rebuild_rollups(conn: AsyncConnection):
+    """Recalcula todas as contagens a partir da tabela alerts"""
+    await conn.execute(text("DELETE FROM alert_rollups"))
+    await conn.execute(text(_apply(f"{_delta('a', 1)} FROM alerts a")))
+    logger.info("Rebuilt alert rollups")
+
+async def prune_rollups():
+    """Descarta as linhas que ficaram zeradas (alertas removidos ou movidos de hora)"""
+    async with engine.begin() as conn:
+        result = await conn.execute(text("DELETE FROM alert_rollups WHERE total = 0 AND exploitable = 0"))
+    if result.rowcount:
+        logger.info(f"Pruned {result.rowcount} empty alert rollups")
+
+def count_events(events: List[Event]) -> Dict[str, Tuple[int, int]]:
+    """Mesmas contagens de window_counts para eventos buscados ao vivo"""
+    counts: Dict[str, Tuple[int, int]] = {}
+    for event in events:
+        severity = str(event.get("severity") or "unknown")
+        total, exploitable = counts.get(severity, (0, 0))
+        counts[severity] = (total + 1, exploitable + bool(event.get("exploit_available")))
+    return counts
+
+def first_hour(hours: int, now: datetime) -> datetime:
+    """Início da janela em horas inteiras: a hora corrente mais as hours - 1 anteriores"""
+    current = now.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return current - timedelta(hours=hours - 1)
+
+async def window_counts(db: AsyncSession, windows: Dict[str, int]) -> Dict[str, Dict[str, Tuple[int, int]]]:
+    """Contagens (total, exploitable) por fonte e severidade nas janelas de cada fonte.
+
+    Cada fonte soma no máximo uma linha por hora e severidade da sua janela.
+    """
+    now = datetime.now(timezone.utc)
+    result = await db.execute(
+        select(
+            AlertRollup.source,
+            AlertRollup.severity,
+            func.sum(AlertRollup.total),
+            func.sum(AlertRollup.exploitable)
+        )
+        .where(or_(*(
+            and_(AlertRollup.source == source, AlertRollup.hour >= first_hour(hours, now))
+            for source, hours in windows.items()
+        )))
+        .group_by(AlertRollup.source, AlertRollup.severity)
+    )
+
+    counts: Dict[str, Dict[str, Tuple[int, int]]] = {source: {} for source in windows}
+    for source, severity, total, exploitable in result.all():
+        counts[source][severity] = (int(total), int(exploitable))
+    return counts
@@ -0,0 +1,199 @@
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from app.models import Alert, AlertArchive
+from app.services.alert_partitions import day_of, ensure_partitions
+from app.services.alert_rollups import STAGED_SQL as ROLLUP_STAGED_SQL, DELETE_SQL
+from app.config import settings
+import json
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Converte timestamps ISO 8601 das integrações em datetime com timezone (UTC)"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+# Colunas gravadas pela ingestão, na ordem do COPY
+ROW_COLUMNS = ("source", "alert_id", "severity", "title", "description", "asset", "raw_data", "details", "event_time")
+
+_STAGING_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS alerts_staging (
+    source varchar, alert_id varchar, severity varchar, title varchar, description varchar,
+    asset varchar, raw_data json, details json, event_time timestamptz
+) ON COMMIT DELETE ROWS
+"""
+
+# Sem timestamp na origem: o alerta mantém a hora em que foi visto pela primeira vez
+_FIRST_SEEN_SQL = """
+UPDATE alerts_staging s SET event_time = COALESCE(
+    (SELECT max(a.event_time) FROM alerts a WHERE a.alert_id = s.alert_id), now()
+)
+WHERE s.event_time IS NULL
+"""
+
+# Um alerta cujo event_time mudou (ex.: last_found do Tenable) troca de partição
+_MOVE_SQL = """
+DELETE FROM alerts a USING alerts_staging s
+WHERE a.alert_id = s.alert_id AND a.event_time <> s.event_time
+"""
+
+_MERGE_SQL = """
+INSERT INTO alerts (source, alert_id, severity, title, description, asset, raw_data, details, event_time, correlation_score, is_correlated)
+SELECT source, alert_id, severity, title, description, asset, raw_data, details, event_time, 0, false FROM alerts_staging
+ON CONFLICT (alert_id, event_time) DO UPDATE SET
+    severity = EXCLUDED.severity,
+    title = EXCLUDED.title,
+    description = EXCLUDED.description,
+    asset = EXCLUDED.asset,
+    raw_data = EXCLUDED.raw_data,
+    details = EXCLUDED.details,
+    updated_at = now()
+"""
+
+def _json(value: Any) -> Optional[str]:
+    return None if value is None else json.dumps(value, default=str)
+
+def compress_payload(raw: str) -> bytes:
+    """raw_data (JSON já serializado) no formato de alert_archive"""
+    return zlib.compress(raw.encode(), 6)
+
+def decompress_payload(payload: bytes) -> Any:
+    return json.loads(zlib.decompress(payload))
+
+def retention_cutoff(source: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Fim do período frio da fonte: alertas anteriores são removidos e não são mais gravados"""
+    days = settings.RETENTION_COLD_DAYS.get(source)
+    if not settings.RETENTION_ENABLED or days is None:
+        return None
+    return (now or datetime.now(timezone.utc)) - timedelta(days=days)
+
+class AlertStore:
+    """Armazenamento local dos alertas normalizados na tabela alerts (particionada por dia)"""
+
+    @staticmethod
+    def to_row(alert: Dict[str, Any]) -> Dict[str, Any]:
+        details = {key: value for key, value in alert.items() if key != "raw_data"}
+        return {
+            "source": alert["source"],
+            "alert_id": alert["id"],
+            "severity": str(alert.get("severity") or "unknown"),
+            "title": alert.get("title") or alert.get("value") or "",
+            "description": alert.get("description"),
+            "asset": alert.get("asset"),
+            "raw_data": alert.get("raw_data"),
+            "details": details,
+            "event_time": parse_timestamp(alert.get("timestamp"))
+        }
+
+    @classmethod
+    async def upsert(cls, db: AsyncSession, alerts: List[Dict[str, Any]]) -> int:
+        """Insere ou atualiza alertas em lote pelo alert_id.
+
+        Cada lote vai por COPY (asyncpg) para uma tabela temporária e é
+        aplicado com um único INSERT ... ON CONFLICT, sem inserts linha a linha.
+        """
+        if not alerts:
+            return 0
+
+        # Um mesmo alert_id repetido no lote faria o ON CONFLICT falhar
+        alerts = list({alert["id"]: alert for alert in alerts}.values())
+
+        # Alertas além do período frio não voltam: a partição do dia pode já ter sido removida
+        alerts = [alert for alert in alerts if not cls._expired(alert)]
+        if not alerts:
+            return 0
+        rows = [cls.to_row(alert) for alert in alerts]
+
+        # Todas as partições antes da primeira escrita: depois dela a criação esperaria por esta transação
+        now = datetime.now(timezone.utc)
+        await ensure_partitions({day_of(row["event_time"] or now) for row in rows}, db)
+
+        # Executado pela sessão: abre a transação antes do COPY direto no driver
+        await db.execute(text(_STAGING_DDL))
+        connection = await (await db.connection()).get_raw_connection()
+        driver = connection.driver_connection
+
+        batch_size = settings.INGESTION_BATCH_SIZE
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            await db.execute(text("TRUNCATE alerts_staging"))
+            await driver.copy_records_to_table(
+                "alerts_staging",
+                records=[
+                    (
+                        row["source"], row["alert_id"], row["severity"], row["title"], row["description"],
+                        row["asset"], _json(row["raw_data"]), _json(row["details"]), row["event_time"]
+                    )
+                    for row in batch
+                ],
+                columns=ROW_COLUMNS
+            )
+            # Estatísticas da tabela temporária para o planner escolher o índice de alert_id
+            await db.execute(text("ANALYZE alerts_staging"))
+            await db.execute(text(_FIRST_SEEN_SQL))
+            # Contagens por hora ajustadas na mesma transação, antes de a versão antiga sair
+            await db.execute(text(ROLLUP_STAGED_SQL))
+            await db.execute(text(_MOVE_SQL))
+            await db.execute(text(_MERGE_SQL))
+
+        return len(alerts)
+
+    @staticmethod
+    def _expired(alert: Dict[str, Any]) -> bool:
+        cutoff = retention_cutoff(alert["source"])
+        if cutoff is None:
+            return False
+        timestamp = parse_timestamp(alert.get("timestamp"))
+        return timestamp is not None and timestamp < cutoff
+
+    @staticmethod
+    async def delete(db: AsyncSession, alert_ids: List[str]) -> int:
+        """Remove alertas pelo alert_id (ex.: vulnerabilidades corrigidas), junto com as suas contagens"""
+        if not alert_ids:
+            return 0
+        result = await db.execute(text(DELETE_SQL), {"alert_ids": list(alert_ids)})
+        await db.execute(delete(AlertArchive).where(AlertArchive.alert_id.in_(alert_ids)))
+        return result.scalar()
+
+    @staticmethod
+    async def get(db: AsyncSession, alert_id: str) -> Optional[Alert]:
+        """Alerta completo, com o documento original (raw_data), inclusive se já arquivado"""
+        result = await db.execute(
+            select(Alert).where(Alert.alert_id == alert_id).order_by(Alert.event_time.desc()).limit(1)
+        )
+        alert = result.scalar_one_or_none()
+        if alert is not None and alert.raw_data is None:
+            payload = (await db.execute(
+                select(AlertArchive.payload)
+                .where(AlertArchive.alert_id == alert.alert_id, AlertArchive.event_time == alert.event_time)
+            )).scalar_one_or_none()
+            if payload is not None:
+                # Valor carregado, não alteração: o alerta continua arquivado
+                set_committed_value(alert, "raw_data", decompress_payload(payload))
+        return alert
+
+    @staticmethod
+    async def load(db: AsyncSession, source: str, hours: int) -> List[Dict[str, Any]]:
+        """Retorna os alertas normalizados de uma fonte na janela solicitada"""
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+        result = await db.execute(
+            select(Alert.details)
+            .where(Alert.source == source, Alert.event_time >= since)
+            .order_by(Alert.event_time.desc())
+        )
+        return [details for details in result.scalars().all() if details]
@@ -0,0 +1,124 @@
+from typing import List, Dict, Any, Optional, Iterable
+from functools import lru_cache
+from app.config import settings
+import ipaddress
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+MAC_ADDRESS = re.compile(r"^[0-9a-f]{2}([:-][0-9a-f]{2}){5}$")
+
+def normalize_identifier(value: Any) -> str:
+    """Forma canônica de um identificador de ativo: IP comprimido, MAC com ':', nomes em minúsculas"""
+    value = str(value or "").strip().strip("[]").lower().rstrip(".")
+    if not value or value == "unknown":
+        return ""
+
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        pass
+
+    if MAC_ADDRESS.match(value):
+        return value.replace("-", ":")
+
+    return value
+
+def is_ip(value: str) -> bool:
+    try:
+        ipaddress.ip_address(value)
+        return True
+    except ValueError:
+        return False
+
+def short_name(name: str) -> str:
+    """Primeiro rótulo de um hostname (web01.corp.local -> web01); IPs ficam inteiros"""
+    if is_ip(name):
+        return name
+    return name.split(".")[0]
+
+def build_aliases(inventory: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+    """Índice alias -> ativo canônico a partir do inventário do Tenable.
+
+    Aliases que apontam para mais de um ativo (IP reaproveitado por DHCP,
+    hostname curto repetido em domínios diferentes) são descartados: nesse
+    caso o identificador não resolve e o evento fica com o próprio nome.
+    """
+    aliases: Dict[str, str] = {}
+    ambiguous = set()
+
+    def add(alias: str, canonical: str):
+        if not alias:
+            return
+        existing = aliases.get(alias)
+        if existing is None:
+            aliases[alias] = canonical
+        elif existing != canonical:
+            ambiguous.add(alias)
+
+    for asset in inventory:
+        names = [normalize_identifier(name) for name in asset.get("fqdns", []) + asset.get("hostnames", []) + asset.get("netbios_names", [])]
+        ips = [normalize_identifier(ip) for ip in asset.get("ipv4s", []) + asset.get("ipv6s", [])]
+        macs = [normalize_identifier(mac) for mac in asset.get("mac_addresses", [])]
+        uuid = normalize_identifier(asset.get("uuid"))
+
+        candidates = [name for name in names if name] + [ip for ip in ips if ip] + ([uuid] if uuid else [])
+        if not candidates:
+            continue
+        canonical = candidates[0]
+
+        for name in names:
+            add(name, canonical)
+            add(short_name(name), canonical)
+        for alias in ips + macs + [uuid]:
+            add(alias, canonical)
+
+    for alias in ambiguous:
+        aliases.pop(alias, None)
+
+    return aliases
+
+class AssetResolver:
+    """Resolve qualquer identificador de ativo (hostname, FQDN, IP, MAC, UUID) para o ativo canônico.
+
+    Identificadores fora do inventário resolvem para o hostname curto ou para
+    o IP completo. As consultas são memorizadas em um LRU limitado; o índice
+    é imutável e um novo resolver substitui o anterior a cada atualização do
+    inventário.
+    """
+
+    def __init__(self, aliases: Optional[Dict[str, str]] = None, version: Optional[float] = None, cache_size: Optional[int] = None):
+        self.aliases = aliases or {}
+        self.version = version
+        self.resolve = lru_cache(maxsize=cache_size or settings.ASSET_RESOLVER_CACHE_SIZE)(self._resolve)
+
+    @classmethod
+    def from_inventory(cls, inventory: List[Dict[str, Any]], version: Optional[float] = None) -> "AssetResolver":
+        return cls(build_aliases(inventory), version)
+
+    @property
+    def size(self) -> int:
+        return len(self.aliases)
+
+    def _resolve(self, asset: str) -> str:
+        key = normalize_identifier(asset)
+        if not key:
+            return ""
+
+        canonical = self.aliases.get(key)
+        if canonical:
+            return canonical
+
+        short = short_name(key)
+        return self.aliases.get(short, short)
+
+_resolver = AssetResolver()
+
+def get_asset_resolver() -> AssetResolver:
+    return _resolver
+
+def set_asset_resolver(resolver: AssetResolver):
+    global _resolver
+    _resolver = resolver
+    logger.info(f"Asset resolver updated with {resolver.size} aliases")
@@ -0,0 +1,198 @@
+from typing import List, Dict, Optional, Tuple
+from collections import OrderedDict, defaultdict
+from app.schemas import CorrelationResult
+from app.services.correlation import CorrelationEngine, page_key
+from app.services.indicator_index import IndicatorIndex
+from app.services.asset_resolver import get_asset_resolver
+from app.services.serialization import encode_correlations
+from app.services.time_buckets import AssetPartial, BucketWindow
+from app.config import settings
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVENT_SOURCES = ("elastic", "tenable", "defender")
+
+class _WindowState:
+    __slots__ = ("fingerprint", "results", "pages")
+
+    def __init__(self, fingerprint: tuple, results: List[CorrelationResult]):
+        self.fingerprint = fingerprint
+        self.results = results
+        self.pages: Dict[tuple, Tuple[bytes, Optional[str], int]] = {}
+
+class BucketedCorrelation(CorrelationEngine):
+    """Correlação de qualquer janela somando as parcelas por ativo dos buckets de hora.
+
+    Cada bucket guarda por ativo as parcelas aditivas do score (Elastic,
+    Tenable, exploits) e os eventos já ordenados, calculadas uma vez e
+    compartilhadas por todas as janelas que o incluem. Só os ativos acima do
+    limiar têm o resultado montado, e o resultado é reaproveitado enquanto as
+    parcelas que o compõem não mudarem.
+    """
+
+    MAX_WINDOWS = 8
+    MAX_CACHED_PAGES = 64
+    MAX_CACHED_RESULTS = 50000
+
+    def __init__(self):
+        super().__init__()
+        self._windows: "OrderedDict[int, _WindowState]" = OrderedDict()
+        self._results: Dict[tuple, CorrelationResult] = {}
+        # Serializa as correlações, que rodam fora do event loop
+        self.lock = asyncio.Lock()
+
+    def has_window(self, hours: int) -> bool:
+        """Se a janela já foi correlacionada (um refresh só refaz os buckets alterados)"""
+        return hours in self._windows
+
+    def results(self, hours: int, windows: Dict[str, BucketWindow], opencti_indicators: List[Dict]) -> List[CorrelationResult]:
+        """Ativos de alto risco da janela, do maior para o menor score"""
+        return list(self._window_state(hours, windows, opencti_indicators).results)
+
+    def page_json(
+        self,
+        hours: int,
+        windows: Dict[str, BucketWindow],
+        opencti_indicators: List[Dict],
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        alerts_per_asset: Optional[int] = None
+    ) -> Tuple[bytes, Optional[str], int]:
+        """Página serializada, cursor da próxima e total; em cache enquanto os buckets da janela não mudarem"""
+        state = self._window_state(hours, windows, opencti_indicators)
+        key = (limit, cursor, alerts_per_asset)
+        cached = state.pages.get(key)
+        if cached is None:
+            page, next_cursor = self.select_page(state.results, limit, cursor, alerts_per_asset)
+            cached = (encode_correlations(page), next_cursor, len(state.results))
+            if len(state.pages) >= self.MAX_CACHED_PAGES:
+                state.pages.clear()
+            state.pages[key] = cached
+        return cached
+
+    def asset_result(
+        self,
+        asset: str,
+        windows: Dict[str, BucketWindow],
+        opencti_indicators: List[Dict]
+    ) -> Optional[CorrelationResult]:
+        """Correlação de um ativo na janela, mesmo abaixo do limiar de risco"""
+        asset = self._normalize_asset_name(asset)
+        if not asset:
+            return None
+
+        partials = []
+        for source in EVENT_SOURCES:
+            window = windows.get(source)
+            if window is None:
+                continue
+            for bucket in window.buckets:
+                partial = bucket.partials().get(asset)
+                if partial is not None:
+                    partials.append(partial)
+
+        if not partials:
+            return None
+        return self._result(asset, partials, IndicatorIndex.for_indicators(opencti_indicators))
+
+    def _window_state(self, hours: int, windows: Dict[str, BucketWindow], opencti_indicators: List[Dict]) -> _WindowState:
+        index = IndicatorIndex.for_indicators(opencti_indicators)
+        fingerprint = (
+            get_asset_resolver(),
+            index,
+            tuple(windows[source].fingerprint() if source in windows else () for source in EVENT_SOURCES)
+        )
+
+        state = self._windows.get(hours)
+        if state is None or state.fingerprint != fingerprint:
+            state = _WindowState(fingerprint, self._correlate(windows, index))
+            self._windows[hours] = state
+            while len(self._windows) > self.MAX_WINDOWS:
+                self._windows.popitem(last=False)
+        self._windows.move_to_end(hours)
+        return state
+
+    def _correlate(self, windows: Dict[str, BucketWindow], index: IndicatorIndex) -> List[CorrelationResult]:
+        # Parcelas de cada ativo em todas as fontes, do bucket mais novo para o mais antigo
+        merged: Dict[str, List[AssetPartial]] = defaultdict(list)
+        for source in EVENT_SOURCES:
+            window = windows.get(source)
+            if window is None:
+                continue
+            for bucket in window.buckets:
+                for asset, partial in bucket.partials().items():
+                    merged[asset].append(partial)
+
+        if len(self._results) > self.MAX_CACHED_RESULTS:
+            self._results.clear()
+
+        correlations = []
+        for asset, partials in merged.items():
+            if self._score(partials, index) < settings.RISK_SCORE_HIGH_THRESHOLD:
+                continue
+            correlation = self._result(asset, partials, index)
+            if correlation.risk_score >= settings.RISK_SCORE_HIGH_THRESHOLD:
+                correlations.append(correlation)
+
+        correlations.sort(key=page_key)
+
+        logger.info(f"Correlated {len(correlations)} high-risk assets from {len(merged)} assets in hour buckets")
+        return correlations
+
+    def _score(self, partials: List[AssetPartial], index: IndicatorIndex) -> int:
+        base_score = 0.0
+        tenable_total = 0.0
+        exploit_count = 0
+        defender_alerts = []
+        sources = set()
+        for partial in partials:
+            base_score += partial.elastic_total
+            tenable_total += partial.tenable_total
+            exploit_count += partial.exploit_count
+            if partial.source == "defender":
+                defender_alerts.extend(partial.events)
+            sources.add(partial.source)
+
+        if exploit_count:
+            tenable_total *= self.weight_factors["vulnerability_exploit"]
+        base_score += tenable_total
+
+        score = self._final_score(base_score, defender_alerts, len(sources), False)
+        if score >= settings.RISK_SCORE_HIGH_THRESHOLD or not index.size:
+            return score
+
+        # O matching de indicadores só é consultado quando pode levar o ativo ao limiar
+        if any(partial.has_indicators(index) for partial in partials):
+            return self._final_score(base_score, defender_alerts, len(sources), True)
+        return score
+
+    def _result(self, asset: str, partials: List[AssetPartial], index: IndicatorIndex) -> CorrelationResult:
+        key = (asset, index, tuple(partial.serial for partial in partials))
+        cached = self._results.get(key)
+        if cached is not None:
+            return cached
+
+        events = {"elastic": [], "tenable": [], "defender": [], "opencti": []}
+        for partial in partials:
+            events[partial.source].extend(partial.events)
+
+        # Mesma ordem de matching do caminho por linha: a lista de indicadores do resultado depende dela
+        indicators = {}
+        if index.size:
+            for source in EVENT_SOURCES:
+                for event in events[source]:
+                    for indicator in index.match([event.get('asset')] + event.get('observables', [])):
+                        indicators[indicator.get('id')] = indicator
+
+        correlation = CorrelationResult.model_construct(
+            **self._calculate_correlation_score(asset, events, list(indicators.values()))
+        )
+        self._results[key] = correlation
+        return correlation
+
+_engine = BucketedCorrelation()
+
+def get_bucketed_correlation() -> BucketedCorrelation:
+    return _engine
@@ -0,0 +1,259 @@
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from itertools import chain
+from app.schemas import CorrelationResult
+from app.services.indicator_index import IndicatorIndex
+from app.config import settings
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+ELASTIC, TENABLE, DEFENDER = 0, 1, 2
+SOURCE_NAMES = ("elastic", "tenable", "defender")
+
+DEFENDER_SEVERITY_SCORES = {"critical": 100, "high": 80, "medium": 50}
+
+# Chave de ordenação das páginas: (-score, ativo), como em correlation.page_key
+RankKey = Tuple[int, str]
+
+class ColumnarCorrelation:
+    """Correlação vetorizada para janelas grandes.
+
+    Os eventos das três fontes viram colunas NumPy (ativo, fonte, risco,
+    CVSS/VPR, exploit, severidade, MITRE) e o score final de cada ativo é
+    calculado por colunas, nas mesmas operações e na mesma ordem do cálculo
+    linha a linha (o resultado é idêntico, não aproximado). Cada valor
+    observado distinto é comparado com os indicadores uma única vez. Os
+    CorrelationResult só são montados para os ativos da página pedida.
+    """
+
+    def __init__(
+        self,
+        weight_factors: Dict[str, float],
+        normalize_asset: Callable[[str], str],
+        build_result: Callable[[str, Dict[str, List], List[Dict]], Dict]
+    ):
+        self.weight_factors = weight_factors
+        self.normalize_asset = normalize_asset
+        self.build_result = build_result
+
+    def correlate(
+        self,
+        elastic_alerts: List[Dict],
+        tenable_vulns: List[Dict],
+        defender_alerts: List[Dict],
+        opencti_indicators: List[Dict]
+    ) -> List[CorrelationResult]:
+        return self.rank(elastic_alerts, tenable_vulns, defender_alerts, opencti_indicators).results()
+
+    def rank(
+        self,
+        elastic_alerts: List[Dict],
+        tenable_vulns: List[Dict],
+        defender_alerts: List[Dict],
+        opencti_indicators: List[Dict]
+    ) -> "ColumnarRanking":
+        """Scores finais e ordem de todos os ativos de alto risco, sem montar os resultados"""
+        events = elastic_alerts + tenable_vulns + defender_alerts
+        sources = np.repeat(
+            np.array([ELASTIC, TENABLE, DEFENDER], dtype=np.int8),
+            [len(elastic_alerts), len(tenable_vulns), len(defender_alerts)]
+        )
+
+        raw_codes, raw_assets, asset_codes, assets = self._asset_codes(events)
+        ranking = ColumnarRanking(self, events, sources, asset_codes, assets, IndicatorIndex.for_indicators(opencti_indicators))
+        if not len(assets):
+            return ranking
+
+        keep = asset_codes >= 0
+        n_assets = len(assets)
+        scores = self._scores_without_intelligence(events, sources, asset_codes, keep, n_assets)
+
+        # O multiplicador de threat intelligence só muda o score final (limitado a 100) de
+        # quem está abaixo de 100 e ainda pode chegar ao limiar com ele
+        intelligence = self.weight_factors["threat_intelligence"]
+        undecided = (scores < 100) & (scores * intelligence >= settings.RISK_SCORE_HIGH_THRESHOLD)
+        if ranking.indicator_index.size and undecided.any():
+            selected = keep.copy()
+            selected[keep] = undecided[asset_codes[keep]]
+            has_indicators = self._has_indicators(ranking.indicator_index, events, raw_codes, raw_assets, asset_codes, selected, n_assets)
+            scores = np.where(has_indicators, scores * intelligence, scores)
+
+        # min(int(score), 100) do cálculo linha a linha
+        final = np.minimum(np.trunc(scores), 100).astype(np.int64)
+        high_risk = np.flatnonzero(final >= settings.RISK_SCORE_HIGH_THRESHOLD).tolist()
+        ranking.order = sorted(((-int(final[code]), assets[code]), code) for code in high_risk)
+
+        logger.info(f"Ranked {len(ranking.order)} high-risk assets ({len(events)} events, columnar)")
+        return ranking
+
+    def _asset_codes(self, events: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Nome bruto e ativo normalizado de cada evento, como códigos (-1 quando sem ativo)"""
+        raw_codes, raw_assets = pd.factorize(
+            pd.Series([event.get("asset") or "" for event in events], dtype=object)
+        )
+
+        # Normaliza cada nome distinto uma única vez; sem nome vira None (código -1)
+        normalized = pd.Series([self.normalize_asset(asset) or None for asset in raw_assets], dtype=object)
+        asset_codes, assets = pd.factorize(normalized)
+
+        codes = asset_codes[raw_codes] if len(raw_codes) else np.array([], dtype=np.int64)
+        return raw_codes, np.asarray(raw_assets, dtype=object), codes, np.asarray(assets, dtype=object)
+
+    def _scores_without_intelligence(
+        self,
+        events: List[Dict],
+        sources: np.ndarray,
+        asset_codes: np.ndarray,
+        keep: np.ndarray,
+        n_assets: int
+    ) -> np.ndarray:
+        """Score de cada ativo antes do multiplicador de threat intelligence"""
+        elastic = keep & (sources == ELASTIC)
+        tenable = keep & (sources == TENABLE)
+        defender = keep & (sources == DEFENDER)
+
+        # Elastic: risk_score * 0.3
+        elastic_idx = np.flatnonzero(elastic)
+        risk = np.fromiter((events[i].get("risk_score", 0) for i in elastic_idx), dtype=np.float64, count=len(elastic_idx))
+
+        # Tenable: max(CVSS, VPR) * 10, triplicado se algum exploit no ativo, * 0.4
+        tenable_idx = np.flatnonzero(tenable)
+        cvss = np.fromiter((events[i].get("cvss_score", 0) for i in tenable_idx), dtype=np.float64, count=len(tenable_idx))
+        vpr = np.fromiter((events[i].get("vpr_score", 0) for i in tenable_idx), dtype=np.float64, count=len(tenable_idx))
+        exploit = np.fromiter((bool(events[i].get("exploit_available", False)) for i in tenable_idx), dtype=bool, count=len(tenable_idx))
+        tenable_codes = asset_codes[tenable_idx]
+        has_exploit = np.bincount(tenable_codes[exploit], minlength=n_assets) > 0
+        vuln_scores = np.maximum(cvss, vpr) * 10
+        vuln_scores = np.where(has_exploit[tenable_codes], vuln_scores * self.weight_factors["vulnerability_exploit"], vuln_scores)
+
+        # bincount soma na ordem dos eventos: Elastic e depois Tenable, como no cálculo linha a linha
+        base = np.bincount(
+            np.concatenate([asset_codes[elastic_idx], tenable_codes]),
+            weights=np.concatenate([risk * 0.3, vuln_scores * 0.4]),
+            minlength=n_assets
+        )
+
+        # Defender: score = (score + severidade * 0.3) * multiplicador, alerta a alerta;
+        # cada passo aplica o k-ésimo alerta de todos os ativos de uma vez
+        defender_idx = np.flatnonzero(defender)
+        if len(defender_idx):
+            increments = np.fromiter(
+                (DEFENDER_SEVERITY_SCORES.get((events[i].get("severity") or "").lower(), 30) * 0.3 for i in defender_idx),
+                dtype=np.float64, count=len(defender_idx)
+            )
+            multipliers = np.where(
+                np.fromiter((bool(events[i].get("mitre_techniques")) for i in defender_idx), dtype=bool, count=len(defender_idx)),
+                self.weight_factors["mitre_technique"],
+                1.0
+            )
+            defender_codes = asset_codes[defender_idx]
+            steps = pd.Series(defender_codes).groupby(defender_codes).cumcount().to_numpy()
+            for step in range(int(steps.max()) + 1):
+                current = steps == step
+                codes = defender_codes[current]
+                base[codes] = (base[codes] + increments[current]) * multipliers[current]
+
+        active_sources = sum(
+            (np.bincount(asset_codes[mask], minlength=n_assets) > 0).astype(np.int8)
+            for mask in (elastic, tenable, defender)
+        )
+        return np.where(active_sources >= 3, base * self.weight_factors["multiple_sources"], base)
+
+    @staticmethod
+    def _has_indicators(
+        indicator_index: IndicatorIndex,
+        events: List[Dict],
+        raw_codes: np.ndarray,
+        raw_assets: np.ndarray,
+        asset_codes: np.ndarray,
+        selected: np.ndarray,
+        n_assets: int
+    ) -> np.ndarray:
+        """Ativos dos eventos selecionados com algum indicador casado; cada nome e observável distinto é comparado uma vez"""
+        kept = np.flatnonzero(selected)
+        raw_names = np.unique(raw_codes[kept])
+        name_hits = np.zeros(len(raw_assets), dtype=bool)
+        name_hits[raw_names] = indicator_index.has_matches(raw_assets[raw_names])
+        event_hits = name_hits[raw_codes]
+
+        observables = [events[position].get("observables") or () for position in kept.tolist()]
+        values = list(chain.from_iterable(observables))
+        if values:
+            positions = np.repeat(kept, np.fromiter(map(len, observables), dtype=np.int64, count=len(observables)))
+            value_codes, unique_values = pd.factorize(pd.Series(values, dtype=object))
+            value_hits = indicator_index.has_matches(unique_values)
+            event_hits[positions[(value_codes >= 0) & value_hits[value_codes]]] = True
+
+        return np.bincount(asset_codes[selected & event_hits], minlength=n_assets) > 0
+
+class ColumnarRanking:
+    """Ativos de alto risco já ordenados por (-score, ativo); os resultados são montados sob demanda"""
+
+    def __init__(
+        self,
+        correlation: ColumnarCorrelation,
+        events: List[Dict],
+        sources: np.ndarray,
+        asset_codes: np.ndarray,
+        assets: np.ndarray,
+        indicator_index: IndicatorIndex
+    ):
+        self.correlation = correlation
+        self.events = events
+        self.sources = sources
+        self.asset_codes = asset_codes
+        self.assets = assets
+        self.indicator_index = indicator_index
+        self.order: List[Tuple[RankKey, int]] = []
+        self._matches: Dict[Any, List[Dict]] = {}
+
+    @property
+    def total(self) -> int:
+        return len(self.order)
+
+    def results(self, limit: Optional[int] = None, after: Optional[RankKey] = None) -> List[CorrelationResult]:
+        """Os limit primeiros ativos depois da chave after, já na ordem das páginas"""
+        order = self.order
+        if after is not None:
+            order = [entry for entry in order if entry[0] > after]
+        if limit is not None:
+            order = order[:limit]
+        if not order:
+            return []
+
+        codes = [code for _, code in order]
+        grouped: Dict[int, Dict[str, List]] = {
+            code: {"elastic": [], "tenable": [], "defender": [], "opencti": []} for code in codes
+        }
+        positions = np.flatnonzero(np.isin(self.asset_codes, codes))
+        for position, code, source in zip(positions.tolist(), self.asset_codes[positions].tolist(), self.sources[positions].tolist()):
+            grouped[code][SOURCE_NAMES[source]].append(self.events[position])
+
+        return [
+            CorrelationResult.model_construct(**self.correlation.build_result(
+                self.assets[code], grouped[code], self._indicators(grouped[code])
+            ))
+            for code in codes
+        ]
+
+    def matches(self, value: Any) -> List[Dict]:
+        """Indicadores que casam com um valor observado, memorizados por valor"""
+        if not isinstance(value, str):
+            return []
+        matched = self._matches.get(value)
+        if matched is None:
+            matched = self._matches[value] = self.indicator_index.match([value])
+        return matched
+
+    def _indicators(self, grouped: Dict[str, List]) -> List[Dict]:
+        if not self.indicator_index.size:
+            return []
+        matched: Dict[str, Dict] = {}
+        for source in SOURCE_NAMES:
+            for event in grouped[source]:
+                for value in [event.get("asset")] + event.get("observables", []):
+                    for indicator in self.matches(value):
+                        matched[indicator.get("id")] = indicator
+        return list(matched.values())
@@ -1,11 +1,34 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from collections import defaultdict
 from app.schemas import CriticalAlert, CorrelationResult
+from app.services.indicator_index import IndicatorIndex
+from app.services.columnar_correlation import ColumnarCorrelation
+from app.services.asset_resolver import get_asset_resolver
+from app.services.alert_store import parse_timestamp
 from app.config import settings
+import base64
+import heapq
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+def encode_cursor(correlation: CorrelationResult) -> str:
+    """Cursor opaco com a chave de ordenação (score, ativo) do último item da página"""
+    raw = json.dumps([correlation.risk_score, correlation.asset]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    try:
+        risk_score, asset = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return -int(risk_score), str(asset)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def page_key(correlation: CorrelationResult) -> Tuple[int, str]:
+    """Ordem das páginas: maior score primeiro, ativo como desempate"""
+    return -correlation.risk_score, correlation.asset
+
 class CorrelationEngine:
     """Motor de correlação de eventos críticos entre múltiplas fontes"""
     
@@ -27,6 +50,10 @@ class CorrelationEngine:
     ) -> List[CorrelationResult]:
         """Correlaciona eventos de todas as fontes por ativo"""
         
+        # Janelas grandes: caminho vetorizado
+        if self._is_columnar(elastic_alerts, tenable_vulns, defender_alerts):
+            return self._columnar().correlate(elastic_alerts, tenable_vulns, defender_alerts, opencti_indicators)
+        
         # Agrupar eventos por ativo
         asset_events = defaultdict(lambda: {
             "elastic": [],
@@ -35,39 +62,139 @@ class CorrelationEngine:
             "opencti": []
         })
         
-        for alert in elastic_alerts:
-            asset = self._normalize_asset_name(alert.get('asset', ''))
-            if asset:
-                asset_events[asset]["elastic"].append(alert)
+        # Índice de observáveis construído uma vez por conjunto de indicadores
+        indicator_index = IndicatorIndex.for_indicators(opencti_indicators)
+        asset_indicators = defaultdict(dict)
         
-        for vuln in tenable_vulns:
-            asset = self._normalize_asset_name(vuln.get('asset', ''))
-            if asset:
-                asset_events[asset]["tenable"].append(vuln)
-        
-        for alert in defender_alerts:
-            asset = self._normalize_asset_name(alert.get('asset', ''))
-            if asset:
-                asset_events[asset]["defender"].append(alert)
-        
-        # Correlacionar indicators com assets (baseado em IPs/domains)
-        for indicator in opencti_indicators:
-            # Lógica de matching de indicators com assets seria implementada aqui
-            pass
+        for source, events in (("elastic", elastic_alerts), ("tenable", tenable_vulns), ("defender", defender_alerts)):
+            for event in events:
+                asset = self._normalize_asset_name(event.get('asset', ''))
+                if not asset:
+                    continue
+                asset_events[asset][source].append(event)
+                
+                # Correlacionar indicators com assets (baseado em IPs/domains/hashes/URLs)
+                if indicator_index.size:
+                    matched = indicator_index.match([event.get('asset')] + event.get('observables', []))
+                    for indicator in matched:
+                        asset_indicators[asset][indicator.get('id')] = indicator
         
         # Calcular scores de correlação
         correlations = []
         for asset, events in asset_events.items():
-            correlation = self._calculate_correlation_score(asset, events, opencti_indicators)
+            indicators = list(asset_indicators[asset].values()) if asset in asset_indicators else []
+            correlation = self._calculate_correlation_score(asset, events, indicators)
             if correlation["risk_score"] >= settings.RISK_SCORE_HIGH_THRESHOLD:
-                correlations.append(CorrelationResult(**correlation))
+                correlations.append(CorrelationResult.model_construct(**correlation))
         
-        # Ordenar por risk score decrescente
-        correlations.sort(key=lambda x: x.risk_score, reverse=True)
+        # Ordenar por risk score decrescente, ativo como desempate (mesma ordem das páginas)
+        correlations.sort(key=page_key)
         
         logger.info(f"Correlated {len(correlations)} high-risk assets")
         return correlations
     
+    def correlate_page(
+        self,
+        elastic_alerts: List[Dict],
+        tenable_vulns: List[Dict],
+        defender_alerts: List[Dict],
+        opencti_indicators: List[Dict],
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        alerts_per_asset: Optional[int] = None
+    ) -> Tuple[List[CorrelationResult], Optional[str], int]:
+        """Uma página da correlação, o cursor da próxima e o total de ativos de alto risco.
+        
+        No caminho vetorizado os resultados só são montados para os ativos da página.
+        """
+        if not self._is_columnar(elastic_alerts, tenable_vulns, defender_alerts):
+            correlations = self.correlate_events(elastic_alerts, tenable_vulns, defender_alerts, opencti_indicators)
+            page, next_cursor = self.select_page(correlations, limit, cursor, alerts_per_asset)
+            return page, next_cursor, len(correlations)
+        
+        ranking = self._columnar().rank(elastic_alerts, tenable_vulns, defender_alerts, opencti_indicators)
+        # Um item a mais indica se existe próxima página
+        candidates = ranking.results(
+            None if limit is None else limit + 1,
+            decode_cursor(cursor) if cursor else None
+        )
+        page, next_cursor = self.select_page(candidates, limit, None, alerts_per_asset)
+        return page, next_cursor, ranking.total
+    
+    def correlate_asset(
+        self,
+        asset: str,
+        elastic_alerts: List[Dict],
+        tenable_vulns: List[Dict],
+        defender_alerts: List[Dict],
+        opencti_indicators: List[Dict]
+    ) -> Optional[CorrelationResult]:
+        """Correlação de um único ativo, com ou sem score acima do limiar"""
+        asset = self._normalize_asset_name(asset)
+        if not asset:
+            return None
+        
+        events = {"elastic": [], "tenable": [], "defender": [], "opencti": []}
+        indicator_index = IndicatorIndex.for_indicators(opencti_indicators)
+        indicators = {}
+        
+        for source, source_events in (("elastic", elastic_alerts), ("tenable", tenable_vulns), ("defender", defender_alerts)):
+            for event in source_events:
+                if self._normalize_asset_name(event.get('asset', '')) != asset:
+                    continue
+                events[source].append(event)
+                if indicator_index.size:
+                    for indicator in indicator_index.match([event.get('asset')] + event.get('observables', [])):
+                        indicators[indicator.get('id')] = indicator
+        
+        if not any(events.values()):
+            return None
+        
+        return CorrelationResult.model_construct(
+            **self._calculate_correlation_score(asset, events, list(indicators.values()))
+        )
+    
+    @staticmethod
+    def select_page(
+        correlations: Iterable[CorrelationResult],
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        alerts_per_asset: Optional[int] = None
+    ) -> Tuple[List[CorrelationResult], Optional[str]]:
+        """Top-K por heap a partir do cursor; retorna a página e o cursor da próxima"""
+        if cursor:
+            after = decode_cursor(cursor)
+            correlations = (c for c in correlations if page_key(c) > after)
+        
+        if limit is None:
+            page = sorted(correlations, key=page_key)
+            next_cursor = None
+        else:
+            # Um item a mais indica se existe próxima página
+            page = heapq.nsmallest(limit + 1, correlations, key=page_key)
+            next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+            page = page[:limit]
+        
+        if alerts_per_asset is not None:
+            page = [CorrelationEngine.cap_alerts(correlation, alerts_per_asset) for correlation in page]
+        
+        return page, next_cursor
+    
+    @staticmethod
+    def cap_alerts(correlation: CorrelationResult, alerts_per_asset: int) -> CorrelationResult:
+        """Mantém os alertas de maior score do ativo e informa quantos ficaram de fora"""
+        if len(correlation.alerts) <= alerts_per_asset:
+            return correlation
+        return correlation.model_copy(update={
+            "alerts": heapq.nlargest(alerts_per_asset, correlation.alerts, key=lambda a: a.score),
+            "remaining_alerts": len(correlation.alerts) - alerts_per_asset
+        })
+    
+    @staticmethod
+    def sorted_alerts(correlation: CorrelationResult) -> List[CriticalAlert]:
+        """Alertas do ativo na mesma ordem usada pelo limite por ativo"""
+        return sorted(correlation.alerts, key=lambda a: a.score, reverse=True)
+    
     def _calculate_correlation_score(
         self,
         asset: str,
@@ -86,15 +213,15 @@ class CorrelationEngine:
             risk_score = alert.get("risk_score", 0)
             base_score += risk_score * 0.3
             
-            alerts.append(CriticalAlert(
+            alerts.append(CriticalAlert.model_construct(
                 id=alert["id"],
                 source="elastic",
                 severity=alert["severity"],
                 title=alert["title"],
                 description=alert.get("description", ""),
                 asset=asset,
-                score=risk_score,
-                timestamp=alert["timestamp"]
+                score=float(risk_score),
+                timestamp=self._timestamp(alert["timestamp"])
             ))
         
         # Processar vulnerabilidades Tenable
@@ -111,53 +238,42 @@ class CorrelationEngine:
             
             base_score += score * 0.4
             
-            alerts.append(CriticalAlert(
+            alerts.append(CriticalAlert.model_construct(
                 id=vuln["id"],
                 source="tenable",
                 severity=vuln["severity"],
                 title=vuln["title"],
                 description=vuln.get("description", ""),
                 asset=asset,
-                score=score,
-                timestamp=vuln["timestamp"]
+                score=float(score),
+                timestamp=self._timestamp(vuln["timestamp"])
             ))
         
         # Processar alertas Defender
         for alert in events["defender"]:
-            severity_score = {"critical": 100, "high": 80, "medium": 50}.get(alert.get("severity", "").lower(), 30)
-            base_score += severity_score * 0.3
+            severity_score = self._defender_severity_score(alert)
             
             # Coletar técnicas MITRE
-            techniques = alert.get("mitre_techniques", [])
-            mitre_techniques.update(techniques)
-            if techniques:
-                base_score *= self.weight_factors["mitre_technique"]
+            mitre_techniques.update(alert.get("mitre_techniques", []))
             
-            alerts.append(CriticalAlert(
+            alerts.append(CriticalAlert.model_construct(
                 id=alert["id"],
                 source="defender",
                 severity=alert["severity"],
                 title=alert["title"],
                 description=alert.get("description", ""),
                 asset=asset,
-                score=severity_score,
-                timestamp=alert["timestamp"]
+                score=float(severity_score),
+                timestamp=self._timestamp(alert["timestamp"])
             ))
         
-        # Aplicar multiplicador de múltiplas fontes
         active_sources = sum(1 for events_list in events.values() if events_list)
-        if active_sources >= 3:
-            base_score *= self.weight_factors["multiple_sources"]
         
-        # Adicionar indicadores OpenCTI relevantes
+        # Adicionar indicadores OpenCTI que casaram com o ativo ou seus eventos
         for indicator in indicators:
             threat_indicators.append(indicator.get("value", ""))
         
-        if threat_indicators:
-            base_score *= self.weight_factors["threat_intelligence"]
-        
-        # Normalizar score final (0-100)
-        final_score = min(int(base_score), 100)
+        final_score = self._final_score(base_score, events["defender"], active_sources, bool(threat_indicators))
         
         return {
             "asset": asset,
@@ -168,11 +284,48 @@ class CorrelationEngine:
             "mitre_techniques": list(mitre_techniques)
         }
     
-    def _normalize_asset_name(self, asset: str) -> str:
-        """Normaliza nomes de assets para matching"""
-        if not asset or asset == "unknown":
-            return ""
+    def _final_score(
+        self,
+        base_score: float,
+        defender_alerts: List[Dict],
+        active_sources: int,
+        has_indicators: bool
+    ) -> int:
+        """Combina a parcela Elastic + Tenable com os alertas Defender e os multiplicadores"""
         
-        # Remover domínio, converter para lowercase
-        asset = asset.lower().split('.')[0]
-        return asset
+        # Cada alerta Defender com técnicas MITRE multiplica o score acumulado até ele
+        for alert in defender_alerts:
+            base_score += self._defender_severity_score(alert) * 0.3
+            if alert.get("mitre_techniques"):
+                base_score *= self.weight_factors["mitre_technique"]
+        
+        # Aplicar multiplicador de múltiplas fontes
+        if active_sources >= 3:
+            base_score *= self.weight_factors["multiple_sources"]
+        
+        if has_indicators:
+            base_score *= self.weight_factors["threat_intelligence"]
+        
+        # Normalizar score final (0-100)
+        return min(int(base_score), 100)
+    
+    @staticmethod
+    def _timestamp(value):
+        # Os modelos são montados sem validação: o timestamp é convertido aqui
+        # (None quando não é reconhecido, nunca o texto original)
+        return parse_timestamp(value)
+    
+    @staticmethod
+    def _defender_severity_score(alert: Dict) -> int:
+        return {"critical": 100, "high": 80, "medium": 50}.get(alert.get("severity", "").lower(), 30)
+    
+    @staticmethod
+    def _is_columnar(*event_lists: List[Dict]) -> bool:
+        return sum(len(events) for events in event_lists) >= settings.CORRELATION_COLUMNAR_MIN_EVENTS
+    
+    def _columnar(self) -> ColumnarCorrelation:
+        return ColumnarCorrelation(self.weight_factors, self._normalize_asset_name, self._calculate_correlation_score)
+    
+    def _normalize_asset_name(self, asset: str) -> str:
+        """Normaliza nomes de assets para matching (alias do inventário do Tenable)"""
+        return get_asset_resolver().resolve(asset)
@@ -0,0 +1,101 @@
+from typing import List, Dict, Any, Iterable, Tuple
+import sys
+
+_MISSING = object()
+_intern = sys.intern
+
+# Valores muito repetidos entre eventos: uma única cópia de cada string
+_INTERNED_FIELDS = frozenset(("source", "severity", "asset", "state", "category", "type"))
+
+class Event:
+    """Evento normalizado compacto: slots por fonte e sem raw_data.
+
+    Aceita o mesmo acesso que os dicts das integrações (event["id"],
+    event.get("asset")), então pode ser usado no lugar deles. Campos
+    ausentes no dict de origem continuam ausentes: get retorna o default.
+    O documento original fica na tabela alerts e é servido pelo detalhe
+    do alerta.
+    """
+
+    __slots__ = ()
+    FIELDS: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Event":
+        event_cls = EVENT_TYPES.get(data.get("source"), GenericEvent)
+        event = event_cls.__new__(event_cls)
+        get = data.get
+        for key in event_cls.FIELDS:
+            value = get(key, _MISSING)
+            if value is _MISSING:
+                continue
+            if key in _INTERNED_FIELDS and type(value) is str:
+                value = _intern(value)
+            setattr(event, key, value)
+        return event
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self.FIELDS else default
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS and hasattr(self, key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.FIELDS if hasattr(self, key)}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+class ElasticEvent(Event):
+    FIELDS = ("id", "source", "severity", "title", "description", "asset", "risk_score", "timestamp", "observables")
+    __slots__ = FIELDS
+
+class TenableEvent(Event):
+    FIELDS = (
+        "id", "source", "severity", "title", "description", "asset",
+        "cvss_score", "vpr_score", "exploit_available", "cve", "state", "timestamp"
+    )
+    __slots__ = FIELDS
+
+class DefenderEvent(Event):
+    FIELDS = (
+        "id", "source", "severity", "title", "description", "asset", "category",
+        "mitre_techniques", "threat_family", "timestamp", "last_updated", "observables"
+    )
+    __slots__ = FIELDS
+
+class IndicatorEvent(Event):
+    FIELDS = (
+        "id", "source", "type", "value", "pattern", "description", "confidence",
+        "score", "labels", "kill_chain_phases", "timestamp", "updated_at"
+    )
+    __slots__ = FIELDS
+
+class GenericEvent(Event):
+    FIELDS = tuple(dict.fromkeys(
+        ElasticEvent.FIELDS + TenableEvent.FIELDS + DefenderEvent.FIELDS + IndicatorEvent.FIELDS
+    ))
+    __slots__ = FIELDS
+
+EVENT_TYPES = {
+    "elastic": ElasticEvent,
+    "tenable": TenableEvent,
+    "defender": DefenderEvent,
+    "opencti": IndicatorEvent
+}
+
+def to_events(items: Iterable[Any]) -> List[Event]:
+    """Converte os dicts das integrações (ou do cache/armazenamento) em eventos compactos"""
+    return [item if isinstance(item, Event) else Event.from_dict(item) for item in items]
+
+def strip_raw_data(items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Remove o documento original dos registros antes de guardá-los em memória ou no cache"""
+    return [{key: value for key, value in item.items() if key != "raw_data"} for item in items]
@@ -1,13 +1,19 @@
 import pandas as pd
 from io import BytesIO
-from typing import List
+from typing import List, Optional
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
-from datetime import datetime
+from datetime import datetime, timezone
 from app.schemas import CorrelationResult
 
+def _excel_datetime(value: Optional[datetime]) -> Optional[datetime]:
+    """O Excel não aceita datetimes com fuso: grava em UTC sem tzinfo"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 class ExportService:
     
     @staticmethod
@@ -26,7 +32,7 @@ class ExportService:
                     "Title": alert.title,
                     "Description": alert.description or "",
                     "Alert Score": alert.score,
-                    "Timestamp": alert.timestamp,
+                    "Timestamp": _excel_datetime(alert.timestamp),
                     "Vulnerability Count": corr.vulnerability_count,
                     "MITRE Techniques": ", ".join(corr.mitre_techniques),
                     "Threat Indicators": ", ".join(corr.threat_indicators)
@@ -0,0 +1,368 @@
+from typing import List, Dict, Optional, Iterable, Tuple
+from collections import Counter, OrderedDict
+from datetime import datetime
+from app.schemas import CorrelationResult
+from app.services.correlation import CorrelationEngine, page_key
+from app.services.indicator_index import IndicatorIndex
+from app.services.asset_resolver import get_asset_resolver
+from app.services.serialization import encode_correlations
+from app.services.alert_store import parse_timestamp
+from app.config import settings
+import asyncio
+import heapq
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVENT_SOURCES = ("elastic", "tenable", "defender")
+
+class _EventRecord:
+    __slots__ = ("event", "asset", "source", "version", "indicator_ids", "time")
+
+    def __init__(self, event, asset, source, version, indicator_ids, time):
+        self.event = event
+        self.asset = asset
+        self.source = source
+        self.version = version
+        self.indicator_ids = indicator_ids
+        self.time = time
+
+def _defender_time(alert: Dict) -> float:
+    timestamp = parse_timestamp(alert.get("timestamp"))
+    return timestamp.timestamp() if timestamp else float("-inf")
+
+class _AssetState:
+    """Estado acumulado de um ativo: eventos, contagem de exploits, técnicas MITRE e indicadores"""
+
+    __slots__ = ("events", "exploit_count", "mitre", "indicator_refs", "score", "result")
+
+    def __init__(self):
+        self.events: Dict[str, Dict[str, Dict]] = {source: {} for source in EVENT_SOURCES}
+        self.exploit_count = 0
+        self.mitre: Counter = Counter()
+        self.indicator_refs: Counter = Counter()  # id do indicador -> eventos que casaram
+        self.score: Optional[int] = None
+        self.result: Optional[CorrelationResult] = None
+
+    def is_empty(self) -> bool:
+        return not any(self.events.values())
+
+    def active_sources(self) -> int:
+        return sum(1 for events in self.events.values() if events)
+
+class IncrementalCorrelationEngine(CorrelationEngine):
+    """Motor de correlação com estado por ativo, atualizado por deltas.
+
+    Inserções, atualizações e remoções de eventos ajustam apenas as parcelas
+    dos ativos afetados; só esses ativos são recalculados e só os que passam
+    do limiar de risco têm o CorrelationResult reconstruído. O custo de cada
+    atualização é proporcional aos eventos alterados, não à janela inteira.
+    """
+
+    _windows: "OrderedDict[int, IncrementalCorrelationEngine]" = OrderedDict()
+    MAX_WINDOWS = 8
+    MAX_CACHED_PAGES = 64
+
+    def __init__(self):
+        super().__init__()
+        # Serializa sync e consultas, que rodam fora do event loop
+        self.lock = asyncio.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._resolver = get_asset_resolver()
+        self._assets: Dict[str, _AssetState] = {}
+        self._events: Dict[str, _EventRecord] = {}
+        self._expiry: List[Tuple[float, str]] = []
+        self._index: Optional[IndicatorIndex] = None
+        self._indicators: Dict[str, Dict] = {}
+        self._dirty: set = set()
+        self._sorted: Optional[List[CorrelationResult]] = None
+        self._pages: Dict[tuple, Tuple[bytes, Optional[str], int]] = {}
+        self._revision: Optional[tuple] = None
+        self.last_changed: List[str] = []
+
+    @classmethod
+    def for_window(cls, hours: int) -> "IncrementalCorrelationEngine":
+        """Engine mantido por janela (hours), com as janelas menos usadas descartadas"""
+        engine = cls._windows.get(hours)
+        if engine is None:
+            engine = cls()
+            cls._windows[hours] = engine
+            while len(cls._windows) > cls.MAX_WINDOWS:
+                cls._windows.popitem(last=False)
+        cls._windows.move_to_end(hours)
+        return engine
+
+    def sync(
+        self,
+        elastic_alerts: List[Dict],
+        tenable_vulns: List[Dict],
+        defender_alerts: List[Dict],
+        opencti_indicators: List[Dict],
+        revision: Optional[tuple] = None
+    ):
+        """Aplica como deltas a diferença entre um snapshot da janela e o estado atual.
+
+        revision identifica o snapshot (FetchResult.revision); se for o mesmo
+        já aplicado, nada mudou e a comparação evento a evento é pulada.
+        """
+        if self._resolver is not get_asset_resolver():
+            # Novo inventário: os eventos podem mudar de ativo, o estado é refeito
+            self._reset()
+        elif revision is not None and revision == self._revision:
+            return
+
+        self.set_indicators(opencti_indicators)
+
+        seen = set()
+        upserts = []
+        for source, events in (("elastic", elastic_alerts), ("tenable", tenable_vulns), ("defender", defender_alerts)):
+            for event in events:
+                event_id = event["id"]
+                seen.add(event_id)
+                record = self._events.get(event_id)
+                if record is None or record.version != self._version(event):
+                    upserts.append((source, event))
+
+        # Eventos que saíram do snapshot: expiraram da janela ou foram removidos na origem
+        deletes = [event_id for event_id in self._events if event_id not in seen]
+
+        self.apply(upserts, deletes)
+        self._revision = revision
+
+    def apply(self, upserts: Iterable[Tuple[str, Dict]] = (), deletes: Iterable[str] = ()):
+        """Aplica inserções/atualizações (fonte, evento) e remoções por id"""
+        # O estado deixa de corresponder a um snapshot conhecido
+        self._revision = None
+        for event_id in deletes:
+            self._remove(event_id)
+        for source, event in upserts:
+            self._remove(event["id"])
+            self._insert(source, event)
+
+    def expire(self, cutoff: datetime):
+        """Remove os eventos anteriores ao início da janela"""
+        threshold = cutoff.timestamp()
+        while self._expiry and self._expiry[0][0] < threshold:
+            event_time, event_id = heapq.heappop(self._expiry)
+            record = self._events.get(event_id)
+            # Entradas antigas do heap (evento já atualizado ou removido) são ignoradas
+            if record is not None and record.time == event_time:
+                self._remove(event_id)
+
+    def set_indicators(self, indicators: List[Dict]):
+        """Troca o conjunto de indicadores, refazendo o matching só quando ele muda"""
+        index = IndicatorIndex.for_indicators(indicators)
+        if index is self._index:
+            return
+
+        self._index = index
+        self._indicators = {indicator.get("id"): indicator for indicator in indicators}
+        for record in self._events.values():
+            matched = self._match(record.event)
+            if matched != record.indicator_ids:
+                state = self._assets[record.asset]
+                state.indicator_refs.subtract(record.indicator_ids)
+                state.indicator_refs.update(matched)
+                record.indicator_ids = matched
+                self._dirty.add(record.asset)
+            elif matched:
+                # Mesmos ids, mas o indicador pode ter sido atualizado (score, descrição)
+                self._dirty.add(record.asset)
+
+    def results(self) -> List[CorrelationResult]:
+        """Recalcula os ativos alterados e retorna os de alto risco, do maior para o menor score"""
+        self._refresh()
+        if self._sorted is None:
+            correlations = list(self._high_risk())
+            correlations.sort(key=page_key)
+            self._sorted = correlations
+
+        return list(self._sorted)
+
+    def page_json(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        alerts_per_asset: Optional[int] = None
+    ) -> Tuple[bytes, Optional[str], int]:
+        """Página serializada, cursor da próxima e total de ativos; em cache enquanto nenhum ativo mudar"""
+        self._refresh()
+        key = (limit, cursor, alerts_per_asset)
+        cached = self._pages.get(key)
+        if cached is None:
+            high_risk = list(self._high_risk())
+            page, next_cursor = self.select_page(high_risk, limit, cursor, alerts_per_asset)
+            cached = (encode_correlations(page), next_cursor, len(high_risk))
+            if len(self._pages) >= self.MAX_CACHED_PAGES:
+                self._pages.clear()
+            self._pages[key] = cached
+        return cached
+
+    def asset_result(self, asset: str) -> Optional[CorrelationResult]:
+        """Correlação atual de um ativo, mesmo abaixo do limiar de risco"""
+        self._refresh()
+        asset = self._normalize_asset_name(asset)
+        state = self._assets.get(asset)
+        if state is None:
+            return None
+        if state.result is not None:
+            return state.result
+
+        events = {source: list(state.events[source].values()) for source in EVENT_SOURCES}
+        events["defender"] = self._ordered_defender_alerts(state)
+        events["opencti"] = []
+        indicator_ids = [indicator_id for indicator_id, count in state.indicator_refs.items() if count > 0]
+        indicators = [self._indicators[i] for i in indicator_ids if i in self._indicators]
+        return CorrelationResult.model_construct(**self._calculate_correlation_score(asset, events, indicators))
+
+    def _refresh(self):
+        """Recalcula os ativos alterados desde a última consulta"""
+        if not self._dirty:
+            return
+
+        self.last_changed = []
+        for asset in self._dirty:
+            self._rescore(asset)
+        self._dirty.clear()
+        self._sorted = None
+        self._pages.clear()
+
+        logger.info(f"Rescored {len(self.last_changed)} changed assets")
+
+    def _high_risk(self) -> Iterable[CorrelationResult]:
+        return (state.result for state in self._assets.values() if state.result is not None)
+
+    def changed_results(self) -> List[CorrelationResult]:
+        """Resultados dos ativos cujo score mudou no último recálculo"""
+        return [
+            self._assets[asset].result
+            for asset in self.last_changed
+            if asset in self._assets and self._assets[asset].result is not None
+        ]
+
+    def _insert(self, source: str, event: Dict):
+        asset = self._normalize_asset_name(event.get('asset', ''))
+        if not asset:
+            return
+
+        state = self._assets.get(asset)
+        if state is None:
+            state = self._assets[asset] = _AssetState()
+
+        state.events[source][event["id"]] = event
+        self._adjust_components(state, source, event, 1)
+
+        matched = self._match(event)
+        state.indicator_refs.update(matched)
+
+        timestamp = parse_timestamp(event.get("timestamp"))
+        event_time = timestamp.timestamp() if timestamp else float("inf")
+        self._events[event["id"]] = _EventRecord(event, asset, source, self._version(event), matched, event_time)
+        heapq.heappush(self._expiry, (event_time, event["id"]))
+        if len(self._expiry) > 2 * len(self._events) + 1024:
+            # Descarta as entradas de eventos já atualizados ou removidos
+            self._expiry = [(record.time, event_id) for event_id, record in self._events.items()]
+            heapq.heapify(self._expiry)
+        self._dirty.add(asset)
+
+    def _remove(self, event_id: str):
+        record = self._events.pop(event_id, None)
+        if record is None:
+            return
+
+        state = self._assets[record.asset]
+        del state.events[record.source][event_id]
+        self._adjust_components(state, record.source, record.event, -1)
+        state.indicator_refs.subtract(record.indicator_ids)
+        self._dirty.add(record.asset)
+
+    def _adjust_components(self, state: _AssetState, source: str, event: Dict, sign: int):
+        # Só contadores inteiros: as parcelas do score são somadas dos eventos em _base_score
+        if source == "tenable":
+            if event.get("exploit_available", False):
+                state.exploit_count += sign
+        elif source == "defender":
+            state.mitre.update({technique: sign for technique in event.get("mitre_techniques", [])})
+
+    def _match(self, event: Dict) -> List[str]:
+        if self._index is None or not self._index.size:
+            return []
+        matched = self._index.match([event.get('asset')] + event.get('observables', []))
+        return [indicator.get("id") for indicator in matched]
+
+    def _rescore(self, asset: str):
+        state = self._assets.get(asset)
+        if state is None:
+            return
+
+        if state.is_empty():
+            del self._assets[asset]
+            if state.score is not None:
+                self.last_changed.append(asset)
+            return
+
+        indicator_ids = [indicator_id for indicator_id, count in state.indicator_refs.items() if count > 0]
+        score = self._final_score(
+            self._base_score(state),
+            self._ordered_defender_alerts(state),
+            state.active_sources(),
+            bool(indicator_ids)
+        )
+
+        if score >= settings.RISK_SCORE_HIGH_THRESHOLD:
+            # Só ativos acima do limiar têm os alertas e o resultado reconstruídos
+            events = {source: list(state.events[source].values()) for source in EVENT_SOURCES}
+            events["defender"] = self._ordered_defender_alerts(state)
+            events["opencti"] = []
+            indicators = [self._indicators[i] for i in indicator_ids if i in self._indicators]
+            state.result = CorrelationResult.model_construct(**self._calculate_correlation_score(asset, events, indicators))
+        else:
+            state.result = None
+
+        if score != state.score:
+            self.last_changed.append(asset)
+        state.score = score
+
+    def _base_score(self, state: _AssetState) -> float:
+        """Parcela Elastic + Tenable somada dos eventos atuais, na ordem do cálculo linha a linha.
+
+        Totais mantidos com += / -= a cada entrada e saída de evento acumulariam
+        erro de ponto flutuante e se afastariam de um recálculo completo.
+        """
+        base_score = 0
+        for alert in state.events["elastic"].values():
+            base_score += alert.get("risk_score", 0) * 0.3
+
+        has_exploit = state.exploit_count > 0
+        for vuln in state.events["tenable"].values():
+            score = max(vuln.get("cvss_score", 0), vuln.get("vpr_score", 0)) * 10
+            if has_exploit:
+                score *= self.weight_factors["vulnerability_exploit"]
+            base_score += score * 0.4
+        return base_score
+
+    @staticmethod
+    def _ordered_defender_alerts(state: _AssetState) -> List[Dict]:
+        # Mesma ordem da busca (createdDateTime desc): o multiplicador MITRE depende dela.
+        # Pelo instante e não pelo texto: "Z" e "+00:00" ou frações de segundo não ordenam como texto
+        return sorted(state.events["defender"].values(), key=_defender_time, reverse=True)
+
+    @staticmethod
+    def _version(event: Dict) -> tuple:
+        """Campos que afetam o score ou o resultado; mudança em qualquer um é uma atualização"""
+        return (
+            event.get("asset"),
+            event.get("severity"),
+            event.get("title"),
+            event.get("description"),
+            event.get("timestamp"),
+            event.get("last_updated"),
+            event.get("risk_score"),
+            event.get("cvss_score"),
+            event.get("vpr_score"),
+            event.get("exploit_available"),
+            tuple(event.get("mitre_techniques", [])),
+            tuple(event.get("observables", []))
+        )
@@ -0,0 +1,227 @@
+from typing import List, Dict, Any, Optional, Iterable, Sequence, Tuple
+from collections import defaultdict
+from functools import lru_cache
+from urllib.parse import urlsplit
+import numpy as np
+import pandas as pd
+import ipaddress
+import logging
+import re
+import socket
+
+logger = logging.getLogger(__name__)
+
+# Comparações simples de padrões STIX: [ipv4-addr:value = '10.0.0.1']
+STIX_COMPARISON = re.compile(r"([\w-]+):([\w.'\-]+)\s*=\s*'((?:[^'\\]|\\.)*)'")
+
+# IPv4 decimal sem zeros à esquerda: exatamente os valores que ipaddress.ip_address aceita
+IPV4_PATTERN = r"(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)(?:\.(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)){3}"
+
+# Nomes com ponto, sem espaço, barra ou dois-pontos: classify_observable os trata como domínio
+DOMAIN_PATTERN = r"[^\s/:]*\.[^\s/:]*"
+
+HASH_LENGTHS = {32, 40, 64, 128}
+HEX_CHARS = set("0123456789abcdef")
+HASH_PATTERN = "|".join(f"[0-9a-f]{{{length}}}" for length in sorted(HASH_LENGTHS))
+
+# Os mesmos IPs e hosts se repetem em milhares de eventos: cada valor é classificado uma vez
+@lru_cache(maxsize=65536)
+def classify_observable(value: str) -> Optional[Tuple[str, Any]]:
+    """Classifica um valor observado em (tipo, valor normalizado): ip, network, url, hash ou domain"""
+    value = (value or "").strip().strip("[]").lower()
+    if not value or value == "unknown":
+        return None
+
+    if "://" in value:
+        return "url", value.rstrip("/")
+
+    try:
+        if "/" in value:
+            return "network", ipaddress.ip_network(value, strict=False)
+        return "ip", ipaddress.ip_address(value)
+    except ValueError:
+        pass
+
+    if len(value) in HASH_LENGTHS and set(value) <= HEX_CHARS:
+        return "hash", value
+
+    if "." in value and " " not in value:
+        return "domain", value.rstrip(".")
+
+    return None
+
+def observables_from_pattern(pattern: str) -> List[Tuple[str, Any]]:
+    """Extrai os observáveis de um padrão STIX"""
+    observables = []
+    for object_type, _, raw_value in STIX_COMPARISON.findall(pattern or ""):
+        value = raw_value.replace("\\'", "'")
+        if object_type in ("ipv4-addr", "ipv6-addr"):
+            classified = classify_observable(value)
+        elif object_type == "url":
+            classified = ("url", value.lower().rstrip("/"))
+        elif object_type == "file":
+            classified = ("hash", value.lower())
+        elif object_type in ("domain-name", "hostname", "x-opencti-hostname"):
+            classified = ("domain", value.lower().rstrip("."))
+        else:
+            classified = None
+        if classified:
+            observables.append(classified)
+    return observables
+
+class IndicatorIndex:
+    """Índice de observáveis dos indicadores OpenCTI para matching em tempo quase constante.
+
+    IPs exatos, faixas CIDR (uma tabela por tamanho de prefixo), domínios com
+    matching por sufixo, hashes de arquivo e URLs. Deve ser construído uma vez
+    por atualização dos indicadores; use IndicatorIndex.for_indicators.
+    """
+
+    _cached: Optional[Tuple[int, "IndicatorIndex"]] = None
+
+    def __init__(self, indicators: Iterable[Dict[str, Any]]):
+        self.ips: Dict[Any, List[Dict]] = defaultdict(list)
+        self.networks: Dict[Tuple[int, int], Dict[Any, List[Dict]]] = defaultdict(lambda: defaultdict(list))
+        self.domains: Dict[str, List[Dict]] = defaultdict(list)
+        self.hashes: Dict[str, List[Dict]] = defaultdict(list)
+        self.urls: Dict[str, List[Dict]] = defaultdict(list)
+        self.size = 0
+        self._ipv4_tables: Optional[List[Tuple[int, np.ndarray]]] = None
+
+        for indicator in indicators:
+            observables = observables_from_pattern(indicator.get("pattern"))
+            if not observables:
+                # Sem padrão STIX legível: o nome do indicador costuma ser o próprio observável
+                classified = classify_observable(indicator.get("value", ""))
+                observables = [classified] if classified else []
+            for kind, value in observables:
+                self._add(kind, value, indicator)
+            self.size += 1
+
+    @classmethod
+    def for_indicators(cls, indicators: List[Dict[str, Any]]) -> "IndicatorIndex":
+        """Reutiliza o índice enquanto o conjunto de indicadores não mudar.
+
+        A sincronização incremental atualiza um indicador mantendo o id: a
+        versão (updated_at) e o padrão/valor também entram na impressão digital.
+        """
+        fingerprint = hash(tuple(
+            (indicator.get("id"), indicator.get("updated_at"), indicator.get("pattern"), indicator.get("value"))
+            for indicator in indicators
+        ))
+        cached = cls._cached
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        index = cls(indicators)
+        cls._cached = (fingerprint, index)
+        logger.info(f"Built indicator index for {index.size} indicators")
+        return index
+
+    def _add(self, kind: str, value: Any, indicator: Dict[str, Any]):
+        if kind == "ip":
+            self.ips[value].append(indicator)
+        elif kind == "network":
+            if value.num_addresses == 1:
+                self.ips[value.network_address].append(indicator)
+            else:
+                self.networks[(value.version, value.prefixlen)][value].append(indicator)
+        elif kind == "domain":
+            self.domains[value].append(indicator)
+        elif kind == "hash":
+            self.hashes[value].append(indicator)
+        elif kind == "url":
+            self.urls[value].append(indicator)
+
+    def match(self, observables: Iterable[str]) -> List[Dict[str, Any]]:
+        """Indicadores que casam com algum dos valores observados (sem repetição)"""
+        matched: Dict[str, Dict[str, Any]] = {}
+        for observable in observables:
+            classified = classify_observable(observable) if isinstance(observable, str) else None
+            if classified is None:
+                continue
+            for indicator in self._lookup(*classified):
+                matched[indicator.get("id")] = indicator
+        return list(matched.values())
+
+    def has_matches(self, values: Sequence[Any]) -> np.ndarray:
+        """Para cada valor, se algum indicador casa com ele.
+
+        Mesma normalização de classify_observable, aplicada à coluna inteira.
+        IPv4 (a maioria dos observáveis) são comparados em bloco como inteiros
+        contra os IPs e faixas do índice, hashes contra a tabela de hashes e
+        domínios vão direto à tabela de sufixos; os demais valores passam por
+        match.
+        """
+        values = pd.Series(values, dtype=object)
+        hits = np.zeros(len(values), dtype=bool)
+        if not self.size or not len(values):
+            return hits
+
+        normalized = values.str.strip().str.strip("[]").str.lower()
+        text = normalized.to_numpy()
+        ipv4 = normalized.str.fullmatch(IPV4_PATTERN).fillna(False).to_numpy(dtype=bool)
+        domain = normalized.str.fullmatch(DOMAIN_PATTERN).fillna(False).to_numpy(dtype=bool) & ~ipv4
+        file_hash = normalized.str.fullmatch(HASH_PATTERN).fillna(False).to_numpy(dtype=bool)
+        hits[file_hash] = normalized[file_hash].isin(self.hashes.keys()).to_numpy(dtype=bool)
+
+        positions = np.flatnonzero(ipv4)
+        if len(positions):
+            addresses = np.fromiter(
+                (int.from_bytes(socket.inet_aton(value), "big") for value in text[positions]),
+                dtype=np.int64, count=len(positions)
+            )
+            found = np.zeros(len(positions), dtype=bool)
+            for shift, table in self._ipv4_lookup_tables():
+                found |= np.isin(addresses >> shift, table)
+            hits[positions] = found
+
+        if self.domains:
+            for position in np.flatnonzero(domain).tolist():
+                hits[position] = bool(self._lookup("domain", text[position].rstrip(".")))
+
+        for position in np.flatnonzero(~(ipv4 | domain | file_hash)).tolist():
+            value = values.iat[position]
+            hits[position] = isinstance(value, str) and bool(self.match([value]))
+        return hits
+
+    def _ipv4_lookup_tables(self) -> List[Tuple[int, np.ndarray]]:
+        """(deslocamento, prefixos) dos IPs exatos e de cada tamanho de faixa IPv4"""
+        if self._ipv4_tables is None:
+            tables = [(0, np.array([int(ip) for ip in self.ips if ip.version == 4], dtype=np.int64))]
+            for (version, prefixlen), networks in self.networks.items():
+                if version == 4:
+                    shift = 32 - prefixlen
+                    tables.append((shift, np.array([int(network.network_address) >> shift for network in networks], dtype=np.int64)))
+            self._ipv4_tables = tables
+        return self._ipv4_tables
+
+    def _lookup(self, kind: str, value: Any) -> List[Dict[str, Any]]:
+        if kind == "ip":
+            found = list(self.ips.get(value, []))
+            for (version, prefixlen), networks in self.networks.items():
+                if version != value.version:
+                    continue
+                network = ipaddress.ip_network(f"{value}/{prefixlen}", strict=False)
+                found.extend(networks.get(network, []))
+            return found
+
+        if kind == "domain":
+            # evil.com casa com evil.com, www.evil.com, a.b.evil.com...
+            found = []
+            labels = value.split(".")
+            for i in range(len(labels) - 1):
+                found.extend(self.domains.get(".".join(labels[i:]), []))
+            return found
+
+        if kind == "hash":
+            return self.hashes.get(value, [])
+
+        if kind == "url":
+            found = list(self.urls.get(value, []))
+            host = urlsplit(value).hostname
+            if host:
+                found.extend(self._lookup(*(classify_observable(host) or ("domain", host))))
+            return found
+
+        return []
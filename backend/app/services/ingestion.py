@@ -0,0 +1,314 @@
+from typing import List, Dict, Any, Optional, AsyncIterator, Iterable, Iterator, Callable
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from redis.exceptions import RedisError
+from app.database import AsyncSessionLocal
+from app.models import DataSource
+from app.cache import get_redis
+from app.integrations.registry import IntegrationRegistry
+from app.services.alert_store import AlertStore, parse_timestamp
+from app.services.alert_partitions import ensure_upcoming_partitions
+from app.services.alert_rollups import prune_rollups
+from app.services.retention import RetentionService
+from app.services.source_fetcher import SOURCES
+from app.services.asset_resolver import AssetResolver, build_aliases, get_asset_resolver, set_asset_resolver
+from app.config import settings
+import asyncio
+import json
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+ASSET_ALIASES_KEY = "soc:assets:aliases"
+
+PARTITION_MAINTENANCE_SECONDS = 3600
+
+class IngestionService:
+    """Coleta periódica e incremental das fontes para a tabela alerts"""
+
+    def __init__(self, integrations: IntegrationRegistry, sources: Iterable[str] = SOURCES):
+        self.integrations = integrations
+        self.sources = tuple(sources)
+        self.interval = settings.INGESTION_INTERVAL_SECONDS
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        for source in self.sources:
+            self._tasks.append(asyncio.create_task(self._run_forever(source), name=f"ingestion-{source}"))
+        if "tenable" in self.sources:
+            self._tasks.append(asyncio.create_task(self._refresh_assets_forever(), name="ingestion-assets"))
+        self._tasks.append(asyncio.create_task(self._maintain_partitions_forever(), name="ingestion-partitions"))
+        if settings.RETENTION_ENABLED:
+            self._tasks.append(asyncio.create_task(self._apply_retention_forever(), name="ingestion-retention"))
+        logger.info(f"Ingestion started for {', '.join(self.sources)} every {self.interval}s")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _run_forever(self, source: str):
+        while True:
+            try:
+                await self.sync_source(source)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error ingesting {source}: {str(e)}")
+            await asyncio.sleep(self._interval(source))
+
+    async def _refresh_assets_forever(self):
+        while True:
+            try:
+                await self.refresh_asset_resolver()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error refreshing asset inventory: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def _maintain_partitions_forever(self):
+        # Partições dos próximos dias criadas antes da virada, fora do caminho da ingestão;
+        # as contagens por hora zeradas são descartadas no mesmo ciclo
+        while True:
+            await asyncio.sleep(PARTITION_MAINTENANCE_SECONDS)
+            try:
+                await ensure_upcoming_partitions()
+                await prune_rollups()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error maintaining alert partitions: {str(e)}")
+
+    async def _apply_retention_forever(self):
+        retention = RetentionService()
+        while True:
+            try:
+                await retention.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error applying retention: {str(e)}")
+            await asyncio.sleep(settings.RETENTION_INTERVAL_SECONDS)
+
+    async def refresh_asset_resolver(self):
+        """Carrega o índice de aliases compartilhado; um único worker o reconstrói quando vence"""
+        redis = get_redis()
+        try:
+            raw = await redis.get(ASSET_ALIASES_KEY)
+        except RedisError as e:
+            logger.warning(f"Asset aliases unavailable in Redis, building locally: {str(e)}")
+            raw, redis = None, None
+
+        snapshot = json.loads(raw) if raw else None
+        if snapshot is None or time.time() - snapshot["version"] > settings.ASSET_INVENTORY_INTERVAL_SECONDS:
+            snapshot = await self._build_asset_aliases(redis) or snapshot
+
+        if snapshot is not None and snapshot["version"] != get_asset_resolver().version:
+            set_asset_resolver(AssetResolver(snapshot["aliases"], snapshot["version"]))
+
+    async def _build_asset_aliases(self, redis) -> Optional[Dict[str, Any]]:
+        lock_key = f"{ASSET_ALIASES_KEY}:lock"
+        if redis is not None:
+            try:
+                if not await redis.set(lock_key, "1", nx=True, ex=max(settings.ASSET_INVENTORY_INTERVAL_SECONDS, 300)):
+                    return None
+            except RedisError:
+                redis = None
+
+        try:
+            inventory = await asyncio.to_thread(
+                lambda: self.integrations.tenable().get_asset_inventory(raise_errors=True)
+            )
+        except Exception:
+            # Libera o lock para outro worker (ou o próximo ciclo) tentar de novo
+            if redis is not None:
+                try:
+                    await redis.delete(lock_key)
+                except RedisError:
+                    pass
+            raise
+        snapshot = {"version": time.time(), "aliases": build_aliases(inventory)}
+        logger.info(f"Built {len(snapshot['aliases'])} asset aliases from {len(inventory)} Tenable assets")
+
+        if redis is not None:
+            try:
+                await redis.set(ASSET_ALIASES_KEY, json.dumps(snapshot))
+            except RedisError as e:
+                logger.warning(f"Could not share asset aliases: {str(e)}")
+            # O lock não é liberado: segura a próxima reconstrução até o intervalo vencer
+        return snapshot
+
+    def _interval(self, source: str) -> int:
+        # Exportações do Tenable são caras e consomem cota: ciclo próprio
+        if source == "tenable":
+            return settings.INGESTION_TENABLE_INTERVAL_SECONDS
+        return self.interval
+
+    async def sync_source(self, source: str) -> Optional[int]:
+        """Executa uma coleta incremental de uma fonte; retorna o número de registros gravados"""
+        # Apenas um worker por vez coleta cada fonte
+        lock_key = f"soc:ingestion:{source}:lock"
+        try:
+            acquired = await get_redis().set(lock_key, "1", nx=True, ex=max(self._interval(source) * 5, 300))
+        except RedisError as e:
+            logger.warning(f"Ingestion lock unavailable for {source}, running anyway: {str(e)}")
+            acquired = True
+
+        if not acquired:
+            return None
+
+        try:
+            async with AsyncSessionLocal() as db:
+                data_source = await self._get_data_source(db, source)
+                if not data_source.is_enabled:
+                    return None
+
+                started_at = datetime.now(timezone.utc)
+
+                if source == "tenable":
+                    count = await self._sync_tenable(db, data_source, started_at)
+                elif source == "defender":
+                    count = await self._sync_defender(db, data_source, started_at)
+                elif source == "opencti":
+                    count = await self._sync_opencti(db, data_source, started_at)
+                else:
+                    hours = self._hours_since(data_source.last_sync, started_at)
+                    count = 0
+                    async for batch in self._fetch_batches(source, hours):
+                        count += await AlertStore.upsert(db, batch)
+                    logger.info(f"Ingested {count} records from {source} ({hours}h window)")
+
+                data_source.last_sync = started_at
+                await db.commit()
+
+            return count
+        finally:
+            try:
+                await get_redis().delete(lock_key)
+            except RedisError:
+                pass
+
+    async def _get_data_source(self, db, source: str) -> DataSource:
+        result = await db.execute(
+            select(DataSource).where(DataSource.source_type == source).order_by(DataSource.id)
+        )
+        data_source = result.scalars().first()
+
+        if data_source is None:
+            data_source = DataSource(name=source, source_type=source, config={}, is_enabled=True)
+            db.add(data_source)
+            await db.flush()
+
+        return data_source
+
+    async def _sync_tenable(self, db, data_source: DataSource, started_at: datetime) -> int:
+        """Exporta só as vulnerabilidades alteradas desde o checkpoint e aplica os deltas"""
+        sync_state = dict(data_source.sync_state or {})
+        since = sync_state.get("tenable_checkpoint")
+
+        changes = self._iter_in_thread(
+            lambda: self.integrations.tenable().iter_vulnerability_changes(
+                since=since,
+                batch_size=settings.INGESTION_BATCH_SIZE
+            )
+        )
+
+        upserted, removed = 0, 0
+        async for open_vulns, fixed_ids in changes:
+            upserted += await AlertStore.upsert(db, open_vulns)
+            removed += await AlertStore.delete(db, fixed_ids)
+
+        # O checkpoint só avança junto com o commit dos deltas
+        sync_state["tenable_checkpoint"] = int(started_at.timestamp())
+        data_source.sync_state = sync_state
+
+        mode = f"changes since {since}" if since else "full export"
+        logger.info(f"Tenable sync ({mode}): {upserted} open, {removed} fixed")
+        return upserted + removed
+
+    async def _sync_defender(self, db, data_source: DataSource, started_at: datetime) -> int:
+        """Busca só os alertas criados ou atualizados desde o watermark (lastUpdateDateTime)"""
+        sync_state = dict(data_source.sync_state or {})
+        watermark = parse_timestamp(sync_state.get("defender_watermark"))
+        defender = self.integrations.defender()
+
+        if watermark is not None:
+            pages = defender.iter_alerts_updated_since(watermark)
+        else:
+            since = started_at - timedelta(hours=settings.INGESTION_BACKFILL_HOURS)
+            pages = defender.iter_alerts_created_since(since)
+
+        count = 0
+        newest = watermark
+        async for page in pages:
+            count += await AlertStore.upsert(db, page)
+            for alert in page:
+                updated = parse_timestamp(alert.get("last_updated"))
+                if updated is not None and (newest is None or updated > newest):
+                    newest = updated
+
+        if newest is not None:
+            sync_state["defender_watermark"] = newest.isoformat()
+            data_source.sync_state = sync_state
+
+        logger.info(f"Defender sync since {watermark or 'backfill'}: {count} alerts")
+        return count
+
+    async def _sync_opencti(self, db, data_source: DataSource, started_at: datetime) -> int:
+        """Percorre só os indicadores alterados desde o watermark (updated_at)"""
+        sync_state = dict(data_source.sync_state or {})
+        watermark = sync_state.get("opencti_watermark")
+        updated_since = watermark or (started_at - timedelta(hours=settings.INGESTION_BACKFILL_HOURS)).isoformat()
+
+        changes = self._iter_in_thread(
+            lambda: self.integrations.opencti().iter_indicator_changes(updated_since=updated_since)
+        )
+
+        upserted, removed = 0, 0
+        newest = watermark
+        async for active, revoked_ids, page_newest in changes:
+            upserted += await AlertStore.upsert(db, active)
+            removed += await AlertStore.delete(db, revoked_ids)
+            if page_newest and (newest is None or page_newest > newest):
+                newest = page_newest
+
+        if newest:
+            sync_state["opencti_watermark"] = newest
+            data_source.sync_state = sync_state
+
+        logger.info(f"OpenCTI sync since {updated_since}: {upserted} active, {removed} removed")
+        return upserted + removed
+
+    @staticmethod
+    async def _iter_in_thread(factory: Callable[[], Iterator]) -> AsyncIterator:
+        """Consome um iterador síncrono de SDK item a item em uma thread, fora do event loop"""
+        iterator = await asyncio.to_thread(factory)
+        done = object()
+        while True:
+            item = await asyncio.to_thread(next, iterator, done)
+            if item is done:
+                break
+            yield item
+
+    @staticmethod
+    def _hours_since(last_sync: Optional[datetime], now: datetime) -> int:
+        """Janela da próxima coleta: desde o último sync com margem, ou o backfill inicial"""
+        if last_sync is None:
+            return settings.INGESTION_BACKFILL_HOURS
+
+        elapsed = (now - last_sync).total_seconds() + settings.INGESTION_OVERLAP_MINUTES * 60
+        hours = math.ceil(elapsed / 3600)
+        return max(1, min(hours, settings.INGESTION_BACKFILL_HOURS))
+
+    async def _fetch_batches(self, source: str, hours: int) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Registros da fonte em lotes, para gravar sem manter a janela inteira em memória"""
+        if source == "elastic":
+            async for batch in self.integrations.elastic().iter_critical_alerts(hours=hours):
+                yield batch
+            return
+
+        raise ValueError(f"Unknown source: {source}")
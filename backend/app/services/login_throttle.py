@@ -0,0 +1,81 @@
+from typing import Optional
+from redis.exceptions import RedisError
+from app.cache import get_redis
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LoginThrottle:
+    """Limita logins por IP (todas as tentativas) e por username+IP (falhas), em janelas fixas no Redis.
+
+    As falhas são contadas por par (username, IP): quem conhece o username de
+    um admin só bloqueia as próprias tentativas, não a conta. A verificação
+    roda antes do bcrypt: um IP ou um par bloqueado não consome o pool de
+    hashing. Com o Redis indisponível as tentativas são
+    liberadas (o pool limitado ainda protege o CPU).
+    """
+
+    def __init__(self, prefix: str = "soc:auth:throttle"):
+        self.prefix = prefix
+        self.window = settings.LOGIN_THROTTLE_WINDOW_SECONDS
+        self.max_attempts_per_ip = settings.LOGIN_MAX_ATTEMPTS_PER_IP
+        self.max_failures_per_username = settings.LOGIN_MAX_FAILURES_PER_USERNAME
+
+    def ip_key(self, ip: str) -> str:
+        return f"{self.prefix}:ip:{ip}"
+
+    def failure_key(self, username: str, ip: str) -> str:
+        return f"{self.prefix}:user:{ip}:{username[:256]}"
+
+    async def check(self, ip: str, username: Optional[str] = None) -> Optional[int]:
+        """Conta a tentativa do IP; retorna os segundos até liberar se o IP ou o username neste IP está bloqueado"""
+        try:
+            async with get_redis().pipeline(transaction=True) as pipe:
+                pipe.incr(self.ip_key(ip))
+                pipe.expire(self.ip_key(ip), self.window, nx=True)
+                pipe.ttl(self.ip_key(ip))
+                if username is not None:
+                    pipe.get(self.failure_key(username, ip))
+                    pipe.ttl(self.failure_key(username, ip))
+                results = await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Login throttling unavailable, allowing attempt: {str(e)}")
+            return None
+
+        attempts, _, ip_ttl = results[:3]
+        if attempts > self.max_attempts_per_ip:
+            logger.warning(f"Login attempts from {ip} throttled ({attempts} in window)")
+            return max(ip_ttl, 1)
+
+        if username is not None:
+            failures, username_ttl = results[3:]
+            if failures is not None and int(failures) >= self.max_failures_per_username:
+                logger.warning(f"Login for {username} from {ip} throttled after {int(failures)} failures")
+                return max(username_ttl, 1)
+
+        return None
+
+    async def record_failure(self, username: str, ip: str):
+        try:
+            async with get_redis().pipeline(transaction=True) as pipe:
+                pipe.incr(self.failure_key(username, ip))
+                pipe.expire(self.failure_key(username, ip), self.window, nx=True)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Could not record login failure for {username}: {str(e)}")
+
+    async def reset(self, username: str, ip: str):
+        """Login bem-sucedido zera as falhas do username neste IP"""
+        try:
+            await get_redis().delete(self.failure_key(username, ip))
+        except RedisError:
+            pass
+
+_throttle: Optional[LoginThrottle] = None
+
+def get_login_throttle() -> LoginThrottle:
+    global _throttle
+    if _throttle is None:
+        _throttle = LoginThrottle()
+    return _throttle
@@ -0,0 +1,345 @@
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager
+from app.schemas import CorrelationResult
+from app.services.correlation import CorrelationEngine, page_key
+from app.services.incremental_correlation import IncrementalCorrelationEngine
+from app.services.bucketed_correlation import get_bucketed_correlation
+from app.services.events import Event, EVENT_TYPES, to_events
+from app.services.serialization import encode_correlations
+from app.services.time_buckets import get_source_buckets
+from app.config import settings
+import asyncio
+import logging
+import multiprocessing
+import os
+import zlib
+
+logger = logging.getLogger(__name__)
+
+EVENT_SOURCES = ("elastic", "tenable", "defender")
+SOURCES = EVENT_SOURCES + ("opencti",)
+
+# Indicadores viajam só com os campos usados no matching e no resultado
+INDICATOR_FIELDS = ("id", "value", "pattern")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_correlation_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.CORRELATION_WORKERS or os.cpu_count(),
+            # spawn: o processo da API tem threads e conexões abertas que não devem ser copiadas
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+def shutdown_correlation_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+class _ShardEngine(CorrelationEngine):
+    """Engine do processo filho: os ativos já chegam resolvidos pelo processo da API"""
+
+    def __init__(self, canonical_assets: Dict[str, str]):
+        super().__init__()
+        self.canonical_assets = canonical_assets
+
+    def _normalize_asset_name(self, asset: str) -> str:
+        return self.canonical_assets.get(asset, "")
+
+def _pack(events: List[Event], fields: Tuple[str, ...]) -> List[tuple]:
+    return [tuple(event.get(field) for field in fields) for event in events]
+
+def _unpack(rows: List[tuple], fields: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    return [{field: value for field, value in zip(fields, row) if value is not None} for row in rows]
+
+def _unpack_payload(payload: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    events = {
+        source: _unpack(payload[source], EVENT_TYPES[source].FIELDS)
+        for source in EVENT_SOURCES
+    }
+    return {
+        "elastic_alerts": events["elastic"],
+        "tenable_vulns": events["tenable"],
+        "defender_alerts": events["defender"],
+        "opencti_indicators": _unpack(payload["opencti"], INDICATOR_FIELDS)
+    }
+
+def _correlate_shard(payload: Dict[str, Any]) -> List[CorrelationResult]:
+    """Executado no pool: correlaciona os ativos de uma partição"""
+    engine = _ShardEngine(payload["assets"])
+    return engine.correlate_events(**_unpack_payload(payload))
+
+def _correlate_shard_page(payload: Dict[str, Any]) -> Tuple[List[CorrelationResult], Optional[str], int]:
+    """Executado no pool: candidatos de uma partição à página pedida e o total de ativos dela"""
+    limit, cursor, alerts_per_asset = payload["page"]
+    engine = _ShardEngine(payload["assets"])
+    return engine.correlate_page(**_unpack_payload(payload), limit=limit, cursor=cursor, alerts_per_asset=alerts_per_asset)
+
+class ParallelCorrelation:
+    """Correlação distribuída em processos, particionada por ativo canônico.
+
+    Cada evento vai para a partição hash(ativo) % shards, então todos os
+    eventos de um ativo são pontuados no mesmo processo e os resultados das
+    partições podem ser simplesmente concatenados. Os eventos viajam como
+    tuplas de campos por fonte, sem os nomes das chaves.
+    """
+
+    # Cada payload é serializado para o pool numa única chamada que segura o GIL
+    # do processo da API; janelas grandes são divididas em mais partições que processos
+    MAX_SHARD_EVENTS = 50000
+
+    def __init__(self, shards: Optional[int] = None):
+        self.shards = shards or settings.CORRELATION_WORKERS or os.cpu_count() or 1
+        self.engine = CorrelationEngine()
+
+    async def correlate(
+        self,
+        elastic_alerts: List[Event],
+        tenable_vulns: List[Event],
+        defender_alerts: List[Event],
+        opencti_indicators: List[Event]
+    ) -> List[CorrelationResult]:
+        shard_results = await self._run(_correlate_shard, elastic_alerts, tenable_vulns, defender_alerts, opencti_indicators)
+
+        correlations = [correlation for results in shard_results for correlation in results]
+        correlations.sort(key=page_key)
+
+        logger.info(f"Correlated {len(correlations)} high-risk assets in {len(shard_results)} shards")
+        return correlations
+
+    async def correlate_page(
+        self,
+        elastic_alerts: List[Event],
+        tenable_vulns: List[Event],
+        defender_alerts: List[Event],
+        opencti_indicators: List[Event],
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        alerts_per_asset: Optional[int] = None
+    ) -> Tuple[List[CorrelationResult], Optional[str], int]:
+        """Uma página, o cursor da próxima e o total; cada partição devolve só os seus limit + 1 candidatos"""
+        shard_pages = await self._run(
+            _correlate_shard_page, elastic_alerts, tenable_vulns, defender_alerts, opencti_indicators,
+            page=(None if limit is None else limit + 1, cursor, alerts_per_asset)
+        )
+
+        # Os alertas por ativo já chegam limitados pelas partições
+        candidates = [correlation for page, _, _ in shard_pages for correlation in page]
+        page, next_cursor = CorrelationEngine.select_page(candidates, limit)
+        total = sum(shard_total for _, _, shard_total in shard_pages)
+
+        logger.info(f"Selected {len(page)} of {total} high-risk assets from {len(shard_pages)} shards")
+        return page, next_cursor, total
+
+    async def _run(
+        self,
+        task: Callable[[Dict[str, Any]], Any],
+        elastic_alerts: List[Event],
+        tenable_vulns: List[Event],
+        defender_alerts: List[Event],
+        opencti_indicators: List[Event],
+        **extra: Any
+    ) -> List[Any]:
+        # O particionamento resolve o ativo de cada evento: também fica fora do event loop
+        payloads = await asyncio.to_thread(self._payloads, elastic_alerts, tenable_vulns, defender_alerts, opencti_indicators)
+        for payload in payloads:
+            payload.update(extra)
+
+        loop = asyncio.get_running_loop()
+        pool = get_correlation_pool()
+        return await asyncio.gather(*(
+            loop.run_in_executor(pool, task, payload) for payload in payloads
+        ))
+
+    def _payloads(
+        self,
+        elastic_alerts: List[Event],
+        tenable_vulns: List[Event],
+        defender_alerts: List[Event],
+        opencti_indicators: List[Event]
+    ) -> List[Dict[str, Any]]:
+        total = len(elastic_alerts) + len(tenable_vulns) + len(defender_alerts)
+        return self._partition({
+            "elastic": to_events(elastic_alerts),
+            "tenable": to_events(tenable_vulns),
+            "defender": to_events(defender_alerts)
+        }, _pack(to_events(opencti_indicators), INDICATOR_FIELDS), max(self.shards, -(-total // self.MAX_SHARD_EVENTS)))
+
+    def _partition(self, events: Dict[str, List[Event]], indicators: List[tuple], shard_count: int) -> List[Dict[str, Any]]:
+        shards = [{"assets": {}, **{source: [] for source in EVENT_SOURCES}} for _ in range(shard_count)]
+        canonical: Dict[str, Tuple[str, int]] = {}
+
+        for source in EVENT_SOURCES:
+            fields = EVENT_TYPES[source].FIELDS
+            for event in events[source]:
+                raw_asset = event.get("asset") or ""
+                resolved = canonical.get(raw_asset)
+                if resolved is None:
+                    asset = self.engine._normalize_asset_name(raw_asset)
+                    resolved = canonical[raw_asset] = (asset, zlib.crc32(asset.encode()) % shard_count)
+                asset, shard_number = resolved
+                if not asset:
+                    continue
+                shard = shards[shard_number]
+                shard["assets"][raw_asset] = asset
+                shard[source].append(tuple(event.get(field) for field in fields))
+
+        payloads = []
+        for shard in shards:
+            if shard["assets"]:
+                shard["opencti"] = indicators
+                payloads.append(shard)
+        return payloads
+
+BUCKETED, PARALLEL, INCREMENTAL = "bucketed", "parallel", "incremental"
+
+# Estados por buckets montados em background, por janela (referências mantidas até terminarem)
+_warming: Dict[int, "asyncio.Task"] = {}
+
+def _is_bucketed(fetched) -> bool:
+    return all(source in fetched.windows for source in EVENT_SOURCES)
+
+def _event_count(fetched) -> int:
+    # Janelas por buckets são contadas sem materializar as listas de eventos
+    return sum(
+        len(fetched.windows[source]) if source in fetched.windows else len(fetched.get(source))
+        for source in EVENT_SOURCES
+    )
+
+def route(hours: int, fetched) -> str:
+    """Caminho de correlação da janela, decidido nesta ordem:
+
+    1. CORRELATION_STRATEGY, quando forçado (bucketed exige a janela montada por buckets);
+    2. bucketed: janela montada pelos buckets de hora que já foi correlacionada
+       ou tem menos de CORRELATION_PARALLEL_MIN_EVENTS eventos;
+    3. parallel: janelas grandes, no pool de processos; se a janela veio dos
+       buckets, o estado por buckets é montado em background para os próximos refreshes;
+    4. incremental: demais janelas, pelo engine mantido por janela.
+    """
+    strategy = settings.CORRELATION_STRATEGY
+    bucketed = _is_bucketed(fetched)
+    if strategy in (PARALLEL, INCREMENTAL) or (strategy == BUCKETED and bucketed):
+        return strategy
+
+    large = _event_count(fetched) >= settings.CORRELATION_PARALLEL_MIN_EVENTS
+    if bucketed and (not large or get_bucketed_correlation().has_window(hours)):
+        return BUCKETED
+    if large:
+        return PARALLEL
+    return INCREMENTAL
+
+@asynccontextmanager
+async def _locked(engine_lock: Optional[asyncio.Lock], fetched):
+    """Trava o engine e a atualização dos buckets da janela enquanto ela é lida fora do event loop"""
+    async with AsyncExitStack() as stack:
+        if engine_lock is not None:
+            await stack.enter_async_context(engine_lock)
+        # Sempre na ordem de EVENT_SOURCES; a busca trava um bucket de cada vez
+        for source in EVENT_SOURCES:
+            if source in fetched.windows:
+                await stack.enter_async_context(get_source_buckets(source).lock)
+        yield
+
+async def _run_locked(engine_lock: Optional[asyncio.Lock], fetched, func, *args):
+    async with _locked(engine_lock, fetched):
+        return await asyncio.to_thread(func, *args)
+
+async def _window_events(fetched) -> Tuple[List[Event], ...]:
+    """Eventos das quatro fontes; as janelas por buckets são materializadas fora do event loop"""
+    return await _run_locked(None, fetched, lambda: tuple(fetched.get(source) for source in SOURCES))
+
+def _warm_bucketed(hours: int, fetched):
+    """Monta em background o estado por buckets de uma janela grande servida pelo pool"""
+    engine = get_bucketed_correlation()
+    if (
+        settings.CORRELATION_STRATEGY == PARALLEL
+        or not _is_bucketed(fetched)
+        or hours in _warming
+        or engine.has_window(hours)
+    ):
+        return
+
+    def done(task: asyncio.Task):
+        _warming.pop(hours, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error preparing the {hours}h bucketed correlation: {str(task.exception())}")
+
+    task = asyncio.create_task(
+        _run_locked(engine.lock, fetched, engine.results, hours, fetched.windows, fetched.get("opencti"))
+    )
+    _warming[hours] = task
+    task.add_done_callback(done)
+
+def _sync_incremental(engine: IncrementalCorrelationEngine, fetched):
+    engine.sync(
+        elastic_alerts=fetched.get("elastic"),
+        tenable_vulns=fetched.get("tenable"),
+        defender_alerts=fetched.get("defender"),
+        opencti_indicators=fetched.get("opencti"),
+        revision=fetched.revision()
+    )
+
+async def _incremental(hours: int, fetched, query: Callable[[IncrementalCorrelationEngine], Any]):
+    """Sincroniza o engine da janela e o consulta, fora do event loop"""
+    engine = IncrementalCorrelationEngine.for_window(hours)
+
+    def run():
+        _sync_incremental(engine, fetched)
+        return query(engine)
+
+    return await _run_locked(engine.lock, fetched, run)
+
+async def correlate_window(hours: int, fetched) -> List[CorrelationResult]:
+    """Correlaciona uma janela pelo caminho escolhido em route, sem bloquear o event loop"""
+    strategy = route(hours, fetched)
+    if strategy == BUCKETED:
+        engine = get_bucketed_correlation()
+        return await _run_locked(engine.lock, fetched, engine.results, hours, fetched.windows, fetched.get("opencti"))
+    if strategy == PARALLEL:
+        correlations = await ParallelCorrelation().correlate(*await _window_events(fetched))
+        _warm_bucketed(hours, fetched)
+        return correlations
+    return await _incremental(hours, fetched, lambda engine: engine.results())
+
+async def correlate_window_json(
+    hours: int,
+    fetched,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    alerts_per_asset: Optional[int] = None
+) -> Tuple[bytes, Optional[str], int]:
+    """Uma página da correlação já serializada, o cursor da próxima e o total de ativos.
+
+    Nos caminhos por buckets e incremental a página serializada fica em cache até a janela mudar.
+    """
+    strategy = route(hours, fetched)
+    if strategy == BUCKETED:
+        engine = get_bucketed_correlation()
+        return await _run_locked(
+            engine.lock, fetched, engine.page_json,
+            hours, fetched.windows, fetched.get("opencti"), limit, cursor, alerts_per_asset
+        )
+    if strategy == PARALLEL:
+        page, next_cursor, total = await ParallelCorrelation().correlate_page(
+            *await _window_events(fetched), limit=limit, cursor=cursor, alerts_per_asset=alerts_per_asset
+        )
+        _warm_bucketed(hours, fetched)
+        return encode_correlations(page), next_cursor, total
+    return await _incremental(hours, fetched, lambda engine: engine.page_json(limit, cursor, alerts_per_asset))
+
+async def correlate_asset_window(hours: int, fetched, asset: str) -> Optional[CorrelationResult]:
+    """Correlação de um único ativo na janela"""
+    strategy = route(hours, fetched)
+    if strategy == BUCKETED:
+        engine = get_bucketed_correlation()
+        return await _run_locked(engine.lock, fetched, engine.asset_result, asset, fetched.windows, fetched.get("opencti"))
+    if strategy == PARALLEL:
+        events = await _window_events(fetched)
+        _warm_bucketed(hours, fetched)
+        return await asyncio.to_thread(CorrelationEngine().correlate_asset, asset, *events)
+    return await _incremental(hours, fetched, lambda engine: engine.asset_result(asset))
@@ -0,0 +1,101 @@
+from typing import Dict, Any, Callable, Optional, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from passlib.context import CryptContext
+from app.config import settings
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class HashingBusyError(Exception):
+    """Fila de hashing cheia: a requisição é recusada em vez de esperar"""
+
+class PasswordHasher:
+    """bcrypt em um pool de threads dedicado e limitado, fora do event loop.
+
+    No máximo PASSWORD_HASH_WORKERS cálculos rodam ao mesmo tempo (o bcrypt
+    libera o GIL); até PASSWORD_HASH_MAX_QUEUE aguardam a vez e, além disso,
+    a chamada falha com HashingBusyError. Uma rajada de logins ocupa só esse
+    pool: o event loop e os demais pools continuam livres.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_queue: Optional[int] = None):
+        self.workers = workers or settings.PASSWORD_HASH_WORKERS
+        self.max_queue = settings.PASSWORD_HASH_MAX_QUEUE if max_queue is None else max_queue
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        self._slots = asyncio.Semaphore(self.workers)
+        self._running = 0
+        self._queued = 0
+        self._max_queued = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._hash_seconds = 0.0
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    def metrics(self) -> Dict[str, Any]:
+        completed = self._completed or 1
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "queued": self._queued,
+            "max_queued": self._max_queued,
+            "max_queue": self.max_queue,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "avg_wait_ms": round(self._wait_seconds / completed * 1000, 1),
+            "avg_hash_ms": round(self._hash_seconds / completed * 1000, 1)
+        }
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        if self._queued >= self.max_queue and self._slots.locked():
+            self._rejected += 1
+            logger.warning(f"Password hashing queue full ({self._queued} waiting), rejecting request")
+            raise HashingBusyError()
+
+        queued_at = time.perf_counter()
+        self._queued += 1
+        self._max_queued = max(self._max_queued, self._queued)
+        try:
+            await self._slots.acquire()
+        finally:
+            self._queued -= 1
+
+        started_at = time.perf_counter()
+        self._running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(func, *args))
+        finally:
+            self._running -= 1
+            self._slots.release()
+            self._completed += 1
+            self._wait_seconds += started_at - queued_at
+            self._hash_seconds += time.perf_counter() - started_at
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+_hasher: Optional[PasswordHasher] = None
+
+def get_password_hasher() -> PasswordHasher:
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher()
+    return _hasher
+
+def shutdown_password_hasher():
+    global _hasher
+    if _hasher is not None:
+        _hasher.shutdown()
+        _hasher = None
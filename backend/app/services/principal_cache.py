@@ -0,0 +1,177 @@
+from typing import Dict, Any, Callable, Awaitable, Optional, Tuple
+from collections import OrderedDict
+from redis.exceptions import RedisError
+from app.cache import get_redis
+from app.config import settings
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+Principal = Dict[str, Any]
+Loader = Callable[[], Awaitable[Optional[Principal]]]
+
+INVALIDATION_CHANNEL = "soc:auth:invalidate"
+
+class PrincipalCache:
+    """Usuários autenticados por username, para não consultar a tabela users a cada requisição.
+
+    LRU local com TTL e, opcionalmente, uma camada compartilhada no Redis.
+    A invalidação (após o commit da alteração) remove a entrada local, sobe a
+    versão do usuário no Redis e publica o username no canal de invalidação:
+    os demais workers removem a entrada local ao receber, e entradas do Redis
+    gravadas com uma versão anterior são ignoradas. Enquanto a assinatura do
+    canal não está ativa a camada local não é usada, para que uma invalidação
+    perdida não deixe um usuário desatualizado em memória.
+    """
+
+    def __init__(self, prefix: str = "soc:auth:user"):
+        self.prefix = prefix
+        self.ttl = settings.AUTH_PRINCIPAL_CACHE_TTL_SECONDS
+        self.max_size = settings.AUTH_PRINCIPAL_CACHE_SIZE
+        self.shared = settings.AUTH_PRINCIPAL_CACHE_SHARED
+        self._local: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        # Incrementado a cada invalidação recebida: um carregamento iniciado antes dela não é guardado.
+        # Só existe enquanto há carregamentos em andamento para o usuário (_loading)
+        self._epochs: Dict[str, int] = {}
+        self._loading: Dict[str, int] = {}
+        self._listening = False
+        self._listener: Optional[asyncio.Task] = None
+
+    def key(self, username: str) -> str:
+        return f"{self.prefix}:{username}"
+
+    def version_key(self, username: str) -> str:
+        return f"{self.prefix}:{username}:version"
+
+    async def resolve(self, username: str, loader: Loader) -> Optional[Principal]:
+        """Usuário em cache ou carregado por loader (None se não existe)"""
+        principal = self._get_local(username)
+        if principal is not None:
+            return principal
+
+        self._loading[username] = self._loading.get(username, 0) + 1
+        try:
+            return await self._load(username, loader)
+        finally:
+            remaining = self._loading.pop(username) - 1
+            if remaining:
+                self._loading[username] = remaining
+            else:
+                # Sem carregamentos em andamento a época não protege mais nada
+                self._epochs.pop(username, None)
+
+    async def _load(self, username: str, loader: Loader) -> Optional[Principal]:
+        epoch = self._epochs.get(username, 0)
+        version = None
+        if self.shared:
+            try:
+                entry, version = await get_redis().mget(self.key(username), self.version_key(username))
+                version = int(version or 0)
+                if entry is not None:
+                    cached = json.loads(entry)
+                    if cached["version"] == version:
+                        self._put_local(username, cached["principal"], epoch)
+                        return cached["principal"]
+            except RedisError as e:
+                logger.warning(f"Principal cache unavailable, loading {username} from the database: {str(e)}")
+                version = None
+
+        principal = await loader()
+        if principal is None:
+            return None
+
+        self._put_local(username, principal, epoch)
+        if version is not None and self._epochs.get(username, 0) == epoch:
+            try:
+                await get_redis().set(
+                    self.key(username),
+                    json.dumps({"version": version, "principal": principal}),
+                    ex=self.ttl
+                )
+            except RedisError as e:
+                logger.warning(f"Could not share principal for {username}: {str(e)}")
+        return principal
+
+    async def invalidate(self, username: str):
+        """Descarta o usuário em todos os workers; chamar depois do commit da alteração"""
+        self._evict(username)
+        if not self.shared:
+            return
+        try:
+            async with get_redis().pipeline(transaction=True) as pipe:
+                pipe.incr(self.version_key(username))
+                pipe.expire(self.version_key(username), self.ttl * 2)
+                pipe.delete(self.key(username))
+                pipe.publish(INVALIDATION_CHANNEL, username)
+                await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Could not invalidate cached principal for {username}: {str(e)}")
+
+    def start(self):
+        if self.shared and self._listener is None:
+            self._listener = asyncio.create_task(self._listen_forever(), name="principal-invalidation")
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        self._listening = False
+
+    async def _listen_forever(self):
+        while True:
+            pubsub = get_redis().pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "subscribe":
+                        # Invalidações anteriores à assinatura podem ter sido perdidas
+                        self._local.clear()
+                        self._listening = True
+                    elif message["type"] == "message":
+                        self._evict(message["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Principal invalidation channel lost, local cache disabled: {str(e)}")
+            finally:
+                self._listening = False
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(5)
+
+    def _get_local(self, username: str) -> Optional[Principal]:
+        entry = self._local.get(username)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic() or (self.shared and not self._listening):
+            del self._local[username]
+            return None
+        self._local.move_to_end(username)
+        return entry[1]
+
+    def _put_local(self, username: str, principal: Principal, epoch: int):
+        if self._epochs.get(username, 0) != epoch or (self.shared and not self._listening):
+            return
+        self._local[username] = (time.monotonic() + self.ttl, principal)
+        self._local.move_to_end(username)
+        while len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+
+    def _evict(self, username: str):
+        self._local.pop(username, None)
+        if username in self._loading:
+            self._epochs[username] = self._epochs.get(username, 0) + 1
+
+_cache: Optional[PrincipalCache] = None
+
+def get_principal_cache() -> PrincipalCache:
+    global _cache
+    if _cache is None:
+        _cache = PrincipalCache()
+    return _cache
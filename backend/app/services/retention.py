@@ -0,0 +1,135 @@
+from typing import List, Dict, Optional, Tuple
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import delete, text
+from sqlalchemy.dialects.postgresql import insert
+from redis.exceptions import RedisError
+from app.database import AsyncSessionLocal
+from app.models import AlertArchive
+from app.cache import get_redis
+from app.services.alert_store import compress_payload, retention_cutoff
+from app.services.alert_partitions import drop_partitions_before, partition_days, partition_name
+from app.services.alert_rollups import expire_sql
+from app.services.source_fetcher import SOURCES
+from app.config import settings
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+RETENTION_LOCK_KEY = "soc:retention:lock"
+
+class RetentionService:
+    """Arquivamento do raw_data após o período quente e remoção dos alertas após o período frio.
+
+    O raw_data vai comprimido para alert_archive e sai da tabela alerts. Os
+    alertas expirados saem em bloco pelo DROP das partições diárias quando
+    todas as fontes com limite já expiraram o dia e ele não tem registros de
+    fontes sem limite (indicadores do OpenCTI); fontes com período frio menor
+    e os dias mantidos têm os alertas removidos linha a linha. Os dois passos trabalham direto em cada
+    partição diária envolvida.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+
+    async def run(self) -> Optional[Dict[str, int]]:
+        """Executa um ciclo; retorna None se outro worker já está executando"""
+        try:
+            acquired = await get_redis().set(RETENTION_LOCK_KEY, "1", nx=True, ex=settings.RETENTION_INTERVAL_SECONDS)
+        except RedisError as e:
+            logger.warning(f"Retention lock unavailable, running anyway: {str(e)}")
+            acquired = True
+
+        if not acquired:
+            return None
+
+        try:
+            now = datetime.now(timezone.utc)
+            # Primeiro o que expira: não vale comprimir o que vai ser removido
+            dropped = await self.drop_partitions(now)
+
+            expired = 0
+            for source in settings.RETENTION_COLD_DAYS:
+                expired += await self.expire_alerts(source, retention_cutoff(source, now))
+
+            archived = 0
+            for source, days in settings.RETENTION_HOT_DAYS.items():
+                archived += await self.archive_payloads(source, now - timedelta(days=days))
+
+            logger.info(f"Retention: {archived} payloads archived, {expired} alerts expired, {dropped} partitions dropped")
+            return {"archived": archived, "expired": expired, "dropped": dropped}
+        finally:
+            try:
+                await get_redis().delete(RETENTION_LOCK_KEY)
+            except RedisError:
+                pass
+
+    async def archive_payloads(self, source: str, cutoff: datetime) -> int:
+        """Move para alert_archive o raw_data dos alertas da fonte anteriores a cutoff"""
+        archived = 0
+        for day in await self._days_before(cutoff):
+            partition = partition_name(day)
+            while True:
+                async with AsyncSessionLocal() as db:
+                    # Linhas travadas: um upsert concorrente espera e grava o raw_data novo depois
+                    rows = (await db.execute(text(
+                        f"SELECT alert_id, event_time, raw_data::text FROM {partition} "
+                        f"WHERE source = :source AND event_time < :cutoff AND raw_data IS NOT NULL "
+                        f"LIMIT :limit FOR UPDATE SKIP LOCKED"
+                    ), {"source": source, "cutoff": cutoff, "limit": self.batch_size})).all()
+                    if not rows:
+                        break
+
+                    payloads = await asyncio.to_thread(self._compress_rows, rows)
+                    stmt = insert(AlertArchive).values([
+                        {"alert_id": alert_id, "event_time": event_time, "source": source, "payload": payload}
+                        for alert_id, event_time, payload in payloads
+                    ])
+                    await db.execute(stmt.on_conflict_do_update(
+                        index_elements=[AlertArchive.alert_id, AlertArchive.event_time],
+                        set_={"payload": stmt.excluded.payload, "archived_at": stmt.excluded.archived_at}
+                    ))
+                    await db.execute(
+                        text(f"UPDATE {partition} SET raw_data = NULL WHERE source = :source AND alert_id = ANY(:alert_ids)"),
+                        {"source": source, "alert_ids": [row[0] for row in rows]}
+                    )
+                    await db.commit()
+                archived += len(rows)
+        return archived
+
+    async def expire_alerts(self, source: str, cutoff: datetime) -> int:
+        """Remove os alertas da fonte anteriores a cutoff (e o arquivo deles), uma partição por vez"""
+        expired = 0
+        for day in await self._days_before(cutoff):
+            async with AsyncSessionLocal() as db:
+                expired += (await db.execute(
+                    text(expire_sql(partition_name(day))), {"source": source, "cutoff": cutoff}
+                )).scalar()
+                await db.commit()
+
+        # Inclui documentos de alertas que mudaram de event_time depois de arquivados
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(AlertArchive).where(AlertArchive.source == source, AlertArchive.event_time < cutoff)
+            )
+            await db.commit()
+        return expired
+
+    async def drop_partitions(self, now: datetime) -> int:
+        """DROP das partições cujo dia inteiro já expirou para todas as fontes com limite"""
+        cold_days = settings.RETENTION_COLD_DAYS
+        limited = [source for source in SOURCES if source in cold_days]
+        if not limited:
+            return 0
+        cutoff = (now - timedelta(days=max(cold_days[source] for source in limited))).date()
+        unlimited = [source for source in SOURCES if source not in cold_days]
+        return len(await drop_partitions_before(cutoff, keep_sources=unlimited))
+
+    @staticmethod
+    async def _days_before(cutoff: datetime) -> List[date]:
+        """Partições com algum instante anterior a cutoff"""
+        return [day for day in await partition_days() if day <= cutoff.date()]
+
+    @staticmethod
+    def _compress_rows(rows: List[Tuple[str, datetime, str]]) -> List[Tuple[str, datetime, bytes]]:
+        return [(alert_id, event_time, compress_payload(raw)) for alert_id, event_time, raw in rows]
@@ -0,0 +1,10 @@
+from typing import List
+from pydantic import TypeAdapter
+from app.schemas import CorrelationResult
+
+# Serializador do pydantic-core (Rust): gera o JSON direto dos modelos, sem
+# revalidar nem passar por dicts intermediários e pelo encoder da stdlib
+_correlations_adapter = TypeAdapter(List[CorrelationResult])
+
+def encode_correlations(correlations: List[CorrelationResult]) -> bytes:
+    return _correlations_adapter.dump_json(correlations)
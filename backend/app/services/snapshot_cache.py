@@ -0,0 +1,182 @@
+from typing import List, Dict, Any, Callable, Awaitable, Optional, Tuple
+from redis.exceptions import RedisError
+from app.cache import get_redis
+from app.services.events import Event
+from app.config import settings
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[List[Dict[str, Any]]]]
+
+# Libera o lock apenas se ele ainda pertence a quem o adquiriu
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, Event):
+        return value.to_dict()
+    return str(value)
+
+class SnapshotCache:
+    """Cache de snapshots por fonte e janela no Redis, compartilhado entre workers.
+
+    Entradas mais novas que SNAPSHOT_TTL_SECONDS são servidas diretamente. Até
+    SNAPSHOT_STALE_SECONDS depois disso a entrada antiga é servida enquanto uma
+    única atualização roda em background. Em caso de miss, apenas um processo
+    (lock no Redis) e uma coroutine por processo buscam na origem; os demais
+    aguardam o resultado por no máximo o timeout da fonte e, depois disso,
+    recebem o snapshot antigo (ou um timeout, se não houver nenhum).
+    """
+
+    _inflight: Dict[str, "asyncio.Future"] = {}
+    _background: set = set()
+
+    def __init__(self, prefix: str = "soc:snapshot", wait_timeout: Optional[float] = None):
+        self.prefix = prefix
+        self.ttl = settings.SNAPSHOT_TTL_SECONDS
+        self.stale = settings.SNAPSHOT_STALE_SECONDS
+        self.lock_timeout = settings.SNAPSHOT_LOCK_TIMEOUT_SECONDS
+        # Quem aguarda a busca de outro worker não espera mais que a própria fonte esperaria
+        self.wait_timeout = min(wait_timeout or settings.SOURCE_FETCH_TIMEOUT_SECONDS, self.lock_timeout)
+
+    def key(self, source: str, window_hours: int) -> str:
+        return f"{self.prefix}:{source}:{window_hours}h"
+
+    async def get_or_fetch(
+        self,
+        source: str,
+        window_hours: int,
+        loader: Loader
+    ) -> Tuple[List[Dict[str, Any]], str, Optional[float]]:
+        """Retorna (dados, estado do cache, revisão), onde o estado é hit, stale ou miss.
+
+        A revisão é o fetched_at do snapshot: a mesma revisão tem sempre os
+        mesmos dados. Buscas fora do cache (bypass) não têm revisão.
+        """
+        key = self.key(source, window_hours)
+
+        try:
+            entry = await self._read(key)
+        except RedisError as e:
+            logger.warning(f"Snapshot cache unavailable, fetching {source} directly: {str(e)}")
+            return await loader(), "bypass", None
+
+        if entry is not None:
+            age = time.time() - entry["fetched_at"]
+            if age < self.ttl:
+                return entry["data"], "hit", entry["fetched_at"]
+            if age < self.ttl + self.stale:
+                self._refresh_in_background(key, loader)
+                return entry["data"], "stale", entry["fetched_at"]
+
+        try:
+            entry = await self._single_flight(key, loader)
+            return entry["data"], "miss", entry["fetched_at"]
+        except RedisError as e:
+            logger.warning(f"Snapshot cache unavailable, fetching {source} directly: {str(e)}")
+            return await loader(), "bypass", None
+
+    async def invalidate(self, source: str, window_hours: int):
+        await get_redis().delete(self.key(source, window_hours))
+
+    async def _single_flight(self, key: str, loader: Loader) -> Dict[str, Any]:
+        # Coalescência dentro do processo
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            entry = await self._fetch_shared(key, loader)
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            # Quem aguardava esta busca recebe um erro comum, não o cancelamento
+            future.set_exception(RuntimeError(f"Fetch of {key} was cancelled"))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evita "Future exception was never retrieved" quando ninguém aguardava
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _fetch_shared(self, key: str, loader: Loader) -> Dict[str, Any]:
+        """Coalescência entre workers: quem obtém o lock busca, os demais aguardam a entrada gravada"""
+        redis = get_redis()
+        lock_key = f"{key}:lock"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_timeout
+
+        while True:
+            if await redis.set(lock_key, token, nx=True, px=self.lock_timeout * 1000):
+                try:
+                    return await self._write(key, await loader())
+                finally:
+                    await self._release(lock_key, token)
+
+            # Outro worker está buscando: aguardar a entrada ser gravada
+            while await redis.exists(lock_key):
+                entry = await self._read(key)
+                if entry is not None and time.time() - entry["fetched_at"] < self.ttl:
+                    return entry
+                if time.monotonic() > deadline:
+                    if entry is not None:
+                        logger.warning(f"Timed out waiting for snapshot {key}, serving the stale entry")
+                        return entry
+                    raise asyncio.TimeoutError(f"Timed out waiting for snapshot {key}")
+                await asyncio.sleep(0.1)
+
+            # Lock liberado: usar a entrada gravada ou tentar adquirir o lock novamente
+            entry = await self._read(key)
+            if entry is not None and time.time() - entry["fetched_at"] < self.ttl:
+                return entry
+
+    def _refresh_in_background(self, key: str, loader: Loader):
+        if key in self._inflight:
+            return
+
+        async def refresh():
+            try:
+                await self._single_flight(key, loader)
+            except Exception as e:
+                logger.warning(f"Background refresh of {key} failed: {str(e)}")
+
+        task = asyncio.create_task(refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _release(self, lock_key: str, token: str):
+        try:
+            await get_redis().eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except RedisError as e:
+            # O lock expira sozinho após SNAPSHOT_LOCK_TIMEOUT_SECONDS
+            logger.warning(f"Could not release snapshot lock {lock_key}: {str(e)}")
+
+    async def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await get_redis().get(key)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    async def _write(self, key: str, data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        entry = {"fetched_at": time.time(), "data": data}
+        payload = json.dumps(entry, default=_encode)
+        try:
+            # Após a janela stale a entrada fica mais lock_timeout no Redis, só como fallback de quem aguarda
+            await get_redis().set(key, payload, ex=self.ttl + self.stale + self.lock_timeout)
+        except RedisError as e:
+            logger.warning(f"Could not store snapshot {key}: {str(e)}")
+        return entry
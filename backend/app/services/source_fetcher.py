@@ -0,0 +1,209 @@
+from typing import List, Dict, Any, Optional, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from app.integrations.registry import IntegrationRegistry
+from app.services.snapshot_cache import SnapshotCache
+from app.services.alert_store import AlertStore
+from app.services.events import Event, to_events
+from app.services.time_buckets import BucketWindow, get_source_buckets
+from app.database import AsyncSessionLocal
+from app.config import settings
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+SOURCES = ("elastic", "tenable", "defender", "opencti")
+
+# Nomes expostos em sources_status (mantidos por compatibilidade com o frontend)
+STATUS_NAMES = {
+    "elastic": "elasticsearch",
+    "tenable": "tenable",
+    "defender": "defender",
+    "opencti": "opencti"
+}
+
+# Fontes sempre lidas do armazenamento local: uma exportação do Tenable leva
+# minutos e nunca deve bloquear uma requisição do dashboard
+STORE_ONLY_SOURCES = ("tenable",)
+
+# Pool limitado para os SDKs síncronos (Tenable e OpenCTI), fora do event loop
+_sync_executor = ThreadPoolExecutor(
+    max_workers=settings.SOURCE_FETCH_MAX_WORKERS,
+    thread_name_prefix="source-fetch"
+)
+
+@dataclass
+class SourceStatus:
+    status: str  # active, error, timeout
+    duration_ms: int
+    count: int
+    error: Optional[str] = None
+    cache: Optional[str] = None  # hit, stale, miss, bypass, bucket
+
+@dataclass
+class FetchResult:
+    data: Dict[str, List[Event]] = field(default_factory=dict)
+    status: Dict[str, SourceStatus] = field(default_factory=dict)
+    windows: Dict[str, BucketWindow] = field(default_factory=dict)
+    # Revisão do snapshot de cada fonte (None quando buscado fora do cache)
+    revisions: Dict[str, Optional[float]] = field(default_factory=dict)
+
+    def get(self, source: str) -> List[Event]:
+        """Dados de uma fonte; lista vazia se a fonte falhou ou não foi buscada"""
+        if source not in self.data and source in self.windows:
+            self.data[source] = self.windows[source].events()
+        return self.data.get(source, [])
+
+    def revision(self, sources: Iterable[str] = SOURCES) -> Optional[tuple]:
+        """Identifica o conteúdo das fontes: igual entre duas buscas só se nenhum dado mudou (None se desconhecido)"""
+        revision = []
+        for source in sources:
+            if source in self.windows:
+                revision.append(self.windows[source].fingerprint())
+            elif self.revisions.get(source) is not None and self.status[source].status == "active":
+                revision.append(self.revisions[source])
+            else:
+                return None
+        return tuple(revision)
+
+    def sources_status(self) -> Dict[str, Dict[str, Any]]:
+        """Status e tempo de cada fonte no formato da API"""
+        return {
+            STATUS_NAMES[source]: {
+                "status": status.status,
+                "duration_ms": status.duration_ms,
+                "count": status.count,
+                "error": status.error,
+                "cache": status.cache
+            }
+            for source, status in self.status.items()
+        }
+
+class SourceFetcher:
+    """Busca as fontes em paralelo com timeout por fonte e resultado parcial"""
+
+    def __init__(
+        self,
+        integrations: IntegrationRegistry,
+        timeout: Optional[float] = None,
+        cache: Optional[SnapshotCache] = None
+    ):
+        self.integrations = integrations
+        self.timeout = timeout or settings.SOURCE_FETCH_TIMEOUT_SECONDS
+        self.cache = cache or (SnapshotCache(wait_timeout=self.timeout) if settings.SNAPSHOT_CACHE_ENABLED else None)
+
+    async def fetch(self, hours: int, sources: Iterable[str] = SOURCES) -> FetchResult:
+        """Busca as fontes solicitadas; uma fonte com falha não derruba as demais"""
+        sources = list(sources)
+        results = await asyncio.gather(*(self._fetch_source(source, hours) for source in sources))
+
+        fetch_result = FetchResult()
+        for source, (data, status, revision) in zip(sources, results):
+            if isinstance(data, BucketWindow):
+                fetch_result.windows[source] = data
+            else:
+                fetch_result.data[source] = data
+            fetch_result.status[source] = status
+            fetch_result.revisions[source] = revision
+
+        return fetch_result
+
+    async def _fetch_source(self, source: str, hours: int):
+        start = time.perf_counter()
+        revision = None
+        try:
+            if settings.WINDOW_BUCKETS_ENABLED:
+                data, cache_state = await self._fetch_window(source, hours)
+            else:
+                data, cache_state, revision = await self._load_snapshot(source, self.window_hours(source, hours))
+            status = SourceStatus("active", self._elapsed_ms(start), len(data), cache=cache_state)
+        except asyncio.TimeoutError:
+            # A thread de um SDK síncrono continua até terminar; apenas deixamos de esperar
+            logger.warning(f"Timeout fetching {source} after {self.timeout}s")
+            data = []
+            status = SourceStatus("timeout", self._elapsed_ms(start), 0, f"Timed out after {self.timeout}s")
+        except Exception as e:
+            logger.exception(f"Error fetching {source}: {str(e)}")
+            data = []
+            status = SourceStatus("error", self._elapsed_ms(start), 0, str(e))
+
+        return data, status, revision
+
+    async def _fetch_window(self, source: str, hours: int):
+        """Janela montada a partir dos buckets por hora da fonte, recarregando só o que venceu"""
+        buckets = get_source_buckets(source)
+        cache_state = "bucket"
+        async with buckets.lock:
+            now = time.time()
+            load_hours = buckets.hours_to_load(now)
+            if load_hours:
+                load_hours = self.window_hours(source, load_hours)
+                data, cache_state, _ = await self._load_snapshot(source, load_hours)
+                buckets.replace(data, load_hours, now)
+        return buckets.window(self.window_hours(source, hours), time.time()), cache_state
+
+    async def _load_snapshot(self, source: str, window_hours: int):
+        if self.cache is None:
+            return await self._load_with_timeout(source, window_hours), None, None
+        data, cache_state, revision = await self.cache.get_or_fetch(
+            source, window_hours, partial(self._load_with_timeout, source, window_hours)
+        )
+        # Snapshots lidos do Redis chegam como dicts
+        return to_events(data), cache_state, revision
+
+    async def _load_with_timeout(self, source: str, hours: int) -> List[Event]:
+        return await asyncio.wait_for(self._load(source, hours), timeout=self.timeout)
+
+    @staticmethod
+    def window_hours(source: str, hours: int) -> int:
+        """Janela efetiva da busca; Tenable e OpenCTI trabalham em dias"""
+        if source in ("tenable", "opencti"):
+            return (hours//24 or 1) * 24
+        return hours
+
+    @staticmethod
+    def is_stored(source: str) -> bool:
+        """Fonte servida pela tabela alerts, mantida pela ingestão em background"""
+        return settings.INGESTION_ENABLED or source in STORE_ONLY_SOURCES
+
+    async def _load(self, source: str, hours: int) -> List[Event]:
+        if self.is_stored(source):
+            # Dados mantidos pela ingestão em background
+            async with AsyncSessionLocal() as db:
+                return to_events(await AlertStore.load(db, source, self.window_hours(source, hours)))
+
+        # O raw_data das integrações é descartado aqui; não fica em memória nem no cache
+        return to_events(await self._load_live(source, hours))
+
+    async def _load_live(self, source: str, hours: int) -> List[Dict[str, Any]]:
+        if source == "elastic":
+            return await self.integrations.elastic().get_critical_alerts(hours=hours, raise_errors=True)
+
+        if source == "defender":
+            return await self.integrations.defender().get_critical_alerts(hours=hours, raise_errors=True)
+
+        if source == "tenable":
+            return await self._run_sync(self._load_tenable, hours//24 or 1)
+
+        if source == "opencti":
+            return await self._run_sync(self._load_opencti, hours//24 or 1)
+
+        raise ValueError(f"Unknown source: {source}")
+
+    def _load_tenable(self, days: int) -> List[Dict[str, Any]]:
+        return self.integrations.tenable().get_critical_vulnerabilities(days=days, raise_errors=True)
+
+    def _load_opencti(self, days: int) -> List[Dict[str, Any]]:
+        return self.integrations.opencti().get_critical_indicators(days=days, raise_errors=True)
+
+    @staticmethod
+    async def _run_sync(func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_sync_executor, partial(func, *args))
+
+    @staticmethod
+    def _elapsed_ms(start: float) -> int:
+        return int((time.perf_counter() - start) * 1000)
@@ -0,0 +1,274 @@
+from typing import List, Dict, Optional, Tuple
+from bisect import bisect_right
+from app.services.events import Event
+from app.services.alert_store import parse_timestamp
+from app.services.asset_resolver import get_asset_resolver
+from app.services.indicator_index import IndicatorIndex
+from app.config import settings
+import asyncio
+import itertools
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 3600
+
+# Identifica cada conteúdo de bucket e de parcela; muda a cada alteração
+_serials = itertools.count()
+
+def hour_of(timestamp: float) -> int:
+    return int(timestamp // BUCKET_SECONDS)
+
+def event_time(event: Event) -> Optional[float]:
+    parsed = parse_timestamp(event.get("timestamp"))
+    return parsed.timestamp() if parsed else None
+
+def _same(a: Event, b: Event) -> bool:
+    return type(a) is type(b) and all(a.get(field) == b.get(field) for field in a.FIELDS)
+
+class AssetPartial:
+    """Parcelas aditivas do score de um ativo em um bucket, com os eventos do mais novo para o mais antigo"""
+
+    __slots__ = ("serial", "source", "events", "elastic_total", "tenable_total", "exploit_count", "_index", "_has_indicators")
+
+    def __init__(self, source: str):
+        self.serial = next(_serials)
+        self.source = source
+        self.events: List[Event] = []
+        self.elastic_total = 0.0
+        self.tenable_total = 0.0  # Sem o multiplicador de exploit, aplicado na janela
+        self.exploit_count = 0
+        self._index: Optional[IndicatorIndex] = None
+        self._has_indicators = False
+
+    def add(self, event: Event):
+        self.events.append(event)
+        if self.source == "elastic":
+            self.elastic_total += event.get("risk_score", 0) * 0.3
+        elif self.source == "tenable":
+            self.tenable_total += max(event.get("cvss_score", 0), event.get("vpr_score", 0)) * 10 * 0.4
+            if event.get("exploit_available", False):
+                self.exploit_count += 1
+
+    def has_indicators(self, index: IndicatorIndex) -> bool:
+        """Algum evento casa com um indicador; memorizado por índice"""
+        if index is not self._index:
+            self._index = index
+            self._has_indicators = bool(index.size) and any(
+                index.match([event.get('asset')] + event.get('observables', [])) for event in self.events
+            )
+        return self._has_indicators
+
+class HourBucket:
+    """Eventos normalizados de uma fonte em uma hora, com as parcelas por ativo calculadas sob demanda"""
+
+    __slots__ = ("source", "hour", "events", "times", "serial", "_ordered", "_partials", "_tail")
+
+    def __init__(self, source: str, hour: int):
+        self.source = source
+        self.hour = hour
+        self.events: Dict[str, Event] = {}
+        self.times: Dict[str, float] = {}
+        self.serial = next(_serials)
+        self._ordered: Optional[List[Tuple[Tuple[float, str], Event]]] = None
+        self._partials = None
+        self._tail = None
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def put(self, event: Event, time: float):
+        self.events[event["id"]] = event
+        self.times[event["id"]] = time
+        self._changed()
+
+    def discard(self, event_id: str):
+        if self.events.pop(event_id, None) is not None:
+            del self.times[event_id]
+            self._changed()
+
+    def _changed(self):
+        self.serial = next(_serials)
+        self._ordered = None
+        self._partials = None
+        self._tail = None
+
+    def ordered(self) -> List[Event]:
+        """Eventos do mais novo para o mais antigo (mesma ordem das buscas)"""
+        return [event for _, event in self.timeline()]
+
+    def timeline(self) -> List[Tuple[Tuple[float, str], Event]]:
+        """Eventos com a chave de ordenação (-epoch, id): do mais novo para o mais antigo, id como desempate"""
+        if self._ordered is None:
+            self._ordered = sorted(
+                (((-self.times[event_id], event_id), event) for event_id, event in self.events.items()),
+                key=lambda item: item[0]
+            )
+        return self._ordered
+
+    def since(self, cutoff: float) -> "HourBucket":
+        """Recorte do bucket a partir de cutoff (início de uma janela no meio da hora)"""
+        timeline = self.timeline()
+        count = bisect_right([key[0] for key, _ in timeline], -cutoff)
+        if count == len(timeline):
+            return self
+
+        # O recorte fica em cache enquanto nenhum evento cruzar o início da janela
+        if self._tail is None or self._tail[0] != count:
+            tail = HourBucket(self.source, self.hour)
+            for (negative_time, event_id), event in timeline[:count]:
+                tail.events[event_id] = event
+                tail.times[event_id] = -negative_time
+            self._tail = (count, tail)
+        return self._tail[1]
+
+    def partials(self) -> Dict[str, AssetPartial]:
+        """Parcelas por ativo canônico; refeitas quando o bucket ou o inventário de ativos muda"""
+        resolver = get_asset_resolver()
+        if self._partials is None or self._partials[0] is not resolver:
+            partials: Dict[str, AssetPartial] = {}
+            for event in self.ordered():
+                asset = resolver.resolve(event.get('asset', ''))
+                if not asset:
+                    continue
+                partial = partials.get(asset)
+                if partial is None:
+                    partial = partials[asset] = AssetPartial(self.source)
+                partial.add(event)
+            self._partials = (resolver, partials)
+        return self._partials[1]
+
+class BucketWindow:
+    """Buckets de uma fonte dentro de uma janela, do mais novo para o mais antigo"""
+
+    __slots__ = ("source", "buckets", "_events")
+
+    def __init__(self, source: str, buckets: List[HourBucket]):
+        self.source = source
+        self.buckets = buckets
+        self._events: Optional[List[Event]] = None
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self.buckets)
+
+    def events(self) -> List[Event]:
+        if self._events is None:
+            self._events = [event for bucket in self.buckets for event in bucket.ordered()]
+        return self._events
+
+    def fingerprint(self) -> Tuple[int, ...]:
+        return tuple(bucket.serial for bucket in self.buckets)
+
+class SourceBuckets:
+    """Eventos de uma fonte em buckets de uma hora, compartilhados por todas as janelas.
+
+    A carga completa (WINDOW_BUCKETS_MAX_HOURS) é refeita a cada
+    WINDOW_BUCKETS_FULL_REFRESH_SECONDS; entre elas só a cauda recente é
+    recarregada. Os buckets cobertos por inteiro pela carga são sincronizados
+    com ela (inclusive remoções); um bucket sem mudança mantém o serial e as
+    parcelas já calculadas. Buckets mais antigos que a janela máxima são
+    descartados.
+    """
+
+    def __init__(self, source: str, max_hours: Optional[int] = None):
+        self.source = source
+        self.max_hours = max_hours or settings.WINDOW_BUCKETS_MAX_HOURS
+        self.buckets: Dict[int, HourBucket] = {}
+        self._hours: Dict[str, int] = {}
+        self.refreshed_at: Optional[float] = None
+        self.full_refreshed_at: Optional[float] = None
+        self.lock = asyncio.Lock()
+
+    def hours_to_load(self, now: float) -> int:
+        """Janela que precisa ser recarregada agora (0 se os buckets estão em dia)"""
+        if self.full_refreshed_at is None or now - self.full_refreshed_at >= settings.WINDOW_BUCKETS_FULL_REFRESH_SECONDS:
+            return self.max_hours
+        if now - self.refreshed_at < settings.WINDOW_BUCKETS_REFRESH_SECONDS:
+            return 0
+        elapsed = now - self.refreshed_at + settings.INGESTION_OVERLAP_MINUTES * 60
+        return min(math.ceil(elapsed / BUCKET_SECONDS), self.max_hours)
+
+    def replace(self, events: List[Event], hours: int, now: float):
+        """Aplica uma carga das últimas `hours` horas feita em `now`"""
+        since = now - hours * 3600
+        # Só os buckets inteiros dentro da carga podem ter eventos removidos
+        first_full = math.ceil(since / BUCKET_SECONDS)
+
+        seen = set()
+        for event in events:
+            event_id = event["id"]
+            seen.add(event_id)
+            time = event_time(event)
+            if time is None:
+                # Sem timestamp: mantém a hora em que foi visto pela primeira vez
+                hour = self._hours.get(event_id)
+                time = self.buckets[hour].times[event_id] if hour is not None else now
+            self._put(event, time)
+
+        for hour, bucket in list(self.buckets.items()):
+            if hour < first_full:
+                continue
+            for event_id in [event_id for event_id in bucket.events if event_id not in seen]:
+                self._discard(event_id)
+
+        self.refreshed_at = now
+        if hours >= self.max_hours:
+            self.full_refreshed_at = now
+        self.expire(now)
+
+        logger.info(f"Loaded {len(events)} {self.source} events ({hours}h) into {len(self.buckets)} hour buckets")
+
+    def expire(self, now: float):
+        """Descarta os buckets anteriores à janela máxima"""
+        oldest = hour_of(now - self.max_hours * 3600)
+        for hour in [hour for hour in self.buckets if hour < oldest]:
+            for event_id in self.buckets.pop(hour).events:
+                self._hours.pop(event_id, None)
+
+    def window(self, hours: int, now: float) -> BucketWindow:
+        """Buckets da janela; o mais antigo é recortado no início exato dela"""
+        cutoff = now - hours * 3600
+        first = hour_of(cutoff)
+        selected = []
+        for hour in sorted((hour for hour in self.buckets if hour >= first), reverse=True):
+            bucket = self.buckets[hour]
+            if hour == first:
+                bucket = bucket.since(cutoff)
+            if len(bucket):
+                selected.append(bucket)
+        return BucketWindow(self.source, selected)
+
+    def _put(self, event: Event, time: float):
+        event_id = event["id"]
+        hour = hour_of(time)
+        previous = self._hours.get(event_id)
+        if previous is not None and previous != hour:
+            self._discard(event_id)
+
+        bucket = self.buckets.get(hour)
+        if bucket is None:
+            bucket = self.buckets[hour] = HourBucket(self.source, hour)
+
+        existing = bucket.events.get(event_id)
+        if existing is not None and bucket.times[event_id] == time and _same(existing, event):
+            return
+        bucket.put(event, time)
+        self._hours[event_id] = hour
+
+    def _discard(self, event_id: str):
+        hour = self._hours.pop(event_id, None)
+        bucket = self.buckets.get(hour)
+        if bucket is None:
+            return
+        bucket.discard(event_id)
+        if not len(bucket):
+            del self.buckets[hour]
+
+_source_buckets: Dict[str, SourceBuckets] = {}
+
+def get_source_buckets(source: str) -> SourceBuckets:
+    buckets = _source_buckets.get(source)
+    if buckets is None:
+        buckets = _source_buckets[source] = SourceBuckets(source)
+    return buckets
@@ -0,0 +1,83 @@
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
+from datetime import datetime, timezone
+from itertools import dropwhile, islice
+from app.services.events import Event
+from app.services.time_buckets import BucketWindow, event_time, hour_of
+import base64
+import heapq
+import json
+
+TIMELINE_SOURCES = ("elastic", "defender")
+
+# Chave de ordenação da timeline: (-epoch, id), do mais novo para o mais antigo
+TimelineKey = Tuple[float, str]
+
+def encode_timeline_cursor(key: TimelineKey) -> str:
+    """Cursor opaco com o instante e o id do último evento da página"""
+    raw = json.dumps([-key[0], key[1]]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_timeline_cursor(cursor: str) -> TimelineKey:
+    try:
+        timestamp, event_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return -float(timestamp), str(event_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def _bucket_stream(window: BucketWindow, before: Optional[TimelineKey]) -> Iterator[Tuple[TimelineKey, Event]]:
+    """Eventos de uma fonte já ordenados pelos buckets; os mais novos que o cursor são pulados sem leitura"""
+    newest_hour = hour_of(-before[0]) if before else None
+    for bucket in window.buckets:
+        if newest_hour is not None and bucket.hour > newest_hour:
+            continue
+        timeline = bucket.timeline()
+        if before and bucket.hour == newest_hour:
+            timeline = dropwhile(lambda item: item[0] <= before, timeline)
+        yield from timeline
+
+def _list_stream(events: List[Event], before: Optional[TimelineKey], limit: int) -> Iterator[Tuple[TimelineKey, Event]]:
+    """Fonte sem buckets: heap limitado aos limit + 1 eventos mais novos que o cursor"""
+    keyed = []
+    for event in events:
+        time = event_time(event)
+        if time is None:
+            continue
+        key = (-time, event["id"])
+        if before is None or key > before:
+            keyed.append((key, event))
+    return iter(heapq.nsmallest(limit + 1, keyed, key=lambda item: item[0]))
+
+def _tagged(source: str, stream: Iterator[Tuple[TimelineKey, Event]]) -> Iterator[Tuple[TimelineKey, str, Event]]:
+    for key, event in stream:
+        yield key, source, event
+
+def _entry(source: str, key: TimelineKey, event: Event) -> Dict[str, Any]:
+    return {
+        "id": event.get("id"),
+        "timestamp": datetime.fromtimestamp(-key[0], timezone.utc).isoformat(),
+        "source": source,
+        "severity": event.get("severity"),
+        "title": event.get("title"),
+        "asset": event.get("asset")
+    }
+
+def build_timeline(
+    sources: Dict[str, Union[BucketWindow, List[Event]]],
+    limit: int,
+    before: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Merge k-way das fontes ordenadas; retorna a página e o cursor da próxima.
+
+    Só os limit + 1 primeiros eventos do merge são lidos: a janela inteira
+    nunca é copiada nem ordenada.
+    """
+    after = decode_timeline_cursor(before) if before else None
+
+    streams = []
+    for source, data in sources.items():
+        stream = _bucket_stream(data, after) if isinstance(data, BucketWindow) else _list_stream(data, after, limit)
+        streams.append(_tagged(source, stream))
+
+    merged = list(islice(heapq.merge(*streams, key=lambda item: item[0]), limit + 1))
+    next_cursor = encode_timeline_cursor(merged[limit - 1][0]) if len(merged) > limit else None
+    return [_entry(source, key, event) for key, source, event in merged[:limit]], next_cursor
@@ -0,0 +1 @@
+"""Benchmarks de correlação e exportação com dados sintéticos"""
@@ -0,0 +1,197 @@
+"""Geradores de dados sintéticos no formato exato das integrações.
+
+Os documentos brutos (hit do Elastic, vulnerabilidade exportada do Tenable,
+alerta do Graph e indicador do OpenCTI) passam pelos próprios métodos de
+normalização das integrações e depois viram os mesmos registros Event
+(sem raw_data) que o SourceFetcher entrega à correlação em produção.
+"""
+from typing import List, Dict, Any
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from app.integrations.elastic import ElasticIntegration
+from app.integrations.tenable import TenableIntegration
+from app.integrations.defender import DefenderIntegration
+from app.integrations.opencti import OpenCTIIntegration
+from app.services.events import Event, to_events
+import itertools
+import random
+import uuid
+
+# Os clientes nunca são usados: só a normalização roda nos benchmarks
+_OFFLINE = object()
+
+SEVERITIES = ["critical", "high", "medium", "low"]
+RULES = [
+    "Suspicious PowerShell Execution", "Credential Dumping via LSASS", "Lateral Movement via SMB",
+    "Possible Ransomware Activity", "Unusual Outbound Connection", "Brute Force Authentication"
+]
+PLUGINS = [
+    (156032, "Apache Log4j RCE (Log4Shell)"), (97833, "MS17-010 SMBv1 RCE"),
+    (171340, "OpenSSL Buffer Overflow"), (162721, "Microsoft Exchange ProxyShell"),
+    (148125, "VMware vCenter RCE")
+]
+MITRE_TECHNIQUES = ["T1059.001", "T1003.001", "T1021.002", "T1486", "T1071.001", "T1110"]
+
+@dataclass
+class Scenario:
+    name: str
+    assets: int
+    events_per_asset: int
+    indicators: int
+    window_hours: int
+    seed: int = 42
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+@dataclass
+class Dataset:
+    elastic_alerts: List[Event]
+    tenable_vulns: List[Event]
+    defender_alerts: List[Event]
+    opencti_indicators: List[Event]
+
+    @property
+    def event_count(self) -> int:
+        return len(self.elastic_alerts) + len(self.tenable_vulns) + len(self.defender_alerts)
+
+class SyntheticDataGenerator:
+    """Gera uma janela de eventos das quatro fontes para um cenário.
+
+    Cada ativo tem hostname, FQDN e IP; as fontes usam identificadores
+    diferentes para o mesmo ativo, como acontece em produção. Os eventos
+    são distribuídos em 50% Elastic, 30% Tenable e 20% Defender, com
+    timestamps espalhados pela janela. Parte dos indicadores usa IPs e
+    domínios que aparecem nos eventos, para exercitar o matching.
+    """
+
+    def __init__(self, scenario: Scenario):
+        self.scenario = scenario
+        self.random = random.Random(scenario.seed)
+        self.now = datetime.now(timezone.utc)
+        self.elastic = ElasticIntegration(client=_OFFLINE)
+        self.tenable = TenableIntegration(client=_OFFLINE)
+        self.defender = DefenderIntegration(credential=_OFFLINE, token_provider=_OFFLINE)
+        self.opencti = OpenCTIIntegration(client=_OFFLINE)
+        self.hosts = [self._host(i) for i in range(scenario.assets)]
+        self.plugin_offsets = itertools.count()
+
+    def generate(self) -> Dataset:
+        elastic_alerts, tenable_vulns, defender_alerts = [], [], []
+        for host in self.hosts:
+            for _ in range(self.scenario.events_per_asset):
+                roll = self.random.random()
+                if roll < 0.5:
+                    elastic_alerts.append(self.elastic._normalize_alert(self._elastic_hit(host)))
+                elif roll < 0.8:
+                    vuln = self.tenable._normalize_vuln(self._tenable_vuln(host))
+                    if vuln:
+                        tenable_vulns.append(vuln)
+                else:
+                    defender_alerts.append(self.defender._normalize_alert(self._graph_alert(host)))
+
+        # Mesma ordem das buscas: mais recentes primeiro
+        defender_alerts.sort(key=lambda a: a["timestamp"], reverse=True)
+
+        opencti_indicators = []
+        for _ in range(self.scenario.indicators):
+            indicator = self.opencti._normalize_indicator(self._opencti_indicator())
+            if indicator:
+                opencti_indicators.append(indicator)
+
+        # Mesmo formato do caminho de produção (SourceFetcher): Event, sem raw_data
+        return Dataset(to_events(elastic_alerts), to_events(tenable_vulns), to_events(defender_alerts), to_events(opencti_indicators))
+
+    def _host(self, index: int) -> Dict[str, str]:
+        name = f"srv{index:05d}"
+        return {
+            "hostname": name,
+            "fqdn": f"{name}.corp.example.com",
+            "ip": f"10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}",
+            "uuid": str(uuid.UUID(int=self.random.getrandbits(128)))
+        }
+
+    def _timestamp(self) -> datetime:
+        return self.now - timedelta(seconds=self.random.uniform(0, self.scenario.window_hours * 3600))
+
+    def _external_ip(self) -> str:
+        return f"203.0.{self.random.randint(0, 255)}.{self.random.randint(1, 254)}"
+
+    def _elastic_hit(self, host: Dict[str, str]) -> Dict[str, Any]:
+        return {
+            "_id": uuid.UUID(int=self.random.getrandbits(128)).hex,
+            "_source": {
+                "@timestamp": self._timestamp().isoformat().replace("+00:00", "Z"),
+                "event": {
+                    "severity": self.random.choice(SEVERITIES[:3]),
+                    "risk_score": self.random.randint(40, 100)
+                },
+                "rule": {"name": self.random.choice(RULES)},
+                "message": "Synthetic detection generated for benchmarking " * 3,
+                "host": {"name": host["hostname"], "ip": [host["ip"]]},
+                "source": {"ip": host["ip"]},
+                "destination": {"ip": self._external_ip(), "domain": f"c2-{self.random.randint(0, 500)}.example.net"},
+                "process": {"name": "powershell.exe", "args": ["-enc", "SQBFAFgA" * 20]}
+            }
+        }
+
+    def _tenable_vuln(self, host: Dict[str, str]) -> Dict[str, Any]:
+        plugin_id, plugin_name = self.random.choice(PLUGINS)
+        return {
+            "asset": {
+                "uuid": host["uuid"],
+                "fqdn": host["fqdn"] if self.random.random() < 0.7 else None,
+                "ipv4": host["ip"],
+                "hostname": host["hostname"]
+            },
+            # Um ativo não repete plugin: o id da vulnerabilidade é único, como na exportação
+            "plugin_id": plugin_id * 1000 + next(self.plugin_offsets),
+            "plugin_name": plugin_name,
+            "plugin_description": "Synthetic vulnerability description for benchmarking. " * 5,
+            "severity": self.random.choice(["critical", "high"]),
+            "cvss3_base_score": round(self.random.uniform(6.5, 10.0), 1),
+            "vpr_score": round(self.random.uniform(5.0, 10.0), 1),
+            "exploit_available": self.random.random() < 0.3,
+            "cve": [f"CVE-2024-{self.random.randint(1000, 99999)}"],
+            "state": "open",
+            "last_found": self._timestamp().isoformat()
+        }
+
+    def _graph_alert(self, host: Dict[str, str]) -> Dict[str, Any]:
+        created = self._timestamp()
+        return {
+            "id": uuid.UUID(int=self.random.getrandbits(128)).hex,
+            "severity": self.random.choice(["high", "medium"]),
+            "title": self.random.choice(RULES),
+            "description": "Synthetic Defender alert generated for benchmarking. " * 4,
+            "category": "Execution",
+            "mitreTechniques": self.random.sample(MITRE_TECHNIQUES, self.random.randint(0, 2)),
+            "threatFamilyName": "",
+            "createdDateTime": created.isoformat().replace("+00:00", "Z"),
+            "lastUpdateDateTime": (created + timedelta(minutes=5)).isoformat().replace("+00:00", "Z"),
+            "devices": [{"deviceDnsName": host["fqdn"], "ipAddresses": [host["ip"]]}],
+            "evidence": [
+                {"ipAddress": self._external_ip()},
+                {"fileDetails": {"sha256": "%064x" % self.random.getrandbits(256)}}
+            ]
+        }
+
+    def _opencti_indicator(self) -> Dict[str, Any]:
+        if self.random.random() < 0.5:
+            value = self._external_ip()
+            pattern = f"[ipv4-addr:value = '{value}']"
+        else:
+            value = f"c2-{self.random.randint(0, 500)}.example.net"
+            pattern = f"[domain-name:value = '{value}']"
+        return {
+            "id": str(uuid.UUID(int=self.random.getrandbits(128))),
+            "name": value,
+            "pattern": pattern,
+            "pattern_type": "stix",
+            "description": "Synthetic indicator",
+            "confidence": self.random.randint(75, 100),
+            "x_opencti_score": self.random.randint(50, 100),
+            "labels": ["malicious-activity"],
+            "killChainPhases": [],
+            "created": self._timestamp().isoformat()
+        }
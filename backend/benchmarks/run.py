@@ -0,0 +1,204 @@
+"""Executa os benchmarks de correlação e exportação.
+
+Uso (dentro do ambiente do backend):
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --scenario large --repeat 5 --compare baseline.json
+    python -m benchmarks.run --assets 2000 --events-per-asset 40 --indicators 800 --hours 48
+
+A correlação é medida completa (correlate_events, como na exportação) e
+para uma página do dashboard (correlate_page, PAGE_SIZE ativos). Para cada
+cenário são medidos o tempo de parede (mínimo e mediana de várias
+execuções), o pico de memória e os blocos alocados pelo resultado
+(tracemalloc, em uma execução separada para não distorcer o tempo) e as
+coleções do GC por execução.
+"""
+from typing import List, Dict, Any, Callable, Optional
+from app.services.correlation import CorrelationEngine
+from app.services.indicator_index import IndicatorIndex, classify_observable
+from app.services.export_service import ExportService
+from benchmarks.generators import Scenario, Dataset, SyntheticDataGenerator
+import argparse
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# Página padrão do frontend em /critical-alerts
+PAGE_SIZE = 100
+
+SCENARIOS = {
+    "small": Scenario("small", assets=100, events_per_asset=20, indicators=50, window_hours=24),
+    "medium": Scenario("medium", assets=1000, events_per_asset=50, indicators=500, window_hours=72),
+    "large": Scenario("large", assets=5000, events_per_asset=60, indicators=2000, window_hours=168)
+}
+
+def _reset_caches():
+    # O índice de indicadores é memorizado entre chamadas: cada execução parte do zero
+    IndicatorIndex._cached = None
+    classify_observable.cache_clear()
+
+def _gc_collections() -> int:
+    return sum(generation["collections"] for generation in gc.get_stats())
+
+def measure(target: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    try:
+        return _measure(target, repeat)
+    except Exception as e:
+        # Um alvo quebrado não interrompe os demais; o erro fica registrado no relatório
+        tracemalloc.stop()
+        return {"error": f"{type(e).__name__}: {e}"}
+
+def _measure(target: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    timings = []
+    collections = 0
+    for _ in range(repeat):
+        _reset_caches()
+        gc.collect()
+        before = _gc_collections()
+        start = time.perf_counter()
+        target()
+        timings.append((time.perf_counter() - start) * 1000)
+        collections += _gc_collections() - before
+
+    _reset_caches()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = target()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return {
+        "min_ms": round(min(timings), 2),
+        "median_ms": round(statistics.median(timings), 2),
+        "peak_memory_mb": round(peak / 1024 / 1024, 2),
+        # Blocos ainda alocados com o resultado vivo (o pico cobre os temporários)
+        "allocated_blocks": sum(stat.count_diff for stat in after.compare_to(before, "filename")),
+        "gc_collections": collections // repeat
+    }
+
+def run_scenario(scenario: Scenario, repeat: int, exports: bool) -> Dict[str, Any]:
+    dataset: Dataset = SyntheticDataGenerator(scenario).generate()
+    engine = CorrelationEngine()
+
+    def correlate():
+        return engine.correlate_events(
+            elastic_alerts=dataset.elastic_alerts,
+            tenable_vulns=dataset.tenable_vulns,
+            defender_alerts=dataset.defender_alerts,
+            opencti_indicators=dataset.opencti_indicators
+        )
+
+    def correlate_page():
+        return engine.correlate_page(
+            dataset.elastic_alerts, dataset.tenable_vulns, dataset.defender_alerts, dataset.opencti_indicators,
+            limit=PAGE_SIZE
+        )
+
+    results = {"correlate_events": measure(correlate, repeat), "correlate_page": measure(correlate_page, repeat)}
+    correlations = correlate()
+
+    if exports:
+        results["export_to_excel"] = measure(lambda: ExportService.export_to_excel(correlations), repeat)
+        results["export_to_pdf"] = measure(lambda: ExportService.export_to_pdf(correlations), repeat)
+
+    return {
+        "scenario": scenario.to_dict(),
+        "events": dataset.event_count,
+        "indicators": len(dataset.opencti_indicators),
+        "correlations": len(correlations),
+        "results": results
+    }
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]):
+    """Imprime a razão atual / baseline de cada métrica (abaixo de 1.0 é melhora)"""
+    previous = {entry["scenario"]["name"]: entry for entry in baseline.get("scenarios", [])}
+    for entry in report["scenarios"]:
+        name = entry["scenario"]["name"]
+        if name not in previous:
+            continue
+        for target, metrics in entry["results"].items():
+            before = previous[name]["results"].get(target)
+            if not before or "error" in metrics:
+                continue
+            ratios = ", ".join(
+                f"{metric}={metrics[metric] / before[metric]:.2f}x"
+                for metric in ("median_ms", "peak_memory_mb", "allocated_blocks")
+                if before.get(metric)
+            )
+            print(f"{name:>8} {target:<18} {ratios}")
+
+def _print_entry(entry: Dict[str, Any]):
+    name = entry["scenario"]["name"]
+    print(f"{name}: {entry['events']} events, {entry['indicators']} indicators, {entry['correlations']} correlations")
+    for target, metrics in entry["results"].items():
+        if "error" in metrics:
+            print(f"  {target:<18} failed: {metrics['error']}")
+            continue
+        print(
+            f"  {target:<18} min {metrics['min_ms']:>10.2f} ms  median {metrics['median_ms']:>10.2f} ms  "
+            f"peak {metrics['peak_memory_mb']:>8.2f} MB  blocks {metrics['allocated_blocks']:>9}  "
+            f"gc {metrics['gc_collections']}"
+        )
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmarks de correlação e exportação com dados sintéticos")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Cenário pré-definido (repetível)")
+    parser.add_argument("--assets", type=int, help="Cenário customizado: número de ativos")
+    parser.add_argument("--events-per-asset", type=int, default=50)
+    parser.add_argument("--indicators", type=int, default=500)
+    parser.add_argument("--hours", type=int, default=24, help="Janela dos timestamps gerados")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-exports", action="store_true", help="Mede apenas a correlação")
+    parser.add_argument("--output", help="Arquivo JSON com os resultados")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparação")
+    args = parser.parse_args(argv)
+
+    if args.assets:
+        scenarios = [Scenario("custom", args.assets, args.events_per_asset, args.indicators, args.hours, args.seed)]
+    else:
+        scenarios = [SCENARIOS[name] for name in args.scenario or SCENARIOS]
+
+    report = {
+        "metadata": {
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        },
+        "scenarios": []
+    }
+
+    for scenario in scenarios:
+        entry = run_scenario(scenario, args.repeat, not args.skip_exports)
+        report["scenarios"].append(entry)
+        _print_entry(entry)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""Configuração dos testes de integração.
+
+Os testes de banco rodam contra TEST_DATABASE_URL, um PostgreSQL descartável:
+o schema public é recriado a cada teste. Sem a variável eles são ignorados.
+"""
+import os
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+# Settings exige as credenciais das integrações, que os testes nunca usam
+for name, value in {
+    "DATABASE_URL": TEST_DATABASE_URL or "postgresql+asyncpg://localhost/unused",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "SECRET_KEY": "test",
+    "ELASTICSEARCH_URL": "http://localhost:9200",
+    "TENABLE_ACCESS_KEY": "test",
+    "TENABLE_SECRET_KEY": "test",
+    "DEFENDER_TENANT_ID": "test",
+    "DEFENDER_CLIENT_ID": "test",
+    "DEFENDER_CLIENT_SECRET": "test",
+    "OPENCTI_URL": "http://localhost:8080",
+    "OPENCTI_TOKEN": "test",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,95 @@
+"""Atualização de um banco criado pela versão original (tabela alerts sem partições)"""
+from datetime import datetime, timezone
+from conftest import TEST_DATABASE_URL
+import asyncio
+import pytest
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL não definido")
+
+# DDL gerado por create_all para os modelos da versão original
+BASELINE_DDL = (
+    """CREATE TABLE data_sources (
+        id SERIAL NOT NULL,
+        name VARCHAR NOT NULL,
+        source_type VARCHAR NOT NULL,
+        config JSON NOT NULL,
+        is_enabled BOOLEAN,
+        last_sync TIMESTAMP WITH TIME ZONE,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        updated_at TIMESTAMP WITH TIME ZONE,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX ix_data_sources_id ON data_sources (id)",
+    """CREATE TABLE alerts (
+        id SERIAL NOT NULL,
+        source VARCHAR NOT NULL,
+        alert_id VARCHAR NOT NULL,
+        severity VARCHAR NOT NULL,
+        title VARCHAR NOT NULL,
+        description VARCHAR,
+        asset VARCHAR,
+        raw_data JSON,
+        correlation_score INTEGER,
+        is_correlated BOOLEAN,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        PRIMARY KEY (id),
+        UNIQUE (alert_id)
+    )""",
+    "CREATE INDEX ix_alerts_id ON alerts (id)",
+)
+
+CREATED_AT = datetime(2024, 3, 1, 12, 30, tzinfo=timezone.utc)
+
+async def _upgrade_baseline():
+    from sqlalchemy import select, text
+    from app.database import engine, AsyncSessionLocal
+    from app.models import DataSource
+    from app.services.alert_partitions import prepare_alert_tables
+
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP SCHEMA public CASCADE"))
+            await conn.execute(text("CREATE SCHEMA public"))
+            for statement in BASELINE_DDL:
+                await conn.execute(text(statement))
+            await conn.execute(text(
+                "INSERT INTO alerts (source, alert_id, severity, title, asset, raw_data, correlation_score, is_correlated, created_at) "
+                "VALUES ('elastic', 'elastic_1', 'critical', 'Old alert', 'srv01', CAST(:raw_data AS JSON), 0, false, :created_at)"
+            ), {"raw_data": '{"a": 1}', "created_at": CREATED_AT})
+            await conn.execute(text(
+                "INSERT INTO data_sources (name, source_type, config, is_enabled) VALUES ('Tenable', 'tenable', '{}', true)"
+            ))
+
+        # Duas vezes: a segunda inicialização não pode falhar nem duplicar registros
+        await prepare_alert_tables()
+        await prepare_alert_tables()
+
+        async with engine.connect() as conn:
+            relkind = (await conn.execute(text("SELECT relkind::text FROM pg_class WHERE relname = 'alerts'"))).scalar()
+            rows = (await conn.execute(text(
+                "SELECT alert_id, event_time, details, updated_at, raw_data FROM alerts"
+            ))).all()
+            legacy = (await conn.execute(text("SELECT to_regclass('alerts_legacy')"))).scalar()
+
+        async with AsyncSessionLocal() as db:
+            sources = (await db.execute(select(DataSource))).scalars().all()
+
+        return relkind, rows, legacy, sources
+    finally:
+        await engine.dispose()
+
+def test_prepare_alert_tables_converts_the_baseline_schema():
+    relkind, rows, legacy, sources = asyncio.run(_upgrade_baseline())
+
+    assert relkind == "p"
+    assert legacy is None
+    assert len(rows) == 1
+    alert_id, event_time, details, updated_at, raw_data = rows[0]
+    assert alert_id == "elastic_1"
+    # Sem event_time na tabela antiga, a hora do evento vem de created_at
+    assert event_time == CREATED_AT
+    assert details is None
+    assert updated_at is None
+    assert raw_data == {"a": 1}
+
+    assert [source.sync_state for source in sources] == [None]
@@ -0,0 +1,55 @@
+"""Retenção por idade: indicadores do OpenCTI não expiram enquanto ativos na origem"""
+from datetime import datetime, timedelta, timezone
+from conftest import TEST_DATABASE_URL
+import asyncio
+import pytest
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL não definido")
+
+async def _run_retention(now: datetime, old: datetime):
+    from sqlalchemy import text
+    from app.config import settings
+    from app.database import engine
+    from app.services.alert_partitions import ensure_partitions, day_of, prepare_alert_tables, _known
+    from app.services.retention import RetentionService
+
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP SCHEMA public CASCADE"))
+            await conn.execute(text("CREATE SCHEMA public"))
+        _known.clear()
+        await prepare_alert_tables()
+        await ensure_partitions({day_of(old)})
+
+        async with engine.begin() as conn:
+            for source, alert_id in (("elastic", "elastic_1"), ("opencti", "opencti_1")):
+                await conn.execute(text(
+                    "INSERT INTO alerts (source, alert_id, severity, title, event_time) "
+                    "VALUES (:source, :alert_id, 'high', 'Old event', :event_time)"
+                ), {"source": source, "alert_id": alert_id, "event_time": old})
+
+        service = RetentionService()
+        dropped = await service.drop_partitions(now)
+        for source in settings.RETENTION_COLD_DAYS:
+            await service.expire_alerts(source, now - timedelta(days=settings.RETENTION_COLD_DAYS[source]))
+
+        async with engine.connect() as conn:
+            remaining = (await conn.execute(text("SELECT alert_id FROM alerts ORDER BY alert_id"))).scalars().all()
+        return dropped, remaining
+    finally:
+        await engine.dispose()
+
+def test_old_indicators_survive_retention():
+    from app.config import settings
+    from app.services.alert_store import AlertStore
+
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(days=max(settings.RETENTION_COLD_DAYS.values()) + 10)
+
+    dropped, remaining = asyncio.run(_run_retention(now, old))
+
+    # O dia tem um indicador: a partição fica e só o alerta do Elastic sai
+    assert dropped == 0
+    assert remaining == ["opencti_1"]
+    assert not AlertStore._expired({"source": "opencti", "timestamp": old.isoformat()})
+    assert AlertStore._expired({"source": "elastic", "timestamp": old.isoformat()})
@@ -38,6 +38,14 @@ const UserManagement: FC = () => {
     },
   });
 
+  const updateActiveMutation = useMutation({
+    mutationFn: ({ userId, isActive }: { userId: number; isActive: boolean }) =>
+      adminAPI.updateUserActive(userId, isActive),
+    onSuccess: () => {
+      queryClient.invalidateQueries({ queryKey: ['users'] });
+    },
+  });
+
   const deleteMutation = useMutation({
     mutationFn: adminAPI.deleteUser,
     onSuccess: () => {
@@ -230,15 +238,20 @@ const UserManagement: FC = () => {
                   )}
                 </td>
                 <td className="px-6 py-4 whitespace-nowrap">
-                  <span
-                    className={`px-2 py-1 inline-flex text-xs leading-5 font-semibold rounded-full ${
+                  <button
+                    onClick={() =>
+                      updateActiveMutation.mutate({ userId: user.id, isActive: !user.is_active })
+                    }
+                    disabled={updateActiveMutation.isPending}
+                    title={user.is_active ? 'Desativar usuário' : 'Ativar usuário'}
+                    className={`px-2 py-1 inline-flex text-xs leading-5 font-semibold rounded-full disabled:opacity-50 ${
                       user.is_active
                         ? 'bg-green-900 text-green-200'
                         : 'bg-red-900 text-red-200'
                     }`}
                   >
                     {user.is_active ? 'Ativo' : 'Inativo'}
-                  </span>
+                  </button>
                 </td>
                 <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-300">
                   {new Date(user.created_at).toLocaleDateString('pt-BR')}
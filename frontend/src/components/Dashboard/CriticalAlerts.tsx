@@ -1,15 +1,50 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { AlertCircle, ChevronDown, ChevronUp } from 'lucide-react';
-import type { CorrelationResult } from '@/types';
+import type { CorrelationResult, CriticalAlert } from '@/types';
+import { dashboardAPI } from '@/services/api';
 import { format } from 'date-fns';
 import { ptBR } from 'date-fns/locale';
 
 interface CriticalAlertsProps {
   alerts: CorrelationResult[];
+  hours: number;
 }
 
-const CriticalAlerts: React.FC<CriticalAlertsProps> = ({ alerts }) => {
+const CriticalAlerts: React.FC<CriticalAlertsProps> = ({ alerts, hours }) => {
   const [expandedAsset, setExpandedAsset] = useState<string | null>(null);
+  const [moreAlerts, setMoreAlerts] = useState<Record<string, CriticalAlert[]>>({});
+  const [loadingAsset, setLoadingAsset] = useState<string | null>(null);
+
+  // Uma nova lista (atualização periódica) invalida os alertas carregados sob demanda
+  useEffect(() => {
+    // Mantém o mesmo estado quando não há nada a descartar: `alerts || []` muda a cada render
+    setMoreAlerts((current) => (Object.keys(current).length ? {} : current));
+  }, [alerts]);
+
+  const getAssetAlerts = (correlation: CorrelationResult) => [
+    ...correlation.alerts,
+    ...(moreAlerts[correlation.asset] || []),
+  ];
+
+  const getRemaining = (correlation: CorrelationResult) =>
+    (correlation.remaining_alerts || 0) - (moreAlerts[correlation.asset]?.length || 0);
+
+  const loadMoreAlerts = async (correlation: CorrelationResult) => {
+    setLoadingAsset(correlation.asset);
+    try {
+      const page = await dashboardAPI.getAssetAlerts(
+        correlation.asset,
+        hours,
+        getAssetAlerts(correlation).length
+      );
+      setMoreAlerts((current) => ({
+        ...current,
+        [correlation.asset]: [...(current[correlation.asset] || []), ...page.alerts],
+      }));
+    } finally {
+      setLoadingAsset(null);
+    }
+  };
 
   const getSeverityColor = (severity: string) => {
     const severityLower = severity.toLowerCase();
@@ -77,7 +112,7 @@ const CriticalAlerts: React.FC<CriticalAlertsProps> = ({ alerts }) => {
                       </h3>
                       <div className="flex items-center space-x-2 mt-1">
                         <span className="text-gray-400 text-sm">
-                          {correlation.alerts.length} alertas
+                          {correlation.alerts.length + (correlation.remaining_alerts || 0)} alertas
                         </span>
                         <span className="text-gray-600">•</span>
                         <span className="text-gray-400 text-sm">
@@ -106,7 +141,7 @@ const CriticalAlerts: React.FC<CriticalAlertsProps> = ({ alerts }) => {
 
                 {expandedAsset === correlation.asset && (
                   <div className="mt-4 space-y-2">
-                    {correlation.alerts.map((alert) => (
+                    {getAssetAlerts(correlation).map((alert) => (
                       <div
                         key={alert.id}
                         className="bg-gray-900 rounded-lg p-4 border border-gray-700"
@@ -149,6 +184,18 @@ const CriticalAlerts: React.FC<CriticalAlertsProps> = ({ alerts }) => {
                       </div>
                     ))}
 
+                    {getRemaining(correlation) > 0 && (
+                      <button
+                        onClick={() => loadMoreAlerts(correlation)}
+                        disabled={loadingAsset === correlation.asset}
+                        className="w-full py-2 text-sm text-gray-300 bg-gray-900 rounded-lg border border-gray-700 hover:bg-gray-700 transition disabled:opacity-50"
+                      >
+                        {loadingAsset === correlation.asset
+                          ? 'Carregando...'
+                          : `Carregar mais alertas (${getRemaining(correlation)} restantes)`}
+                      </button>
+                    )}
+
                     {correlation.mitre_techniques.length > 0 && (
                       <div className="mt-3 p-3 bg-gray-900 rounded-lg border border-gray-700">
                         <h5 className="text-white font-semibold mb-2 text-sm">
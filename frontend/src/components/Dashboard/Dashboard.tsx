@@ -152,13 +152,13 @@ const Dashboard: React.FC<DashboardProps> = ({ user, onLogout }) => {
           {alertsLoading ? (
             <div className="text-white text-center py-8">Carregando alertas...</div>
           ) : (
-            <CriticalAlerts alerts={alerts || []} />
+            <CriticalAlerts alerts={alerts || []} hours={timeRange} />
           )}
         </div>
 
         {/* Timeline */}
         <div className="mt-8">
-          <ThreatTimeline timeline={timeline || []} />
+          <ThreatTimeline page={timeline} hours={timeRange} />
         </div>
       </main>
     </div>
@@ -31,7 +31,7 @@ const Statistics: FC<StatisticsProps> = ({ stats }) => {
     },
     {
       title: 'Status das Fontes',
-      value: Object.values(stats.sources_status).filter(s => s === 'active').length,
+      value: Object.values(stats.sources_status).filter(s => s.status === 'active').length,
       icon: Activity,
       color: 'bg-green-600',
       subtext: `${Object.keys(stats.sources_status).length} fontes totais`,
@@ -1,21 +1,40 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import { Clock } from 'lucide-react';
+import type { TimelineEvent, TimelinePage } from '@/types';
+import { dashboardAPI } from '@/services/api';
 import { format } from 'date-fns';
 import { ptBR } from 'date-fns/locale';
 
-interface TimelineEvent {
-  timestamp: string;
-  source: string;
-  severity: string;
-  title: string;
-  asset: string;
-}
-
 interface ThreatTimelineProps {
-  timeline: TimelineEvent[];
+  page?: TimelinePage;
+  hours: number;
 }
 
-const ThreatTimeline: React.FC<ThreatTimelineProps> = ({ timeline }) => {
+const ThreatTimeline: React.FC<ThreatTimelineProps> = ({ page, hours }) => {
+  const [olderEvents, setOlderEvents] = useState<TimelineEvent[]>([]);
+  const [cursor, setCursor] = useState<string | null>(page?.nextCursor || null);
+  const [isLoading, setIsLoading] = useState(false);
+
+  // Uma nova primeira página (atualização periódica) descarta as páginas anteriores carregadas
+  useEffect(() => {
+    setOlderEvents([]);
+    setCursor(page?.nextCursor || null);
+  }, [page]);
+
+  const loadOlderEvents = async () => {
+    if (!cursor) return;
+    setIsLoading(true);
+    try {
+      const older = await dashboardAPI.getTimeline(hours, cursor);
+      setOlderEvents((current) => [...current, ...older.events]);
+      setCursor(older.nextCursor);
+    } finally {
+      setIsLoading(false);
+    }
+  };
+
+  const events = [...(page?.events || []), ...olderEvents];
+
   const getSourceColor = (source: string) => {
     const colors: Record<string, string> = {
       elastic: 'bg-purple-600',
@@ -43,15 +62,15 @@ const ThreatTimeline: React.FC<ThreatTimelineProps> = ({ timeline }) => {
       </div>
 
       <div className="p-6">
-        {timeline.length === 0 ? (
+        {events.length === 0 ? (
           <div className="text-center text-gray-400 py-8">
             Nenhum evento encontrado
           </div>
         ) : (
           <div className="space-y-4 max-h-96 overflow-y-auto">
-            {timeline.map((event, index) => (
+            {events.map((event) => (
               <div
-                key={index}
+                key={`${event.source}-${event.id}`}
                 className={`flex items-start space-x-4 p-4 bg-gray-900 rounded-lg border-l-4 ${getSeverityColor(
                   event.severity
                 )}`}
@@ -80,6 +99,16 @@ const ThreatTimeline: React.FC<ThreatTimelineProps> = ({ timeline }) => {
                 </div>
               </div>
             ))}
+
+            {cursor && (
+              <button
+                onClick={loadOlderEvents}
+                disabled={isLoading}
+                className="w-full py-2 text-sm text-gray-300 bg-gray-900 rounded-lg border border-gray-700 hover:bg-gray-700 transition disabled:opacity-50"
+              >
+                {isLoading ? 'Carregando...' : 'Carregar eventos anteriores'}
+              </button>
+            )}
           </div>
         )}
       </div>
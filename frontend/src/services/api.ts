@@ -1,5 +1,5 @@
 import axios from 'axios';
-import type { User, CorrelationResult, DashboardStats, DataSource } from '@/types';
+import type { User, CorrelationResult, DashboardStats, DataSource, AlertDetail, AssetAlertsPage, TimelinePage } from '@/types';
 
 const api = axios.create({
   baseURL: '/api',
@@ -43,8 +43,26 @@ export const authAPI = {
 
 // Dashboard
 export const dashboardAPI = {
-  getCriticalAlerts: async (hours: number = 24): Promise<CorrelationResult[]> => {
-    const response = await api.get('/dashboard/critical-alerts', { params: { hours } });
+  getCriticalAlerts: async (
+    hours: number = 24,
+    limit: number = 100,
+    alertsPerAsset: number = 20
+  ): Promise<CorrelationResult[]> => {
+    const response = await api.get('/dashboard/critical-alerts', {
+      params: { hours, limit, alerts_per_asset: alertsPerAsset },
+    });
+    return response.data;
+  },
+  
+  getAssetAlerts: async (
+    asset: string,
+    hours: number = 24,
+    offset: number = 0,
+    limit: number = 50
+  ): Promise<AssetAlertsPage> => {
+    const response = await api.get(`/dashboard/critical-alerts/${encodeURIComponent(asset)}/alerts`, {
+      params: { hours, offset, limit },
+    });
     return response.data;
   },
   
@@ -53,8 +71,13 @@ export const dashboardAPI = {
     return response.data;
   },
   
-  getTimeline: async (hours: number = 24) => {
-    const response = await api.get('/dashboard/timeline', { params: { hours } });
+  getTimeline: async (hours: number = 24, before?: string): Promise<TimelinePage> => {
+    const response = await api.get('/dashboard/timeline', { params: { hours, before } });
+    return { events: response.data, nextCursor: response.headers['x-next-cursor'] || null };
+  },
+  
+  getAlertDetail: async (alertId: string): Promise<AlertDetail> => {
+    const response = await api.get(`/dashboard/alerts/${encodeURIComponent(alertId)}`);
     return response.data;
   },
 };
@@ -76,6 +99,11 @@ export const adminAPI = {
     return response.data;
   },
   
+  updateUserActive: async (userId: number, isActive: boolean) => {
+    const response = await api.patch(`/admin/users/${userId}/active`, null, { params: { is_active: isActive } });
+    return response.data;
+  },
+  
   deleteUser: async (userId: number) => {
     const response = await api.delete(`/admin/users/${userId}`);
     return response.data;
@@ -27,6 +27,29 @@ export interface CorrelationResult {
   vulnerability_count: number;
   threat_indicators: string[];
   mitre_techniques: string[];
+  remaining_alerts?: number;
+}
+
+export interface AssetAlertsPage {
+  asset: string;
+  total: number;
+  offset: number;
+  limit: number;
+  alerts: CriticalAlert[];
+}
+
+export interface TimelineEvent {
+  id: string;
+  timestamp: string;
+  source: string;
+  severity: string;
+  title: string;
+  asset: string;
+}
+
+export interface TimelinePage {
+  events: TimelineEvent[];
+  nextCursor: string | null;
 }
 
 export interface DashboardStats {
@@ -37,13 +60,33 @@ export interface DashboardStats {
   high_count: number;
   exploitable_vulns: number;
   sources_status: {
-    elasticsearch: string;
-    tenable: string;
-    defender: string;
-    opencti: string;
+    elasticsearch: SourceStatus;
+    tenable: SourceStatus;
+    defender: SourceStatus;
+    opencti: SourceStatus;
   };
 }
 
+export interface SourceStatus {
+  status: 'active' | 'error' | 'timeout';
+  duration_ms: number;
+  count: number;
+  error?: string | null;
+  cache?: 'hit' | 'stale' | 'miss' | 'bypass' | 'bucket' | 'rollup' | null;
+}
+
+export interface AlertDetail {
+  alert_id: string;
+  source: string;
+  severity: string;
+  title: string;
+  description?: string;
+  asset?: string;
+  event_time?: string;
+  details?: Record<string, any>;
+  raw_data?: Record<string, any>;
+}
+
 export interface DataSource {
   id: number;
   name: string;